@@ -0,0 +1,428 @@
+"""
+Servicio HTTP/JSON de análisis, independiente de la interfaz de Streamlit.
+
+Los análisis se ejecutan en un pool de procesos. Las solicitudes esperan en
+una cola acotada y se envían a los procesos por lotes; cuando la cola está
+llena el servicio responde 429 en lugar de acumular trabajo. Con
+TEXTUAL_GUARDIAN_DISK_CACHE los resultados se guardan en una caché SQLite
+compartida, y un texto ya analizado no vuelve a pasar por el análisis.
+
+Uso:
+    python analysis_service.py --host 0.0.0.0 --port 8502 --workers 4
+
+Endpoints:
+    POST /analyze        {"text": "...", "spans": true}
+                         -> {"results": {...}, "spans": [[inicio, fin, categoría], ...],
+                             "rules_version": "..."}
+    POST /analyze/batch  {"texts": ["...", ...]} -> {"items": [{...}, ...]}
+    GET  /health         estado de la cola y de los procesos
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import Pool
+from typing import Dict, List, Optional, Tuple
+
+from result_cache import DiskResultCache, default_disk_cache, text_key
+from rule_packs import get_rule_pack
+from text_analyzer import TextAnalyzer
+
+logger = logging.getLogger(__name__)
+
+# Analizador de cada proceso del pool
+_worker_language = "🇪🇸 Español"
+_worker_analyzer: Optional[TextAnalyzer] = None
+
+
+def _init_worker(language: str):
+    global _worker_language
+    _worker_language = language
+    # Preparar el analizador al crear el proceso, no en la primera petición
+    _current_analyzer().warm_up()
+
+
+def _current_analyzer() -> TextAnalyzer:
+    """Analizador del proceso, recreado si el paquete de reglas cambió"""
+    global _worker_analyzer
+    pack = get_rule_pack(_worker_language)
+    if _worker_analyzer is None or _worker_analyzer.rule_pack is not pack:
+        _worker_analyzer = TextAnalyzer(language=_worker_language, rule_pack=pack)
+    return _worker_analyzer
+
+
+def analyze_job(text: str, spans: bool = False, instrument: bool = False,
+                cached: Tuple[str, Dict] = None) -> Dict:
+    """
+    Analiza un texto y devuelve la respuesta del servicio para él. `cached`
+    es un resultado de la caché junto con la versión de las reglas que lo
+    produjo; si sigue vigente solo se calculan las marcas
+    """
+    analyzer = _current_analyzer()
+    doc = analyzer.tokenize(text)
+    if cached is not None and cached[0] == analyzer.rules_version:
+        results = cached[1]
+    else:
+        results = analyzer.analyze_text(doc, instrument=instrument)
+    response = {
+        'results': results,
+        'rules_version': analyzer.rules_version
+    }
+    if spans:
+        response['spans'] = analyzer.find_highlight_spans(doc, response['results'])
+    return response
+
+
+def analyze_batch(jobs: List[Tuple]) -> List[Dict]:
+    """Analiza un lote de trabajos en un proceso del pool"""
+    return [analyze_job(*job) for job in jobs]
+
+
+class ServiceBusy(Exception):
+    """La cola del servicio está llena; el cliente debe reintentar más tarde"""
+
+
+class PayloadTooLarge(ValueError):
+    """El texto supera el tamaño máximo aceptado por el servicio"""
+
+
+class AnalysisService:
+    """
+    Cola acotada de trabajos de análisis atendida por un pool de procesos.
+
+    Un hilo despachador agrupa los trabajos que llegan casi a la vez (hasta
+    ``max_batch`` trabajos o ``max_batch_chars`` caracteres, esperando como
+    mucho ``batch_wait`` segundos) y limita los lotes en curso a dos por
+    proceso, de modo que el exceso de carga queda en la cola y se rechaza
+    cuando esta se llena.
+
+    Con una caché en disco, los textos ya analizados con las mismas reglas
+    se responden sin pasar por la cola (o, si se piden las marcas, sin
+    repetir el análisis).
+    """
+
+    def __init__(self, workers: int = None, language: str = "🇪🇸 Español",
+                 max_queue: int = 256, max_batch: int = 16, max_batch_chars: int = 1 << 20,
+                 batch_wait: float = 0.005, max_chars: int = 10 << 20,
+                 disk_cache: DiskResultCache = None):
+        self.workers = workers or os.cpu_count() or 1
+        self.language = language
+        self.disk_cache = disk_cache
+        self.max_batch = max_batch
+        self.max_batch_chars = max_batch_chars
+        self.batch_wait = batch_wait
+        self.max_chars = max_chars
+        self.processed = 0
+        self.rejected = 0
+        self.cached = 0
+        self._counters_lock = threading.Lock()
+        self._analyzer: Optional[TextAnalyzer] = None
+        self._queue: 'queue.Queue[Tuple[Tuple, Future]]' = queue.Queue(max_queue)
+        self._slots = threading.BoundedSemaphore(2 * self.workers)
+        self._pool = Pool(self.workers, initializer=_init_worker, initargs=(language,))
+        self._closed = threading.Event()
+        self._dispatcher = threading.Thread(target=self._dispatch, name='analysis-dispatcher', daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, text: str, spans: bool = False, instrument: bool = False) -> Future:
+        """Encola un análisis; lanza ServiceBusy si la cola está llena"""
+        if len(text) > self.max_chars:
+            raise PayloadTooLarge(f'El texto supera el máximo de {self.max_chars} caracteres')
+        future: Future = Future()
+        cached = None
+        if self.disk_cache is not None and not instrument:
+            rules_version = self._rules_version()
+            results = self.disk_cache.get(text_key(text, rules_version))
+            if results is not None:
+                cached = (rules_version, results)
+                if not spans:
+                    with self._counters_lock:
+                        self.cached += 1
+                    future.set_result({'results': results, 'rules_version': rules_version})
+                    return future
+        try:
+            self._queue.put_nowait(((text, spans, instrument, cached), future))
+        except queue.Full:
+            with self._counters_lock:
+                self.rejected += 1
+            raise ServiceBusy('La cola de análisis está llena') from None
+        return future
+
+    def _rules_version(self) -> str:
+        """Versión de las reglas vigentes, la misma que usan los procesos del pool"""
+        pack = get_rule_pack(self.language)
+        if self._analyzer is None or self._analyzer.rule_pack is not pack:
+            self._analyzer = TextAnalyzer(language=self.language, rule_pack=pack)
+        return self._analyzer.rules_version
+
+    def _remember(self, jobs: List[Tuple], responses: List[Dict]):
+        """Guarda en la caché en disco los análisis nuevos (sin métricas)"""
+        for (text, _, instrument, cached), response in zip(jobs, responses):
+            if not instrument and (cached is None or cached[0] != response['rules_version']):
+                self.disk_cache.put(text_key(text, response['rules_version']), response['results'])
+
+    def _next_batch(self) -> List[Tuple[Tuple, Future]]:
+        batch = [self._queue.get()]
+        chars = len(batch[0][0][0])
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.max_batch and chars < self.max_batch_chars:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+            chars += len(item[0][0])
+        # Los trabajos cancelados por el cliente se descartan
+        return [item for item in batch if item[1].set_running_or_notify_cancel()]
+
+    def _dispatch(self):
+        while not self._closed.is_set():
+            # Esperar un lugar libre antes de sacar trabajos de la cola, para
+            # que la carga pendiente se vea en la cola y active el rechazo
+            self._slots.acquire()
+            batch = self._next_batch()
+            if not batch:
+                self._slots.release()
+                continue
+            jobs = [job for job, _ in batch]
+            futures = [future for _, future in batch]
+
+            def done(responses: List[Dict], jobs=jobs, futures=futures):
+                self._slots.release()
+                with self._counters_lock:
+                    self.processed += len(futures)
+                for future, response in zip(futures, responses):
+                    future.set_result(response)
+                if self.disk_cache is not None:
+                    self._remember(jobs, responses)
+
+            def failed(error: BaseException, futures=futures):
+                self._slots.release()
+                for future in futures:
+                    future.set_exception(error)
+
+            try:
+                self._pool.apply_async(
+                    analyze_batch, (jobs,),
+                    callback=done, error_callback=failed
+                )
+            except ValueError as error:
+                # El pool ya se cerró
+                failed(error)
+
+    def stats(self) -> Dict:
+        stats = {
+            'workers': self.workers,
+            'queued': self._queue.qsize(),
+            'max_queue': self._queue.maxsize,
+            'processed': self.processed,
+            'rejected': self.rejected,
+            'cached': self.cached
+        }
+        if self.disk_cache is not None:
+            stats['cache'] = self.disk_cache.stats()
+        return stats
+
+    def close(self):
+        self._closed.set()
+        self._pool.terminate()
+        self._pool.join()
+
+
+class AnalysisRequestHandler(BaseHTTPRequestHandler):
+    """Traduce las solicitudes HTTP/JSON a trabajos del servicio"""
+
+    server_version = 'TextualGuardianAnalysis/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def service(self) -> AnalysisService:
+        return self.server.service
+
+    def log_message(self, format, *args):
+        logger.debug('%s - %s', self.address_string(), format % args)
+
+    def _send_json(self, status: int, payload: Dict, headers: Dict[str, str] = None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> Optional[Dict]:
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > self.server.max_body_bytes:
+            # El cuerpo no se lee, así que la conexión no se puede reutilizar
+            self.close_connection = True
+            self._send_json(413, {'error': 'Solicitud demasiado grande'})
+            return None
+        try:
+            payload = json.loads(self.rfile.read(length).decode('utf-8'))
+        except (UnicodeDecodeError, ValueError):
+            self._send_json(400, {'error': 'El cuerpo debe ser JSON válido'})
+            return None
+        if not isinstance(payload, dict):
+            self._send_json(400, {'error': 'El cuerpo debe ser un objeto JSON'})
+            return None
+        return payload
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send_json(200, {'status': 'ok', **self.service.stats()})
+        else:
+            self._send_json(404, {'error': 'Ruta desconocida'})
+
+    def do_POST(self):
+        if self.path not in ('/analyze', '/analyze/batch'):
+            self._send_json(404, {'error': 'Ruta desconocida'})
+            return
+        payload = self._read_json()
+        if payload is None:
+            return
+
+        texts = [payload.get('text')] if self.path == '/analyze' else payload.get('texts')
+        if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+            self._send_json(400, {'error': "Se esperaba 'text' (texto) o 'texts' (lista de textos)"})
+            return
+        spans = bool(payload.get('spans'))
+        instrument = bool(payload.get('instrument'))
+
+        futures = []
+        try:
+            for text in texts:
+                futures.append(self.service.submit(text, spans, instrument))
+        except (ServiceBusy, PayloadTooLarge) as error:
+            for future in futures:
+                future.cancel()
+            if isinstance(error, ServiceBusy):
+                self._send_json(429, {'error': str(error)}, {'Retry-After': '1'})
+            else:
+                self._send_json(413, {'error': str(error)})
+            return
+
+        deadline = time.monotonic() + self.server.request_timeout
+        try:
+            items = [future.result(max(deadline - time.monotonic(), 0)) for future in futures]
+        except FutureTimeout:
+            for future in futures:
+                future.cancel()
+            self._send_json(504, {'error': 'El análisis no terminó a tiempo'})
+            return
+        except Exception as error:
+            logger.exception('Error al analizar')
+            self._send_json(500, {'error': str(error)})
+            return
+
+        if self.path == '/analyze':
+            self._send_json(200, items[0])
+        else:
+            self._send_json(200, {'items': items})
+
+
+class AnalysisServer(ThreadingHTTPServer):
+    """Servidor HTTP con un hilo por conexión; el trabajo pesado va al pool"""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], service: AnalysisService,
+                 request_timeout: float = 60.0, max_body_bytes: int = 64 << 20):
+        super().__init__(address, AnalysisRequestHandler)
+        self.service = service
+        self.request_timeout = request_timeout
+        self.max_body_bytes = max_body_bytes
+
+
+class AnalysisClient:
+    """Cliente del servicio para la interfaz u otros programas"""
+
+    def __init__(self, base_url: str, timeout: float = 60.0):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def _post(self, path: str, payload: Dict) -> Dict:
+        request = urllib.request.Request(
+            self.base_url + path,
+            data=json.dumps(payload, ensure_ascii=False).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read().decode('utf-8'))
+        except urllib.error.HTTPError as error:
+            if error.code == 429:
+                raise ServiceBusy(f'Servicio ocupado: {self.base_url}') from error
+            raise
+
+    def analyze(self, text: str, spans: bool = False, instrument: bool = False) -> Dict:
+        """Devuelve {'results', 'rules_version'} y, si se pide, 'spans'"""
+        response = self._post('/analyze', {'text': text, 'spans': spans, 'instrument': instrument})
+        if 'spans' in response:
+            response['spans'] = [tuple(span) for span in response['spans']]
+        return response
+
+    def analyze_many(self, texts: List[str]) -> List[Dict]:
+        return self._post('/analyze/batch', {'texts': texts})['items']
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='python analysis_service.py',
+        description='Servicio HTTP/JSON de análisis de textos'
+    )
+    parser.add_argument('--host', default='127.0.0.1', help='Dirección en la que escuchar')
+    parser.add_argument('--port', type=int, default=8502, help='Puerto (por defecto: 8502)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Procesos de análisis (por defecto: uno por núcleo)')
+    parser.add_argument('--max-queue', type=int, default=256,
+                        help='Trabajos en espera antes de responder 429')
+    parser.add_argument('--max-batch', type=int, default=16,
+                        help='Trabajos enviados juntos a un proceso')
+    parser.add_argument('--batch-wait', type=float, default=0.005,
+                        help='Segundos que se espera para completar un lote')
+    parser.add_argument('--max-chars', type=int, default=10 << 20,
+                        help='Tamaño máximo de un texto, en caracteres')
+    parser.add_argument('--timeout', type=float, default=60.0,
+                        help='Segundos máximos de espera por solicitud')
+    parser.add_argument('--language', default="🇪🇸 Español",
+                        help='Idioma o nombre del paquete de reglas')
+    return parser
+
+
+def main(argv: List[str] = None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    service = AnalysisService(
+        workers=args.workers, language=args.language, max_queue=args.max_queue,
+        max_batch=args.max_batch, batch_wait=args.batch_wait, max_chars=args.max_chars,
+        disk_cache=default_disk_cache()
+    )
+    server = AnalysisServer((args.host, args.port), service, request_timeout=args.timeout,
+                            max_body_bytes=args.max_chars * 4 + 1024)
+    logger.info('Servicio de análisis en http://%s:%d con %d procesos',
+                args.host, args.port, service.workers)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
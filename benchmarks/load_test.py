@@ -0,0 +1,430 @@
+"""
+Prueba de carga de la aplicación con sesiones concurrentes.
+
+Levanta un servidor de Streamlit local (o usa uno ya corriendo, p. ej. el
+contenedor) y abre N sesiones por WebSocket, igual que N pestañas del
+navegador. Cada sesión desactiva el análisis en vivo y pega textos de
+tamaños realistas presionando 'Analizar'; la latencia va desde que se envía
+el clic hasta que el servidor termina de ejecutar el script y enviar la
+página con el texto marcado. Para cada nivel de concurrencia se reportan
+p50/p95/p99, throughput y la memoria residente (RSS) del proceso del
+servidor; cada nivel usa un servidor nuevo con la caché en disco vacía.
+Con --idle las sesiones quedan abiertas sin actividad ese tiempo (el
+servidor local desaloja las sesiones inactivas a ese plazo) y se mide la
+memoria que retiene cada sesión inactiva.
+
+Uso:
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --sessions 1,8,32 --texts 5 --think 0.5
+    python benchmarks/load_test.py --mix 10KB:1 --json
+    python benchmarks/load_test.py --sessions 16,64 --idle 30
+    # Contra el contenedor (la memoria se lee del proceso indicado con --pid)
+    python benchmarks/load_test.py --url http://localhost:8501 \\
+        --pid "$(podman inspect -f '{{.State.Pid}}' textual-guardian-app)"
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'benchmarks'))
+
+from run_benchmarks import generate_text, parse_size  # noqa: E402
+
+DEFAULT_SESSIONS = '1,2,4,8,16'
+
+# Tamaños de los textos pegados y su peso: respuestas cortas, ensayos,
+# capítulos y alguna tesis completa
+DEFAULT_MIX = '2KB:3,10KB:4,40KB:2,150KB:1'
+
+# Marca de que la página terminó con el texto marcado
+MARKED_TEXT = '<div class="text-highlight-container">'
+
+# Claves de los widgets que usa la prueba
+TEXT_KEY = '-text_input'
+LIVE_MODE_KEY = '-live_mode'
+
+# Segundos de espera a que el servidor responda /_stcore/health
+SERVER_START_TIMEOUT = 60
+
+# Archivos del servidor local dentro de su directorio temporal
+DISK_CACHE_FILE = 'results.sqlite3'
+SERVER_LOG_FILE = 'server.log'
+
+# Aviso que registra la aplicación si no puede abrir la caché en disco
+DISK_CACHE_ERROR = 'No se pudo abrir la caché en disco'
+
+
+def parse_mix(value: str) -> List[Tuple[int, float]]:
+    """Convierte '2KB:3,10KB:4' en [(2048, 3.0), (10240, 4.0)]"""
+    mix = []
+    for item in value.split(','):
+        size, _, weight = item.strip().partition(':')
+        mix.append((parse_size(size), float(weight or 1)))
+    return mix
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    """Percentil con interpolación lineal entre los valores más cercanos"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = fraction * (len(ordered) - 1)
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def process_rss(pid: Optional[int]) -> Optional[int]:
+    """Memoria residente actual de un proceso, en bytes (None si no se puede leer)"""
+    if pid is None:
+        return None
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int, cache_path: str, log_path: str, idle: float = 0.0) -> subprocess.Popen:
+    """
+    Levanta la aplicación en un servidor de Streamlit local, con la caché en
+    disco en el archivo SQLite `cache_path` y su salida en `log_path`, y
+    espera a que responda. Con `idle` el servidor desaloja las sesiones
+    inactivas tras esos segundos
+    """
+    command = [
+        sys.executable, '-m', 'streamlit', 'run', str(ROOT / 'streamlit_app.py'),
+        '--server.headless', 'true', '--server.port', str(port),
+        '--server.fileWatcherType', 'none', '--browser.gatherUsageStats', 'false'
+    ]
+    env = dict(os.environ, TEXTUAL_GUARDIAN_DISK_CACHE=cache_path)
+    if idle:
+        env['TEXTUAL_GUARDIAN_SESSION_IDLE_MINUTES'] = str(idle / 60)
+    with open(log_path, 'wb') as log:
+        server = subprocess.Popen(command, cwd=ROOT, env=env,
+                                  stdout=subprocess.DEVNULL, stderr=log)
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'El servidor de Streamlit terminó con código {server.returncode}')
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/_stcore/health', timeout=1):
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError('El servidor de Streamlit no respondió a tiempo')
+
+
+class Session:
+    """Una pestaña del navegador: una conexión al servidor y los widgets de su página"""
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.page_script_hash = ''
+        self.widgets: Dict[str, str] = {}
+
+    @classmethod
+    async def open(cls, url: str, timeout: float) -> 'Session':
+        import websockets
+
+        stream = url.rstrip('/').replace('http', 'ws', 1) + '/_stcore/stream'
+        # Sin pings de keepalive: un servidor saturado tarda en responderlos y
+        # la conexión se cerraría en medio de la prueba
+        websocket = await websockets.connect(stream, subprotocols=['streamlit'], max_size=None,
+                                             ping_interval=None)
+        session = cls(websocket)
+        await session.rerun([], timeout)
+        return session
+
+    async def rerun(self, widget_states: List, timeout: float) -> Tuple[float, Optional[str]]:
+        """
+        Ejecuta el script con esos valores de widgets y espera a que termine.
+        Devuelve los segundos transcurridos y el error, si lo hubo
+        """
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        message = BackMsg()
+        message.rerun_script.query_string = ''
+        message.rerun_script.page_script_hash = self.page_script_hash
+        message.rerun_script.widget_states.widgets.extend(widget_states)
+        started = time.perf_counter()
+        await self.websocket.send(message.SerializeToString())
+
+        error = None
+        marked = False
+        deadline = started + timeout
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return time.perf_counter() - started, 'tiempo de espera agotado'
+            received = ForwardMsg()
+            received.ParseFromString(await asyncio.wait_for(self.websocket.recv(), remaining))
+            kind = received.WhichOneof('type')
+            if kind == 'new_session':
+                self.page_script_hash = received.new_session.page_script_hash
+            elif kind == 'delta' and received.delta.WhichOneof('type') == 'new_element':
+                element = received.delta.new_element
+                element_type = element.WhichOneof('type')
+                if element_type in ('text_area', 'button', 'checkbox'):
+                    widget = getattr(element, element_type)
+                    self.widgets.setdefault(element_type, widget.id)
+                elif element_type == 'markdown' and MARKED_TEXT in element.markdown.body:
+                    marked = True
+                elif element_type == 'exception':
+                    error = error or element.exception.message
+            elif kind == 'script_finished':
+                elapsed = time.perf_counter() - started
+                if widget_states and not (error or marked):
+                    error = 'sin texto marcado'
+                return elapsed, error
+
+    async def analyze(self, text: str, timeout: float) -> Tuple[float, Optional[str]]:
+        """Pega el texto, desactiva el análisis en vivo y presiona 'Analizar'"""
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        text_id = self.widgets['text_area']
+        live_id = self.widgets['checkbox']
+        assert text_id.endswith(TEXT_KEY) and live_id.endswith(LIVE_MODE_KEY)
+        return await self.rerun([
+            WidgetState(id=text_id, string_value=text),
+            WidgetState(id=live_id, bool_value=False),
+            WidgetState(id=self.widgets['button'], trigger_value=True)
+        ], timeout)
+
+    async def close(self):
+        await self.websocket.close()
+
+
+async def run_level(url: str, sessions: int, texts: int, mix: List[Tuple[int, float]],
+                    think: float = 0.0, seed: int = 1, timeout: float = 300.0,
+                    pid: int = None, idle: float = 0.0,
+                    check: Callable[[], None] = None) -> Dict:
+    """
+    Abre `sessions` sesiones y hace que todas peguen y analicen `texts`
+    textos a la vez. Con `idle`, después las deja abiertas y sin actividad
+    esos segundos y mide la memoria otra vez. `check` se llama con las
+    sesiones ya abiertas, antes de analizar, y puede lanzar una excepción
+    para cancelar la medición
+    """
+    sizes, weights = zip(*mix)
+    pending = []
+    for index in range(sessions):
+        rnd = random.Random(seed * 100_003 + index)
+        pending.append([
+            generate_text(rnd.choices(sizes, weights)[0], seed=rnd.randrange(1 << 30))
+            for _ in range(texts)
+        ])
+
+    rss_start = process_rss(pid)
+    opened, load_seconds = [], []
+    for _ in range(sessions):
+        started = time.perf_counter()
+        opened.append(await Session.open(url, timeout))
+        load_seconds.append(time.perf_counter() - started)
+    rss_loaded = process_rss(pid)
+    if check is not None:
+        try:
+            check()
+        except Exception:
+            for client in opened:
+                await client.close()
+            raise
+
+    latencies: List[float] = []
+    sizes_done: List[int] = []
+    errors: List[str] = []
+    rss_peak = rss_loaded
+    start = asyncio.Event()
+
+    async def session(client: Session, session_texts: List[str]):
+        await start.wait()
+        for text in session_texts:
+            try:
+                elapsed, error = await client.analyze(text, timeout)
+            except Exception as failure:  # conexión cerrada o tiempo agotado
+                elapsed, error = None, repr(failure)
+            if error:
+                errors.append(error)
+            else:
+                latencies.append(elapsed)
+                sizes_done.append(len(text.encode('utf-8')))
+            if think:
+                await asyncio.sleep(think)
+
+    async def sample_memory():
+        nonlocal rss_peak
+        while True:
+            rss_peak = max(rss_peak or 0, process_rss(pid) or 0) or None
+            await asyncio.sleep(0.05)
+
+    tasks = [asyncio.ensure_future(session(*args)) for args in zip(opened, pending)]
+    sampler = asyncio.ensure_future(sample_memory())
+    started = time.perf_counter()
+    start.set()
+    await asyncio.gather(*tasks)
+    wall = time.perf_counter() - started
+    sampler.cancel()
+    rss_end = process_rss(pid)
+    rss_idle = None
+    if idle:
+        await asyncio.sleep(idle + 1)
+        # Una sesión nueva hace que el servidor revise las inactivas
+        probe = await Session.open(url, timeout)
+        await probe.close()
+        await asyncio.sleep(0.5)
+        rss_idle = process_rss(pid)
+    for client in opened:
+        await client.close()
+
+    mb = 1024 * 1024
+
+    def to_mb(value: Optional[int]) -> Optional[float]:
+        return value / mb if value is not None else None
+
+    return {
+        'sessions': sessions,
+        'analyses': len(latencies),
+        'errors': len(errors),
+        'p50_seconds': percentile(latencies, 0.50),
+        'p95_seconds': percentile(latencies, 0.95),
+        'p99_seconds': percentile(latencies, 0.99),
+        'analyses_per_second': len(latencies) / wall if wall else 0.0,
+        'mb_per_second': sum(sizes_done) / mb / wall if wall else 0.0,
+        'session_open_seconds': percentile(load_seconds, 0.50),
+        'rss_start_mb': to_mb(rss_start),
+        'rss_sessions_open_mb': to_mb(rss_loaded),
+        'rss_end_mb': to_mb(rss_end),
+        'rss_peak_mb': to_mb(rss_peak),
+        # Memoria que retiene cada sesión abierta una vez terminados sus análisis
+        'rss_per_session_mb': (to_mb(rss_end - rss_start) / sessions
+                               if rss_end is not None and rss_start is not None else None),
+        'rss_idle_mb': to_mb(rss_idle),
+        'rss_per_idle_session_mb': (to_mb(rss_idle - rss_start) / sessions
+                                    if rss_idle is not None and rss_start is not None else None),
+        'first_error': errors[0] if errors else None
+    }
+
+
+def measure_level(args: argparse.Namespace, sessions: int, mix: List[Tuple[int, float]]) -> Dict:
+    """Un nivel de concurrencia contra --url o contra un servidor local nuevo"""
+    options = dict(sessions=sessions, texts=args.texts, mix=mix, think=args.think,
+                   seed=args.seed, timeout=args.timeout, idle=args.idle)
+    if args.url:
+        return asyncio.run(run_level(args.url, pid=args.pid, **options))
+    with tempfile.TemporaryDirectory() as directory:
+        cache_path = os.path.join(directory, DISK_CACHE_FILE)
+        log_path = os.path.join(directory, SERVER_LOG_FILE)
+
+        def check_disk_cache():
+            # Sin la caché en disco la app funciona igual, pero la medición
+            # no correspondería a un despliegue real
+            with open(log_path, encoding='utf-8', errors='replace') as log:
+                reported = [line.strip() for line in log if DISK_CACHE_ERROR in line]
+            if reported or not os.path.exists(cache_path):
+                detail = reported[0] if reported else f'no se creó {cache_path}'
+                raise RuntimeError(f'El servidor no usa la caché en disco: {detail}')
+
+        port = free_port()
+        server = start_server(port, cache_path, log_path, args.idle)
+        try:
+            return asyncio.run(run_level(f'http://127.0.0.1:{port}', pid=server.pid,
+                                         check=check_disk_cache, **options))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Prueba de carga de Textual Guardian con sesiones concurrentes')
+    parser.add_argument('--sessions', default=DEFAULT_SESSIONS,
+                        help=f'Niveles de concurrencia (por defecto: {DEFAULT_SESSIONS})')
+    parser.add_argument('--texts', type=int, default=3, help='Textos que analiza cada sesión')
+    parser.add_argument('--mix', default=DEFAULT_MIX,
+                        help=f'Tamaños de texto y su peso (por defecto: {DEFAULT_MIX})')
+    parser.add_argument('--think', type=float, default=0.0,
+                        help='Segundos de espera de cada sesión entre un análisis y el siguiente')
+    parser.add_argument('--idle', type=float, default=0.0,
+                        help='Segundos que las sesiones quedan inactivas antes de medir su memoria '
+                             '(el servidor local las desaloja a ese plazo)')
+    parser.add_argument('--seed', type=int, default=1, help='Semilla de los textos generados')
+    parser.add_argument('--timeout', type=float, default=300.0,
+                        help='Segundos máximos por análisis antes de contarlo como error')
+    parser.add_argument('--url', help='Servidor ya levantado (p. ej. http://localhost:8501); '
+                                      'por defecto se levanta uno local para cada nivel')
+    parser.add_argument('--pid', type=int, help='Proceso del servidor de --url cuya memoria se mide')
+    parser.add_argument('--json', action='store_true', help='Imprimir el reporte en JSON')
+    args = parser.parse_args(argv)
+
+    try:
+        import websockets  # noqa: F401
+    except ImportError:
+        print('La prueba de carga necesita el paquete websockets (pip install websockets)', file=sys.stderr)
+        return 1
+
+    mix = parse_mix(args.mix)
+    levels = []
+    for sessions in (int(value) for value in args.sessions.split(',')):
+        levels.append(measure_level(args, sessions, mix))
+        if not args.json:
+            print(f'{sessions} sesiones medidas', file=sys.stderr)
+
+    report = {
+        'python': sys.version.split()[0],
+        'cpus': os.cpu_count(),
+        'url': args.url,
+        'texts_per_session': args.texts,
+        'mix': args.mix,
+        'think_seconds': args.think,
+        'idle_seconds': args.idle,
+        'service_url': os.environ.get('TEXTUAL_GUARDIAN_SERVICE_URL'),
+        'levels': levels
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+
+    def ms(seconds: Optional[float]) -> str:
+        return f'{seconds * 1000:.0f}' if seconds is not None else '-'
+
+    def mb(value: Optional[float], digits: int = 0) -> str:
+        return f'{value:.{digits}f} MB' if value is not None else '-'
+
+    print(f"{'sesiones':>8} {'análisis':>8} {'errores':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'análisis/s':>10} {'MB/s':>6} {'RSS inicial':>11} {'RSS final':>9} {'RSS pico':>9} {'RSS/sesión':>10} {'RSS/inactiva':>12}")
+    for level in levels:
+        print(f"{level['sessions']:>8} {level['analyses']:>8} {level['errors']:>7} "
+              f"{ms(level['p50_seconds']):>8} {ms(level['p95_seconds']):>8} {ms(level['p99_seconds']):>8} "
+              f"{level['analyses_per_second']:>10.2f} {level['mb_per_second']:>6.2f} "
+              f"{mb(level['rss_start_mb']):>11} {mb(level['rss_end_mb']):>9} {mb(level['rss_peak_mb']):>9} "
+              f"{mb(level['rss_per_session_mb'], 1):>10} {mb(level['rss_per_idle_session_mb'], 1):>12}")
+    for level in levels:
+        if level['first_error']:
+            print(f"{level['sessions']} sesiones: {level['errors']} errores, el primero: {level['first_error']}",
+                  file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,276 @@
+"""
+Benchmarks de los detectores de TextAnalyzer y del resaltado de texto.
+
+Genera texto académico sintético en español (determinista) de distintos
+tamaños, mide el tiempo de cada detector, de ``analyze_text`` y de
+``create_highlighted_text`` y reporta throughput y memoria máxima. El
+resaltado con el análisis ya hecho (los fragmentos y el HTML del texto
+completo) se compara además con un objetivo por palabra.
+
+Uso:
+    python benchmarks/run_benchmarks.py --sizes 1KB,100KB,1MB
+    python benchmarks/run_benchmarks.py --save-baseline benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --compare benchmarks/baseline.json --threshold 0.25
+"""
+import argparse
+import gc
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from text_analyzer import TextAnalyzer  # noqa: E402
+
+DEFAULT_SIZES = '1KB,10KB,100KB,1MB,10MB,50MB'
+
+# Objetivo del resaltado con el análisis ya hecho (los fragmentos solos y
+# el HTML completo): segundos por cada HIGHLIGHT_TARGET_WORDS palabras
+HIGHLIGHT_TARGET_WORDS = 50_000
+HIGHLIGHT_TARGET_SECONDS = 0.1
+# Los textos más cortos se miden con demasiado ruido para compararlos
+HIGHLIGHT_TARGET_MIN_WORDS = 5_000
+HIGHLIGHT_TARGETS = ('highlight_spans_cached', 'create_highlighted_text')
+
+SUBJECTS = [
+    'el presente trabajo', 'la investigación', 'el análisis realizado', 'los resultados',
+    'el estudio', 'la metodología propuesta', 'el modelo desarrollado', 'los datos obtenidos',
+    'la población estudiada', 'el marco teórico', 'las variables consideradas', 'el proceso'
+]
+VERBS = [
+    'permite', 'muestra', 'evidencia', 'puede lograr', 'pretende', 'analiza', 'describe',
+    'establece', 'presenta', 'propone', 'pueden motivar', 'demuestra', 'sugiere'
+]
+OBJECTS = [
+    'una relación significativa', 'diversas perspectivas', 'múltiples factores',
+    'un impacto grande', 'algunos aspectos relevantes', 'varios elementos importantes',
+    'un cambio pequeño', 'los objetivos planteados', 'su contexto social',
+    'el desarrollo sostenible', 'muchos casos documentados', 'pocos antecedentes'
+]
+CONNECTORS = [
+    'ya que', 'debido a que', 'pero', 'sin embargo', 'de que', 'puesto que',
+    'considerando', 'analizando', 'por lo tanto', 'además', 'etc.'
+]
+
+
+def parse_size(value: str) -> int:
+    """Convierte tamaños como '10KB' o '50MB' a bytes"""
+    value = value.strip().upper()
+    for suffix, factor in (('MB', 1024 * 1024), ('KB', 1024), ('B', 1)):
+        if value.endswith(suffix):
+            return int(float(value[:-len(suffix)]) * factor)
+    return int(value)
+
+
+def generate_text(size: int, seed: int = 42) -> str:
+    """Genera texto académico sintético y determinista de aproximadamente `size` bytes"""
+    rnd = random.Random(seed)
+    paragraphs = []
+    total = 0
+    while total < size:
+        sentences = []
+        for _ in range(rnd.randint(3, 7)):
+            sentence = f'{rnd.choice(SUBJECTS)} {rnd.choice(VERBS)} {rnd.choice(OBJECTS)}'
+            if rnd.random() < 0.6:
+                separator = ', y' if rnd.random() < 0.2 else ','
+                sentence += f'{separator} {rnd.choice(CONNECTORS)} {rnd.choice(SUBJECTS)} {rnd.choice(VERBS)} {rnd.choice(OBJECTS)}'
+            sentences.append(sentence[0].upper() + sentence[1:] + '.')
+        paragraph = ' '.join(sentences)
+        paragraphs.append(paragraph)
+        total += len(paragraph.encode('utf-8')) + 2
+    return '\n\n'.join(paragraphs)
+
+
+def benchmark_targets(analyzer: TextAnalyzer) -> Dict[str, Callable[[str], object]]:
+    """Funciones a medir, cada una recibe el texto completo"""
+    targets = {
+        name: getattr(analyzer, name) for name in (
+            'count_words', 'count_sentences', 'find_repeated_words', 'find_close_repetitions',
+            'find_repeated_phrases', 'find_participios', 'find_gerundios',
+            'find_forbidden_expressions', 'find_problematic_adjectives', 'check_comma_before_y',
+            'count_specific_words', 'analyze_text'
+        )
+    }
+    targets['find_highlight_spans'] = analyzer.find_highlight_spans
+    results_by_text = {}
+
+    def analyzed(text: str):
+        # El análisis (con las posiciones de las frases repetidas) se
+        # calcula fuera de la medición, como cuando la app ya tiene el
+        # resultado guardado
+        if text not in results_by_text:
+            results_by_text.clear()
+            results_by_text[text] = analyzer.analyze_text(text, locate=True)
+        return results_by_text[text]
+
+    def highlight_spans(text: str):
+        return analyzer.find_highlight_spans(text, analyzed(text))
+
+    highlight_spans.prepare = analyzed
+    targets['highlight_spans_cached'] = highlight_spans
+
+    # El resaltado depende de Streamlit; se omite si no está instalado
+    try:
+        from streamlit_app import create_highlighted_text
+    except ImportError:
+        return targets
+
+    def highlight(text: str):
+        return create_highlighted_text(text, analyzed(text))
+
+    highlight.prepare = analyzed
+    targets['create_highlighted_text'] = highlight
+    return targets
+
+
+def time_call(func: Callable[[str], object], text: str, repeat: int) -> float:
+    """Mejor tiempo (en segundos) de `repeat` ejecuciones"""
+    best = float('inf')
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_memory(func: Callable[[str], object], text: str) -> int:
+    """Memoria máxima (en bytes) reservada durante una ejecución"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func(text)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(sizes: List[int], repeat: int, measure_memory: bool, only: List[str] = None) -> Dict:
+    analyzer = TextAnalyzer()
+    targets = benchmark_targets(analyzer)
+    if only:
+        targets = {name: func for name, func in targets.items() if name in only}
+
+    results = []
+    for size in sizes:
+        text = generate_text(size)
+        nbytes = len(text.encode('utf-8'))
+        # Las entradas grandes se miden una sola vez
+        runs = repeat if nbytes <= 1024 * 1024 else 1
+        words = analyzer.count_words(text)
+        for name, func in targets.items():
+            # Calentamiento: compilar expresiones y llenar cachés de reglas
+            func(text[:1000])
+            prepare = getattr(func, 'prepare', None)
+            if prepare is not None:
+                prepare(text)
+            seconds = time_call(func, text, runs)
+            entry = {
+                'benchmark': name,
+                'size': nbytes,
+                'words': words,
+                'seconds': seconds,
+                'mb_per_second': nbytes / seconds / 1e6 if seconds else None
+            }
+            if name in HIGHLIGHT_TARGETS and words >= HIGHLIGHT_TARGET_MIN_WORDS:
+                entry['target_seconds'] = HIGHLIGHT_TARGET_SECONDS * words / HIGHLIGHT_TARGET_WORDS
+            if measure_memory:
+                entry['peak_memory'] = peak_memory(func, text)
+            results.append(entry)
+            print(format_entry(entry), file=sys.stderr)
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results
+    }
+
+
+def format_entry(entry: Dict) -> str:
+    line = (f"{entry['benchmark']:<28} {entry['size'] / 1024:>10.0f} KB "
+            f"{entry['seconds'] * 1000:>11.2f} ms {entry['mb_per_second'] or 0:>9.2f} MB/s")
+    if 'peak_memory' in entry:
+        line += f" {entry['peak_memory'] / 1e6:>9.2f} MB pico"
+    if 'target_seconds' in entry:
+        line += f" (objetivo {entry['target_seconds'] * 1000:.0f} ms)"
+    return line
+
+
+def missed_targets(report: Dict) -> List[str]:
+    """Devuelve las mediciones que superan su objetivo de tiempo"""
+    return [
+        f"{entry['benchmark']} ({entry['words']} palabras): "
+        f"{entry['seconds'] * 1000:.2f} ms > {entry['target_seconds'] * 1000:.2f} ms"
+        for entry in report['results']
+        if 'target_seconds' in entry and entry['seconds'] > entry['target_seconds']
+    ]
+
+
+def compare(current: Dict, baseline: Dict, threshold: float, min_time: float) -> List[str]:
+    """Devuelve los benchmarks más lentos que la línea base por encima del umbral"""
+    previous = {(entry['benchmark'], entry['size']): entry for entry in baseline['results']}
+    regressions = []
+    for entry in current['results']:
+        base = previous.get((entry['benchmark'], entry['size']))
+        # Los tiempos muy pequeños son demasiado ruidosos para compararlos
+        if base is None or base['seconds'] < min_time:
+            continue
+        ratio = entry['seconds'] / base['seconds']
+        if ratio > 1 + threshold:
+            regressions.append(
+                f"{entry['benchmark']} ({entry['size'] / 1024:.0f} KB): "
+                f"{base['seconds'] * 1000:.2f} ms -> {entry['seconds'] * 1000:.2f} ms (x{ratio:.2f})"
+            )
+    return regressions
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmarks de Textual Guardian')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES,
+                        help=f'Tamaños de texto separados por comas (por defecto: {DEFAULT_SIZES})')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Repeticiones por medición (se toma el mejor tiempo)')
+    parser.add_argument('--only', default='',
+                        help='Medir solo estos benchmarks (separados por comas)')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='No medir la memoria máxima (más rápido)')
+    parser.add_argument('--output', help='Guardar los resultados en este archivo JSON')
+    parser.add_argument('--save-baseline', help='Guardar los resultados como línea base')
+    parser.add_argument('--compare', help='Comparar contra una línea base guardada')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Regresión tolerada respecto a la línea base (0.25 = 25%%)')
+    parser.add_argument('--min-time', type=float, default=0.001,
+                        help='Ignorar en la comparación mediciones base menores a estos segundos')
+    args = parser.parse_args(argv)
+
+    sizes = [parse_size(size) for size in args.sizes.split(',') if size.strip()]
+    only = [name.strip() for name in args.only.split(',') if name.strip()]
+    report = run(sizes, args.repeat, not args.no_memory, only)
+
+    for path in filter(None, (args.output, args.save_baseline)):
+        Path(path).write_text(json.dumps(report, indent=2), encoding='utf-8')
+
+    missed = missed_targets(report)
+    if missed:
+        print('Objetivos no alcanzados:', file=sys.stderr)
+        for line in missed:
+            print(f'  {line}', file=sys.stderr)
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding='utf-8'))
+        regressions = compare(report, baseline, args.threshold, args.min_time)
+        if regressions:
+            print('Regresiones detectadas:', file=sys.stderr)
+            for line in regressions:
+                print(f'  {line}', file=sys.stderr)
+            return 1
+        print('Sin regresiones respecto a la línea base', file=sys.stderr)
+    return 1 if missed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""
+Perfil de arranque de Textual Guardian.
+
+Cada medición corre en un intérprete nuevo, como el primer pedido después
+de ``podman run``: importación de Streamlit y de la aplicación, carga del
+paquete de reglas, primer análisis y análisis en caliente (otro texto del
+mismo tamaño). Con ``--warm-up`` se llama antes a ``TextAnalyzer.warm_up``,
+igual que hacen la aplicación y el servicio al arrancar.
+
+Uso:
+    python benchmarks/startup_profile.py
+    python benchmarks/startup_profile.py --runs 5 --warm-up --cold-rules
+    python benchmarks/startup_profile.py --imports 15 --json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Dependencias que no deberían cargarse al importar la aplicación
+HEAVY_MODULES = ('pandas', 'pyarrow', 'numpy')
+
+# Programa que corre en cada proceso nuevo e imprime sus tiempos en JSON;
+# recibe la raíz del proyecto, el tamaño del texto y si se llama a warm_up
+CHILD = r'''
+import json, sys, time
+root, size, warm_up = sys.argv[1], int(sys.argv[2]), sys.argv[3] == '1'
+sys.path[:0] = [root, root + '/benchmarks']
+stages = {}
+
+def measure(name, func):
+    started = time.perf_counter()
+    value = func()
+    stages[name] = time.perf_counter() - started
+    return value
+
+measure('import_streamlit', lambda: __import__('streamlit'))
+measure('import_app', lambda: __import__('streamlit_app'))
+heavy = [name for name in sys.argv[4:] if name in sys.modules]
+
+from run_benchmarks import generate_text
+from text_analyzer import TextAnalyzer
+first, second = generate_text(size, seed=1), generate_text(size, seed=2)
+
+def analyze(analyzer, text):
+    doc = analyzer.tokenize(text)
+    analyzer.analyze_text(doc)
+    analyzer.sentence_metrics(doc, analyzer.find_highlight_spans(doc))
+
+analyzer = measure('rule_pack', TextAnalyzer)
+if warm_up:
+    measure('warm_up', analyzer.warm_up)
+measure('first_analysis', lambda: analyze(analyzer, first))
+measure('warm_analysis', lambda: analyze(analyzer, second))
+measure('import_dataframes', lambda: (__import__('pandas'), __import__('pyarrow')))
+print(json.dumps({'stages': stages, 'heavy_modules': heavy}))
+'''
+
+STAGE_LABELS = {
+    'import_streamlit': 'import streamlit',
+    'import_app': 'import streamlit_app',
+    'rule_pack': 'carga del paquete de reglas',
+    'warm_up': 'warm_up()',
+    'first_analysis': 'primer análisis',
+    'warm_analysis': 'análisis en caliente',
+    'import_dataframes': 'import pandas + pyarrow (diferido)'
+}
+
+
+def run_child(size: int, warm_up: bool, cold_rules: bool) -> Dict:
+    """Ejecuta una medición en un proceso nuevo"""
+    command = [sys.executable, '-c', CHILD, str(ROOT), str(size), '1' if warm_up else '0',
+               *HEAVY_MODULES]
+    env = dict(os.environ)
+    with tempfile.TemporaryDirectory() as cache:
+        if cold_rules:
+            env['TEXTUAL_GUARDIAN_RULE_CACHE'] = cache
+        output = subprocess.run(command, env=env, cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout
+    return json.loads(output)
+
+
+def slowest_imports(count: int) -> List[Dict]:
+    """Módulos importados directamente por la aplicación, ordenados por costo acumulado"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import streamlit_app'],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        # import time: propio | acumulado | nombre (sangrado según la profundidad)
+        _, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 1:
+            entries.append({'module': name.strip(), 'seconds': int(cumulative_us) / 1e6})
+    return sorted(entries, key=lambda entry: entry['seconds'], reverse=True)[:count]
+
+
+def summarize(reports: List[Dict]) -> Dict[str, float]:
+    """Mediana de cada etapa entre todas las ejecuciones"""
+    names = reports[0]['stages']
+    return {name: statistics.median(report['stages'][name] for report in reports) for name in names}
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Perfil de arranque de Textual Guardian')
+    parser.add_argument('--runs', type=int, default=3, help='Procesos a medir (se toma la mediana)')
+    parser.add_argument('--size', type=int, default=10_000, help='Bytes del texto analizado')
+    parser.add_argument('--warm-up', action='store_true',
+                        help='Llamar a TextAnalyzer.warm_up antes del primer análisis')
+    parser.add_argument('--cold-rules', action='store_true',
+                        help='Usar una caché de reglas vacía (sin artefactos precompilados)')
+    parser.add_argument('--imports', type=int, default=0,
+                        help='Mostrar las N importaciones más lentas de la aplicación (-X importtime)')
+    parser.add_argument('--json', action='store_true', help='Imprimir el reporte en JSON')
+    args = parser.parse_args(argv)
+
+    reports = [run_child(args.size, args.warm_up, args.cold_rules) for _ in range(args.runs)]
+    stages = summarize(reports)
+    heavy = sorted({name for report in reports for name in report['heavy_modules']})
+    ratio = stages['first_analysis'] / stages['warm_analysis'] if stages['warm_analysis'] else None
+    report = {
+        'python': sys.version.split()[0],
+        'runs': args.runs,
+        'size': args.size,
+        'warm_up': args.warm_up,
+        'cold_rules': args.cold_rules,
+        'stages': stages,
+        'heavy_modules_at_import': heavy,
+        'first_to_warm_ratio': ratio
+    }
+    if args.imports:
+        report['slowest_imports'] = slowest_imports(args.imports)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+
+    for name, seconds in stages.items():
+        print(f'{STAGE_LABELS.get(name, name):<38} {seconds * 1000:>9.2f} ms')
+    print(f"{'módulos pesados al importar la app':<38} {', '.join(heavy) or 'ninguno':>12}")
+    if ratio is not None:
+        print(f"{'primer análisis / en caliente':<38} {ratio:>10.2f}x")
+    for entry in report.get('slowest_imports', []):
+        print(f"  {entry['module']:<36} {entry['seconds'] * 1000:>9.2f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
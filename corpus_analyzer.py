@@ -0,0 +1,410 @@
+"""
+Estadísticas de un corpus completo (p. ej. todas las entregas de un curso).
+
+Los documentos se recorren una sola vez y sus conteos se guardan en una
+matriz documento-término dispersa (NumPy), a partir de la cual se calculan
+con operaciones vectorizadas las tablas de frecuencias del corpus y los
+documentos atípicos. Las frases repetidas se cuentan en el mismo recorrido
+con ``phrase_sketch.PhraseCounter``, con memoria acotada.
+
+Uso:
+    python corpus_analyzer.py entregas/ --output-dir reporte/
+"""
+import argparse
+import os
+import sys
+import time
+from typing import Dict, Iterable, List, Mapping, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from phrase_sketch import DEFAULT_PHRASE_MEMORY, DEFAULT_TOP_PHRASES, PhraseCounter
+from text_analyzer import COMMA_Y_PATTERN, TextAnalyzer, TokenizedDocument, token_hash
+
+# Categorías de términos de la matriz (mismas claves que analyze_text)
+CATEGORIES = (
+    'specific_word_counts', 'repeated_words', 'participios', 'gerundios',
+    'forbidden_expressions', 'problematic_adjectives', 'comma_before_y'
+)
+
+# Término único de la categoría 'comma_before_y'
+COMMA_Y_TERM = ', y'
+
+
+class DocumentTermMatrix:
+    """
+    Matriz dispersa documentos × términos en formato CSR.
+
+    Cada columna es un par (categoría, término); un mismo término puede
+    aparecer en varias categorías (p. ej. "pero" es una palabra contada y una
+    expresión prohibida). Los valores son cantidades de apariciones.
+    """
+
+    def __init__(self, documents: List, categories: List[str], terms: List[str],
+                 rows: np.ndarray, cols: np.ndarray, counts: np.ndarray,
+                 word_counts: np.ndarray):
+        self.documents = list(documents)
+        self.categories = np.asarray(categories, dtype=object)
+        self.terms = np.asarray(terms, dtype=object)
+        self.word_counts = np.asarray(word_counts, dtype=np.int64)
+
+        order = np.lexsort((cols, rows))
+        self.indices = np.asarray(cols, dtype=np.int32)[order]
+        self.data = np.asarray(counts, dtype=np.int64)[order]
+        self.indptr = np.zeros(len(self.documents) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(self.documents)), out=self.indptr[1:])
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return len(self.documents), len(self.terms)
+
+    @property
+    def nnz(self) -> int:
+        return len(self.data)
+
+    @property
+    def rows(self) -> np.ndarray:
+        """Fila de cada valor almacenado"""
+        return np.repeat(np.arange(len(self.documents)), np.diff(self.indptr))
+
+    @property
+    def columns(self) -> pd.MultiIndex:
+        return pd.MultiIndex.from_arrays([self.categories, self.terms], names=['category', 'term'])
+
+    def document_counts(self, index: int) -> Dict[Tuple[str, str], int]:
+        """Conteos no nulos de un documento, por (categoría, término)"""
+        start, end = self.indptr[index], self.indptr[index + 1]
+        return {
+            (self.categories[col], self.terms[col]): int(count)
+            for col, count in zip(self.indices[start:end], self.data[start:end])
+        }
+
+    def to_long(self) -> pd.DataFrame:
+        """Formato largo: una fila por (documento, categoría, término) no nulo"""
+        return pd.DataFrame({
+            'document': np.asarray(self.documents, dtype=object)[self.rows],
+            'category': self.categories[self.indices],
+            'term': self.terms[self.indices],
+            'count': self.data
+        })
+
+    def to_frame(self, categories: Iterable[str] = None) -> pd.DataFrame:
+        """DataFrame con columnas dispersas de pandas (opcionalmente solo algunas categorías)"""
+        selected = np.arange(len(self.terms))
+        if categories is not None:
+            selected = selected[np.isin(self.categories, list(categories))]
+
+        # Ordenar los valores por columna para cortar cada columna sin copiarla entera
+        rows = self.rows
+        order = np.argsort(self.indices, kind='stable')
+        bounds = np.searchsorted(self.indices[order], np.arange(len(self.terms) + 1))
+        dtype = pd.SparseDtype(np.int64, 0)
+        columns = {}
+        for col in selected:
+            values = order[bounds[col]:bounds[col + 1]]
+            dense = np.zeros(len(self.documents), dtype=np.int64)
+            dense[rows[values]] = self.data[values]
+            columns[col] = pd.arrays.SparseArray(dense, dtype=dtype)
+        frame = pd.DataFrame(columns, index=pd.Index(self.documents, name='document'))
+        frame.columns = self.columns[selected]
+        return frame
+
+    def to_scipy(self):
+        """Matriz scipy.sparse.csr_matrix (requiere scipy)"""
+        from scipy.sparse import csr_matrix
+        return csr_matrix((self.data, self.indices, self.indptr), shape=self.shape)
+
+
+class CorpusAnalyzer:
+    """
+    Construye la matriz documento-término de un corpus y sus estadísticas.
+
+    Los documentos se procesan por bloques: dentro de cada bloque los tokens
+    de todos los documentos se codifican y cuentan de una vez con NumPy, y
+    solo el vocabulario nuevo pasa por las reglas del analizador.
+    """
+
+    def __init__(self, analyzer: TextAnalyzer = None, batch_size: int = 1000,
+                 phrase_memory: int = DEFAULT_PHRASE_MEMORY, top_phrases: int = DEFAULT_TOP_PHRASES):
+        self.analyzer = analyzer or TextAnalyzer()
+        self.batch_size = batch_size
+        self.phrase_memory = phrase_memory
+        self.top_phrases = top_phrases
+        # Frases del último corpus recorrido por build_matrix
+        self.phrases = None
+
+    def _classify(self, term: str) -> List[str]:
+        """Categorías de palabra suelta a las que pertenece un término"""
+        analyzer = self.analyzer
+        categories = []
+        if term in analyzer.specific_words:
+            categories.append('specific_word_counts')
+        if len(term) > 2 and term not in analyzer.common_words:
+            categories.append('repeated_words')
+        if analyzer.is_participio(term):
+            categories.append('participios')
+        if analyzer.is_gerundio(term):
+            categories.append('gerundios')
+        if term in analyzer.forbidden_matcher.words:
+            categories.append('forbidden_expressions')
+        if term in analyzer.adjective_matcher.words:
+            categories.append('problematic_adjectives')
+        return categories
+
+    def build_matrix(self, documents: Union[Mapping[str, str], Iterable[str]]) -> DocumentTermMatrix:
+        """
+        Recorre los documentos (un diccionario id -> texto o una secuencia de
+        textos) y devuelve su matriz documento-término. Las frases repetidas
+        quedan en ``self.phrases``
+        """
+        items = documents.items() if isinstance(documents, Mapping) else enumerate(documents)
+        matchers = (
+            ('forbidden_expressions', self.analyzer.forbidden_matcher),
+            ('problematic_adjectives', self.analyzer.adjective_matcher)
+        )
+
+        columns: Dict[Tuple[str, str], int] = {}
+        # Columnas de palabra suelta de cada término ya visto
+        term_columns: Dict[str, Tuple[Tuple[str, int], ...]] = {}
+        phrases = self.phrases = PhraseCounter(self.phrase_memory, self.top_phrases)
+        ids, word_counts = [], []
+        rows, cols, counts = [], [], []
+
+        def column(category: str, term: str) -> int:
+            index = columns.get((category, term))
+            if index is None:
+                index = columns[(category, term)] = len(columns)
+            return index
+
+        def flush(batch_tokens: List[str], batch_lengths: List[int], first_row: int):
+            if not batch_tokens:
+                return
+            codes, uniques = pd.factorize(np.asarray(batch_tokens, dtype=object))
+            token_rows = np.repeat(np.arange(len(batch_lengths)), batch_lengths)
+
+            # Conteo de cada (documento, término) del bloque
+            keys, pair_counts = np.unique(token_rows * len(uniques) + codes, return_counts=True)
+            pair_rows, pair_codes = np.divmod(keys, len(uniques))
+
+            # Columna de cada término del bloque en cada categoría (-1 si no
+            # aplica); las palabras de contenido son las de 'repeated_words'
+            mapping = {category: np.full(len(uniques), -1, dtype=np.int64) for category in CATEGORIES}
+            word_hashes = np.empty(len(uniques), dtype=np.uint64)
+            for code, term in enumerate(uniques):
+                found = term_columns.get(term)
+                if found is None:
+                    found = term_columns[term] = tuple(
+                        (category, column(category, term)) for category in self._classify(term)
+                    )
+                for category, index in found:
+                    mapping[category][code] = index
+                word_hashes[code] = token_hash(term)
+            content = mapping['repeated_words'] >= 0
+            phrases.add(batch_tokens, token_rows, word_hashes[codes], content[codes])
+
+            for category, term_map in mapping.items():
+                selected_cols = term_map[pair_codes]
+                mask = selected_cols >= 0
+                if category == 'repeated_words':
+                    mask &= pair_counts > 1
+                rows.append(pair_rows[mask] + first_row)
+                cols.append(selected_cols[mask])
+                counts.append(pair_counts[mask])
+
+        batch_tokens: List[str] = []
+        batch_lengths: List[int] = []
+        extra: Dict[Tuple[int, int], int] = {}
+        first_row = 0
+        for row, (doc_id, text) in enumerate(items):
+            doc = TokenizedDocument(text)
+            ids.append(doc_id)
+            word_counts.append(len(doc))
+            batch_tokens.extend(doc.tokens)
+            batch_lengths.append(len(doc))
+
+            # Expresiones de varias palabras y comas antes de 'y'
+            for category, matcher in matchers:
+                for _, _, expression in matcher.finditer_phrases(doc.lower):
+                    key = (row, column(category, expression))
+                    extra[key] = extra.get(key, 0) + 1
+            commas = len(COMMA_Y_PATTERN.findall(text))
+            if commas:
+                extra[(row, column('comma_before_y', COMMA_Y_TERM))] = commas
+
+            if len(batch_lengths) >= self.batch_size:
+                flush(batch_tokens, batch_lengths, first_row)
+                first_row = row + 1
+                batch_tokens, batch_lengths = [], []
+        flush(batch_tokens, batch_lengths, first_row)
+
+        if extra:
+            extra_keys = np.array(list(extra.keys()), dtype=np.int64)
+            rows.append(extra_keys[:, 0])
+            cols.append(extra_keys[:, 1])
+            counts.append(np.fromiter(extra.values(), dtype=np.int64, count=len(extra)))
+
+        empty = np.zeros(0, dtype=np.int64)
+        categories = [category for category, _ in columns]
+        terms = [term for _, term in columns]
+        return DocumentTermMatrix(
+            ids, categories, terms,
+            np.concatenate(rows) if rows else empty,
+            np.concatenate(cols) if cols else empty,
+            np.concatenate(counts) if counts else empty,
+            np.asarray(word_counts, dtype=np.int64)
+        )
+
+    @staticmethod
+    def frequencies(matrix: DocumentTermMatrix) -> pd.DataFrame:
+        """
+        Tabla de frecuencias del corpus por (categoría, término): apariciones,
+        documentos que lo usan y tasa por cada 1000 palabras
+        """
+        n_terms = len(matrix.terms)
+        occurrences = np.bincount(matrix.indices, weights=matrix.data, minlength=n_terms)
+        documents = np.bincount(matrix.indices, minlength=n_terms)
+        total_words = max(int(matrix.word_counts.sum()), 1)
+        table = pd.DataFrame({
+            'occurrences': occurrences.astype(np.int64),
+            'documents': documents,
+            'document_share': documents / max(len(matrix.documents), 1),
+            'per_1000_words': occurrences * 1000 / total_words
+        }, index=matrix.columns)
+        return table.sort_values(
+            ['occurrences', 'documents'], ascending=False, kind='stable'
+        ).sort_index(level='category', sort_remaining=False, kind='stable')
+
+    @staticmethod
+    def document_totals(matrix: DocumentTermMatrix) -> pd.DataFrame:
+        """Apariciones de cada categoría por documento, junto con su cantidad de palabras"""
+        category_codes = pd.Categorical(matrix.categories, categories=CATEGORIES).codes
+        keys = matrix.rows * len(CATEGORIES) + category_codes[matrix.indices]
+        totals = np.bincount(
+            keys, weights=matrix.data, minlength=len(matrix.documents) * len(CATEGORIES)
+        ).reshape(len(matrix.documents), len(CATEGORIES)).astype(np.int64)
+        table = pd.DataFrame(totals, columns=list(CATEGORIES),
+                             index=pd.Index(matrix.documents, name='document'))
+        table.insert(0, 'word_count', matrix.word_counts)
+        return table
+
+    @staticmethod
+    def outliers(totals: pd.DataFrame, threshold: float = 3.5) -> pd.DataFrame:
+        """
+        Documentos que usan una categoría muy por encima del resto del corpus.
+
+        Se compara la tasa por cada 1000 palabras con un z-score robusto
+        (mediana y desviación absoluta mediana), que no se deja arrastrar por
+        los mismos documentos atípicos que busca.
+        """
+        words = totals['word_count'].to_numpy(dtype=np.float64)
+        counts = totals[list(CATEGORIES)].to_numpy(dtype=np.float64)
+        rates = np.divide(counts * 1000, words[:, None], out=np.zeros_like(counts),
+                          where=words[:, None] > 0)
+
+        median = np.median(rates, axis=0)
+        mad = np.median(np.abs(rates - median), axis=0) * 1.4826
+        # Si más de la mitad de los documentos coincide, se usa la desviación estándar
+        scale = np.where(mad > 0, mad, rates.std(axis=0))
+        scores = np.divide(rates - median, scale, out=np.zeros_like(rates), where=scale > 0)
+
+        doc_index, category_index = np.nonzero(scores > threshold)
+        result = pd.DataFrame({
+            'document': totals.index.to_numpy()[doc_index],
+            'category': np.asarray(CATEGORIES, dtype=object)[category_index],
+            'count': counts[doc_index, category_index].astype(np.int64),
+            'per_1000_words': rates[doc_index, category_index],
+            'corpus_median': median[category_index],
+            'zscore': scores[doc_index, category_index]
+        })
+        return result.sort_values('zscore', ascending=False, ignore_index=True)
+
+    def phrase_table(self) -> pd.DataFrame:
+        """
+        Frases repetidas más frecuentes del último corpus recorrido, con su
+        cantidad de palabras y de apariciones; 'approximate' indica si los
+        conteos son estimaciones del sketch
+        """
+        entries = self.phrases.top() if self.phrases is not None else []
+        table = pd.DataFrame(entries, columns=['phrase', 'words', 'occurrences'])
+        table['approximate'] = self.phrases is not None and self.phrases.approximate
+        return table
+
+    def analyze(self, documents: Union[Mapping[str, str], Iterable[str]],
+                outlier_threshold: float = 3.5) -> Dict:
+        """
+        Analiza un corpus y devuelve la matriz documento-término ('matrix'), la
+        tabla de frecuencias ('frequencies'), los totales por documento
+        ('documents'), los documentos atípicos ('outliers') y las frases
+        repetidas ('phrases')
+        """
+        matrix = self.build_matrix(documents)
+        totals = self.document_totals(matrix)
+        return {
+            'matrix': matrix,
+            'frequencies': self.frequencies(matrix),
+            'documents': totals,
+            'outliers': self.outliers(totals, outlier_threshold),
+            'phrases': self.phrase_table()
+        }
+
+
+def read_documents(paths: List[str], encoding: str = 'utf-8') -> Iterable[Tuple[str, str]]:
+    """Genera (ruta, texto) de cada archivo; los ilegibles se informan y se omiten"""
+    for path in paths:
+        try:
+            with open(path, encoding=encoding) as source:
+                yield path, source.read()
+        except (OSError, UnicodeDecodeError) as error:
+            print(f'{path}: {error}', file=sys.stderr)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='python corpus_analyzer.py',
+        description='Genera tablas de frecuencias y documentos atípicos de un corpus'
+    )
+    parser.add_argument('inputs', nargs='+', help='Directorios, archivos o patrones glob')
+    parser.add_argument('--pattern', default='*.txt',
+                        help='Patrón de archivos dentro de los directorios (por defecto: *.txt)')
+    parser.add_argument('--output-dir', default='.',
+                        help='Directorio donde se escriben los CSV del reporte')
+    parser.add_argument('--threshold', type=float, default=3.5,
+                        help='z-score robusto a partir del cual un documento es atípico')
+    parser.add_argument('--phrase-memory-mb', type=float, default=DEFAULT_PHRASE_MEMORY / (1 << 20),
+                        help='Memoria para contar frases repetidas; si no alcanza, '
+                             'los conteos pasan a ser aproximados (por defecto: 64)')
+    return parser
+
+
+def main(argv: List[str] = None) -> int:
+    from batch_analyzer import collect_paths
+
+    args = build_parser().parse_args(argv)
+    paths = collect_paths(args.inputs, args.pattern)
+    if not paths:
+        print('No se encontraron archivos para analizar', file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    analyzer = CorpusAnalyzer(phrase_memory=int(args.phrase_memory_mb * (1 << 20)))
+    report = analyzer.analyze(dict(read_documents(paths)), args.threshold)
+    os.makedirs(args.output_dir, exist_ok=True)
+    report['frequencies'].to_csv(os.path.join(args.output_dir, 'frequencies.csv'))
+    report['documents'].to_csv(os.path.join(args.output_dir, 'documents.csv'))
+    report['outliers'].to_csv(os.path.join(args.output_dir, 'outliers.csv'), index=False)
+    report['phrases'].to_csv(os.path.join(args.output_dir, 'phrases.csv'), index=False)
+
+    matrix = report['matrix']
+    print(
+        f'{matrix.shape[0]} documentos, {matrix.shape[1]} términos, '
+        f'{len(report["outliers"])} valores atípicos, {len(report["phrases"])} frases repetidas'
+        f'{" (conteos aproximados)" if analyzer.phrases.approximate else ""} '
+        f'en {time.perf_counter() - start:.2f} s',
+        file=sys.stderr
+    )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
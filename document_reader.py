@@ -0,0 +1,158 @@
+"""
+Lectura de documentos de Word (.docx) y LibreOffice (.odt).
+
+Ambos formatos son archivos ZIP con el texto en un XML. El XML se
+descomprime y se recorre por partes (iterparse), entregando cada párrafo
+apenas termina y descartando los elementos ya leídos, por lo que la memoria
+no depende del tamaño del documento ni de sus imágenes.
+
+Uso:
+    python document_reader.py tesis.docx
+"""
+import json
+import sys
+import zipfile
+from typing import IO, Dict, Iterator, List, Union
+from xml.etree.ElementTree import Element, ParseError, iterparse
+
+from text_analyzer import TextAnalyzer
+
+WORD_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+TEXT_NS = '{urn:oasis:names:tc:opendocument:xmlns:text:1.0}'
+OFFICE_NS = '{urn:oasis:names:tc:opendocument:xmlns:office:1.0}'
+
+# Notas al pie y comentarios de .odt: van dentro del párrafo pero su texto
+# no forma parte de él
+ODT_ASIDES = (f'{TEXT_NS}note', f'{OFFICE_NS}annotation')
+
+# Formatos admitidos: XML con el cuerpo del documento, etiquetas de párrafo
+# y elementos cuyos párrafos se omiten
+DOCUMENT_FORMATS = {
+    'docx': ('word/document.xml', (f'{WORD_NS}p',), ()),
+    'odt': ('content.xml', (f'{TEXT_NS}p', f'{TEXT_NS}h'), ODT_ASIDES)
+}
+
+class DocumentError(ValueError):
+    """Documento inexistente, dañado o de un formato no admitido"""
+
+
+def _docx_text(paragraph: Element) -> str:
+    parts = []
+    for element in paragraph.iter():
+        if element.tag == f'{WORD_NS}t':
+            parts.append(element.text or '')
+        elif element.tag == f'{WORD_NS}tab':
+            parts.append('\t')
+        elif element.tag in (f'{WORD_NS}br', f'{WORD_NS}cr'):
+            parts.append('\n')
+    return ''.join(parts)
+
+
+def _odt_text(element: Element) -> str:
+    parts = [element.text or '']
+    for child in element:
+        if child.tag == f'{TEXT_NS}s':
+            parts.append(' ' * int(child.get(f'{TEXT_NS}c', 1)))
+        elif child.tag == f'{TEXT_NS}tab':
+            parts.append('\t')
+        elif child.tag == f'{TEXT_NS}line-break':
+            parts.append('\n')
+        elif child.tag not in ODT_ASIDES:
+            parts.append(_odt_text(child))
+        parts.append(child.tail or '')
+    return ''.join(parts)
+
+
+def detect_format(archive: zipfile.ZipFile) -> str:
+    """Formato del documento según su contenido ('docx' u 'odt')"""
+    names = set(archive.namelist())
+    if 'word/document.xml' in names:
+        return 'docx'
+    if 'content.xml' in names and 'mimetype' in names:
+        if archive.read('mimetype').strip() == b'application/vnd.oasis.opendocument.text':
+            return 'odt'
+    raise DocumentError('El archivo no es un documento .docx ni .odt')
+
+
+def iter_paragraphs(source: Union[str, IO[bytes]]) -> Iterator[str]:
+    """
+    Genera el texto de cada párrafo del documento, en orden, incluidos los
+    párrafos vacíos (así la numeración coincide con la del archivo)
+    """
+    try:
+        with zipfile.ZipFile(source) as archive:
+            kind = detect_format(archive)
+            member, paragraph_tags, skipped_tags = DOCUMENT_FORMATS[kind]
+            to_text = _docx_text if kind == 'docx' else _odt_text
+            with archive.open(member) as xml:
+                # Pila de elementos abiertos: los elementos terminados se
+                # quitan de su padre para no acumular el árbol completo,
+                # salvo el contenido del párrafo que se está leyendo
+                stack: List[Element] = []
+                open_paragraphs = 0
+                skipping = 0
+                for event, element in iterparse(xml, events=('start', 'end')):
+                    is_paragraph = element.tag in paragraph_tags
+                    if event == 'start':
+                        stack.append(element)
+                        open_paragraphs += is_paragraph
+                        skipping += element.tag in skipped_tags
+                        continue
+                    stack.pop()
+                    if is_paragraph:
+                        open_paragraphs -= 1
+                        if not skipping:
+                            yield to_text(element)
+                    skipping -= element.tag in skipped_tags
+                    if stack and (is_paragraph or not open_paragraphs):
+                        stack[-1].remove(element)
+    except (OSError, zipfile.BadZipFile, KeyError, ParseError) as error:
+        raise DocumentError(f'No se pudo leer el documento: {error}') from error
+
+
+def analyze_document(source: Union[str, IO[bytes]], analyzer: TextAnalyzer = None,
+                     preview_chars: int = 120) -> Dict:
+    """
+    Analiza un documento párrafo a párrafo. Además del resultado de
+    ``analyze_text`` devuelve 'paragraph_count' y 'paragraphs': para cada
+    párrafo con hallazgos, su número en el documento, el comienzo de su
+    texto y los hallazgos que contiene.
+    """
+    analyzer = analyzer or TextAnalyzer()
+    located = []
+    paragraph_count = 0
+
+    def locate(number: int, paragraph: str, findings: Dict[str, List[str]]):
+        preview = paragraph.strip()
+        if len(preview) > preview_chars:
+            preview = preview[:preview_chars] + '…'
+        located.append({'paragraph': number, 'preview': preview, 'findings': findings})
+
+    def counted(paragraphs: Iterator[str]) -> Iterator[str]:
+        nonlocal paragraph_count
+        for paragraph in paragraphs:
+            paragraph_count += 1
+            yield paragraph
+
+    results = analyzer.analyze_paragraphs(counted(iter_paragraphs(source)), locate)
+    results['paragraph_count'] = paragraph_count
+    results['paragraphs'] = located
+    return results
+
+
+def main(argv: List[str] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        print('Uso: python document_reader.py DOCUMENTO', file=sys.stderr)
+        return 1
+    try:
+        results = analyze_document(argv[0])
+    except DocumentError as error:
+        print(error, file=sys.stderr)
+        return 1
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,254 @@
+"""
+Léxico compacto de formas verbales (participios y gerundios).
+
+El léxico se compila a un archivo binario de solo lectura que se abre con
+mmap: todos los procesos que lo usan comparten las mismas páginas del
+sistema operativo, y cada búsqueda cuesta un hash de la palabra más una
+comparación, es decir O(longitud de la palabra).
+
+Formato del archivo (enteros little-endian):
+    cabecera   magic (8 bytes), número de casillas, número de palabras,
+               huella del contenido (16 bytes)
+    casillas   tabla hash de direccionamiento abierto; cada casilla guarda
+               1 + la posición del registro en el bloque de palabras, o 0
+    palabras   registros [longitud (1 byte)][marcas (1 byte)][palabra UTF-8]
+
+Uso:
+    python lexicon.py dicc.src --format eagles --output es-verbos.lex
+    python lexicon.py infinitivos.txt --format infinitives --output es-verbos.lex
+"""
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import zlib
+from array import array
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+MAGIC = b'TGLEX\x00\x01\x00'
+HEADER = struct.Struct('<8sII16s')
+
+# Marcas de cada forma
+PARTICIPIO = 1
+GERUNDIO = 2
+
+
+class LexiconError(ValueError):
+    """Archivo de léxico inexistente o mal formado"""
+
+
+class VerbLexicon:
+    """Léxico de formas verbales abierto en memoria compartida (mmap)"""
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        try:
+            with open(self.path, 'rb') as source:
+                self._data = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as error:
+            raise LexiconError(f'No se pudo abrir el léxico {path}: {error}') from error
+
+        if len(self._data) < HEADER.size:
+            raise LexiconError(f'El léxico {path} está truncado')
+        magic, slots, words, digest = HEADER.unpack_from(self._data)
+        if magic != MAGIC or slots & (slots - 1) or len(self._data) < HEADER.size + 4 * slots:
+            raise LexiconError(f'{path} no es un léxico válido')
+        self._mask = slots - 1
+        self._records = HEADER.size + 4 * slots
+        # Vista de las casillas sin copiarlas; la conversión de bytes solo
+        # hace falta en máquinas big-endian
+        self._slots = memoryview(self._data)[HEADER.size:self._records].cast('I')
+        if sys.byteorder != 'little':
+            self._slots = array('I', self._slots)
+            self._slots.byteswap()
+        self._words = words
+        self.digest = digest.hex()
+
+    def __reduce__(self):
+        # En otro proceso se vuelve a abrir el archivo en lugar de copiarlo
+        return load_lexicon, (self.path,)
+
+    def __len__(self) -> int:
+        return self._words
+
+    def flags(self, word: str) -> int:
+        """Marcas (PARTICIPIO, GERUNDIO) de una forma, o 0 si no está en el léxico"""
+        key = word.encode('utf-8')
+        data = self._data
+        slot = zlib.crc32(key) & self._mask
+        while True:
+            reference = self._slots[slot]
+            if not reference:
+                return 0
+            position = self._records + reference - 1
+            if data[position] == len(key) and data[position + 2:position + 2 + len(key)] == key:
+                return data[position + 1]
+            slot = (slot + 1) & self._mask
+
+    def __contains__(self, word: str) -> bool:
+        return self.flags(word) != 0
+
+    def is_participle(self, word: str) -> bool:
+        return bool(self.flags(word) & PARTICIPIO)
+
+    def is_gerund(self, word: str) -> bool:
+        return bool(self.flags(word) & GERUNDIO)
+
+    def close(self):
+        if isinstance(self._slots, memoryview):
+            self._slots.release()
+        self._data.close()
+
+
+def build_lexicon(entries: Iterable[Tuple[str, int]], path: str) -> int:
+    """
+    Compila pares (forma, marcas) en un archivo de léxico. Las marcas de una
+    forma repetida se combinan. Devuelve la cantidad de formas escritas.
+    """
+    forms: Dict[bytes, int] = {}
+    for word, flags in entries:
+        key = word.lower().encode('utf-8')
+        if not key or len(key) > 255 or not flags:
+            continue
+        forms[key] = forms.get(key, 0) | flags
+
+    # Factor de carga máximo de 0.5: las búsquedas fallidas terminan pronto
+    slots = 8
+    while slots < 2 * len(forms):
+        slots *= 2
+    table = [0] * slots
+    records = bytearray()
+    for key in sorted(forms):
+        slot = zlib.crc32(key) & (slots - 1)
+        while table[slot]:
+            slot = (slot + 1) & (slots - 1)
+        table[slot] = len(records) + 1
+        records += bytes((len(key), forms[key])) + key
+
+    table = array('I', table)
+    if sys.byteorder != 'little':
+        table.byteswap()
+    body = table.tobytes() + bytes(records)
+    digest = hashlib.blake2b(body, digest_size=16).digest()
+
+    # Escritura atómica: los procesos que ya tienen el léxico abierto siguen
+    # leyendo el archivo anterior
+    directory = os.path.dirname(os.path.abspath(path))
+    descriptor, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as target:
+            target.write(HEADER.pack(MAGIC, slots, len(forms), digest))
+            target.write(body)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+    return len(forms)
+
+
+def read_eagles(lines: Iterable[str]) -> Iterator[Tuple[str, int]]:
+    """
+    Lee un diccionario con etiquetas EAGLES (formato de FreeLing: una forma
+    seguida de pares lema etiqueta por línea). Los participios que también
+    pueden ser sustantivos ("resultado", "cuidado", "sentido") se omiten,
+    porque en un texto académico casi siempre se usan como sustantivos.
+    """
+    tags: Dict[str, set] = {}
+    for line in lines:
+        fields = line.split()
+        if len(fields) < 3:
+            continue
+        tags.setdefault(fields[0].lower(), set()).update(fields[2::2])
+
+    for form, form_tags in tags.items():
+        flags = 0
+        verbal = [tag for tag in form_tags if tag.startswith('V') and len(tag) > 2]
+        if any(tag[2] == 'P' for tag in verbal) and not any(tag.startswith('N') for tag in form_tags):
+            flags |= PARTICIPIO
+        if any(tag[2] == 'G' for tag in verbal):
+            flags |= GERUNDIO
+        if flags:
+            yield form, flags
+
+
+def conjugate(infinitive: str) -> Iterator[Tuple[str, int]]:
+    """Genera el participio (con sus cuatro formas) y el gerundio regulares de un verbo"""
+    infinitive = infinitive.strip().lower()
+    if len(infinitive) < 3:
+        return
+    stem, ending = infinitive[:-2], infinitive[-2:]
+    if ending == 'ar':
+        participle, gerund = stem + 'ad', stem + 'ando'
+    elif ending in ('er', 'ir', 'ír'):
+        # leer -> leído, leyendo; construir -> construido, construyendo
+        after_vowel = stem[-1:] in 'aeiouü' and not stem.endswith(('gu', 'qu'))
+        participle = stem + ('íd' if stem[-1:] in 'aeo' else 'id')
+        gerund = stem + ('yendo' if after_vowel else 'iendo')
+    else:
+        return
+    for suffix in ('o', 'a', 'os', 'as'):
+        yield participle + suffix, PARTICIPIO
+    yield gerund, GERUNDIO
+
+
+def read_infinitives(lines: Iterable[str]) -> Iterator[Tuple[str, int]]:
+    """Lee una lista de infinitivos (uno por línea) y genera sus formas regulares"""
+    for line in lines:
+        line = line.split('#', 1)[0].strip()
+        if line:
+            yield from conjugate(line)
+
+
+READERS = {
+    'eagles': read_eagles,
+    'infinitives': read_infinitives
+}
+
+
+@lru_cache(maxsize=4)
+def load_lexicon(path: str) -> VerbLexicon:
+    """Abre un léxico una sola vez por proceso"""
+    return VerbLexicon(path)
+
+
+def default_lexicon() -> Optional[VerbLexicon]:
+    """Léxico indicado por TEXTUAL_GUARDIAN_LEXICON, o None si no hay ninguno"""
+    path = os.environ.get('TEXTUAL_GUARDIAN_LEXICON')
+    return load_lexicon(os.path.abspath(path)) if path else None
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='python lexicon.py',
+        description='Compila un léxico de participios y gerundios'
+    )
+    parser.add_argument('sources', nargs='+', help='Archivos de entrada')
+    parser.add_argument('--format', choices=sorted(READERS), default='eagles',
+                        help='eagles: diccionario etiquetado (FreeLing); '
+                             'infinitives: lista de infinitivos regulares')
+    parser.add_argument('--encoding', default='utf-8', help='Codificación de las entradas')
+    parser.add_argument('--output', required=True, help='Archivo de léxico a generar')
+    return parser
+
+
+def main(argv: List[str] = None) -> int:
+    args = build_parser().parse_args(argv)
+    reader = READERS[args.format]
+
+    def entries() -> Iterator[Tuple[str, int]]:
+        for source in args.sources:
+            with open(source, encoding=args.encoding) as lines:
+                yield from reader(lines)
+
+    count = build_lexicon(entries(), args.output)
+    print(f'{count} formas en {args.output} ({os.path.getsize(args.output) / 1e6:.2f} MB)',
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
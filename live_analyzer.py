@@ -0,0 +1,126 @@
+"""
+Análisis en segundo plano mientras se escribe.
+
+Cada nueva versión del texto reemplaza a la pendiente; el análisis empieza
+cuando pasa la ventana de espera (debounce) sin cambios y su resultado se
+descarta si mientras tanto llegó una versión más nueva. Así la interfaz
+nunca espera un análisis viejo.
+"""
+import threading
+import time
+from typing import Any, Callable, NamedTuple, Optional
+
+
+class LiveResult(NamedTuple):
+    """Resultado publicado para una versión del texto"""
+    generation: int
+    text: str
+    value: Any
+    error: Optional[BaseException]
+    submitted: float
+    published: float
+
+    @property
+    def latency(self) -> float:
+        """Segundos entre el envío del texto y la publicación del resultado"""
+        return self.published - self.submitted
+
+
+class LiveAnalyzer:
+    """
+    Ejecuta ``analyze(text)`` en un hilo propio sobre la versión más reciente
+    del texto. ``submit`` nunca bloquea y ``latest`` devuelve el último
+    resultado vigente.
+    """
+
+    def __init__(self, analyze: Callable[[str], Any], debounce: float = 0.075):
+        self.analyze = analyze
+        self.debounce = debounce
+        self.dropped = 0
+        self._condition = threading.Condition()
+        self._generation = 0
+        self._pending: Optional[tuple] = None
+        self._running: Optional[int] = None
+        self._latest: Optional[LiveResult] = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='live-analyzer', daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str) -> int:
+        """Programa el análisis de una nueva versión del texto y devuelve su número"""
+        with self._condition:
+            self._generation += 1
+            self._pending = (self._generation, text, time.monotonic())
+            self._condition.notify_all()
+            return self._generation
+
+    @property
+    def generation(self) -> int:
+        """Número de la última versión enviada"""
+        return self._generation
+
+    @property
+    def busy(self) -> bool:
+        """Indica si hay una versión esperando o en análisis"""
+        with self._condition:
+            return self._pending is not None or self._running is not None
+
+    def latest(self) -> Optional[LiveResult]:
+        """Último resultado publicado (puede ser de una versión anterior a la actual)"""
+        return self._latest
+
+    def wait(self, generation: int = None, timeout: float = None) -> Optional[LiveResult]:
+        """Espera el resultado de una versión (por defecto, la última enviada)"""
+        generation = self._generation if generation is None else generation
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self._latest is None or self._latest.generation < generation:
+                # Una versión reemplazada por otra nunca se publica
+                if generation < self._generation and not self.busy:
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            return self._latest
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def _next(self) -> Optional[tuple]:
+        with self._condition:
+            while self._pending is None and not self._closed:
+                self._condition.wait()
+            # Esperar a que el texto deje de cambiar durante la ventana
+            while not self._closed:
+                remaining = self._pending[2] + self.debounce - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            if self._closed:
+                return None
+            job, self._pending = self._pending, None
+            self._running = job[0]
+            return job
+
+    def _run(self):
+        while True:
+            job = self._next()
+            if job is None:
+                return
+            generation, text, submitted = job
+            try:
+                value, error = self.analyze(text), None
+            except Exception as exc:
+                value, error = None, exc
+
+            with self._condition:
+                self._running = None
+                # Un resultado de una versión ya reemplazada se descarta
+                if generation == self._generation:
+                    self._latest = LiveResult(generation, text, value, error, submitted, time.monotonic())
+                else:
+                    self.dropped += 1
+                self._condition.notify_all()
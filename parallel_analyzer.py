@@ -0,0 +1,152 @@
+"""
+Análisis en paralelo de un solo documento muy grande.
+
+El texto se codifica una vez en UTF-8 dentro de un bloque de memoria
+compartida (multiprocessing.shared_memory) y se divide en piezas que
+terminan antes de una línea en blanco. Cada proceso del pool recibe solo el
+nombre del bloque y las posiciones de su pieza, la lee sin que el texto se
+serialice y devuelve su resultado parcial; los parciales se combinan en
+orden con ``FragmentMerger``, que corrige las oraciones, expresiones y
+comas partidas en las fronteras. El resultado es el mismo que el de
+``TextAnalyzer.analyze_text``.
+
+Uso:
+    python parallel_analyzer.py tesis.txt --workers 8
+"""
+import argparse
+import json
+import os
+import re
+import sys
+from multiprocessing import Pool, resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Optional, Tuple
+
+from text_analyzer import FragmentMerger, TextAnalyzer
+
+# Frontera entre piezas: después de un carácter ASCII visible y antes de los
+# espacios que contienen una línea en blanco. Así cada pieza termina en un
+# carácter que no es espacio y la siguiente empieza con todo el separador
+PIECE_BOUNDARY = re.compile(rb'[\x21-\x7e]\s*\n\s*\n')
+
+# Por debajo de este tamaño (en bytes) el análisis es secuencial
+MIN_PIECE_BYTES = 1 << 20
+
+# Analizador de cada proceso del pool
+_worker_analyzer: Optional[TextAnalyzer] = None
+
+
+def _init_worker(analyzer: TextAnalyzer):
+    global _worker_analyzer
+    _worker_analyzer = analyzer
+
+
+def analyze_piece(job: Tuple[str, int, int]) -> Optional[Tuple[Dict, str, str]]:
+    """
+    Resultado parcial y extremos de una pieza (nombre del bloque compartido,
+    inicio, fin), o None si la pieza está vacía
+    """
+    name, start, end = job
+    block = SharedMemory(name)
+    try:
+        piece = str(block.buf[start:end], 'utf-8')
+    finally:
+        block.close()
+    if not piece.strip():
+        return None
+    merger = FragmentMerger(_worker_analyzer)
+    return (_worker_analyzer.analyze_fragment(piece), *merger.edges(piece))
+
+
+def split_pieces(data: bytes, pieces: int, min_bytes: int = MIN_PIECE_BYTES) -> List[Tuple[int, int]]:
+    """
+    Posiciones (inicio, fin) de hasta `pieces` piezas de tamaño parecido del
+    texto codificado, cortadas solo en fronteras de párrafo
+    """
+    pieces = max(1, min(pieces, len(data) // max(min_bytes, 1)))
+    bounds = []
+    start = 0
+    for i in range(1, pieces):
+        match = PIECE_BOUNDARY.search(data, max(start, len(data) * i // pieces))
+        if match is None:
+            break
+        cut = match.start() + 1
+        bounds.append((start, cut))
+        start = cut
+    bounds.append((start, len(data)))
+    return bounds
+
+
+def analyze_parallel(text: str, analyzer: TextAnalyzer = None, workers: int = None,
+                     pieces_per_worker: int = 2, min_piece_bytes: int = MIN_PIECE_BYTES,
+                     pool: Pool = None) -> Dict:
+    """
+    Analiza `text` repartiéndolo entre `workers` procesos (por defecto, uno
+    por núcleo). Se puede pasar un ``pool`` ya creado con ``create_pool``
+    para no pagar el arranque de los procesos en cada llamada. Los textos
+    que no alcanzan para dos piezas se analizan en este proceso.
+    """
+    analyzer = analyzer or TextAnalyzer()
+    workers = workers or os.cpu_count() or 1
+    data = text.encode('utf-8')
+    bounds = split_pieces(data, workers * pieces_per_worker, min_piece_bytes)
+    if len(bounds) < 2:
+        return analyzer.analyze_text(text)
+
+    block = SharedMemory(create=True, size=len(data))
+    try:
+        block.buf[:len(data)] = data
+        del data
+        own_pool = pool is None
+        if own_pool:
+            pool = create_pool(analyzer, min(workers, len(bounds)))
+        try:
+            # Los parciales llegan en orden y se combinan mientras otros se calculan
+            merger = FragmentMerger(analyzer)
+            jobs = [(block.name, start, end) for start, end in bounds]
+            for piece in pool.imap(analyze_piece, jobs):
+                if piece is not None:
+                    merger.add(*piece)
+        finally:
+            if own_pool:
+                pool.close()
+                pool.join()
+    finally:
+        block.close()
+        block.unlink()
+    return merger.results()
+
+
+def create_pool(analyzer: TextAnalyzer, workers: int = None) -> Pool:
+    """Pool de procesos con una copia del analizador en cada uno"""
+    # Los procesos deben compartir el resource_tracker de este proceso: uno
+    # propio borraría al terminar los bloques compartidos que abrieron
+    resource_tracker.ensure_running()
+    return Pool(workers or os.cpu_count() or 1, initializer=_init_worker, initargs=(analyzer,))
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='python parallel_analyzer.py',
+        description='Analiza un documento de texto muy grande usando varios procesos'
+    )
+    parser.add_argument('path', help='Archivo de texto (UTF-8)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Procesos de análisis (por defecto: uno por núcleo)')
+    parser.add_argument('--language', default="🇪🇸 Español",
+                        help='Idioma o nombre del paquete de reglas')
+    args = parser.parse_args(argv)
+
+    try:
+        with open(args.path, encoding='utf-8') as source:
+            text = source.read()
+    except (OSError, UnicodeDecodeError) as error:
+        print(error, file=sys.stderr)
+        return 1
+    results = analyze_parallel(text, TextAnalyzer(language=args.language), args.workers)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,226 @@
+"""
+Frases repetidas de un corpus completo con memoria acotada.
+
+Cada frase de PHRASE_MIN_WORDS a PHRASE_MAX_WORDS palabras se identifica
+por un hash acumulado de los hashes de sus palabras (PHRASE_HASH_BASE),
+calculado con NumPy para todos los documentos de un bloque. Mientras la
+tabla de conteos cabe en el presupuesto de memoria los conteos son exactos;
+si lo supera, los conteos pasan a un count-min sketch de tamaño fijo y solo
+se conservan las frases más frecuentes (heavy hitters), con conteos
+estimados que nunca quedan por debajo del valor real.
+"""
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from text_analyzer import PHRASE_HASH_BASE, PHRASE_MAX_WORDS, PHRASE_MIN_WORDS
+
+# Presupuesto de memoria por defecto de los conteos (bytes)
+DEFAULT_PHRASE_MEMORY = 64 << 20
+
+# Frases que se informan por defecto
+DEFAULT_TOP_PHRASES = 1000
+
+# Bytes por frase de la tabla exacta (hash y conteo)
+EXACT_ENTRY_BYTES = 16
+
+
+def iter_phrase_hashes(word_hashes: np.ndarray, rows: np.ndarray,
+                       content: np.ndarray) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+    """
+    Para cada longitud de frase genera (palabras, hashes, posiciones) de las
+    frases que no cruzan de un documento a otro y tienen al menos dos
+    palabras de contenido. `word_hashes` es el ``token_hash`` de cada token,
+    `rows` su documento y `content` si es una palabra de contenido.
+    """
+    base = np.uint64(PHRASE_HASH_BASE)
+    cumulative = np.concatenate(([0], np.cumsum(content, dtype=np.int64)))
+    hashes = word_hashes
+    for words in range(2, PHRASE_MAX_WORDS + 1):
+        count = len(word_hashes) - words + 1
+        if count <= 0:
+            return
+        # La multiplicación de uint64 es módulo 2**64, igual que HASH_MASK
+        hashes = hashes[:count] * base + word_hashes[words - 1:]
+        if words < PHRASE_MIN_WORDS:
+            continue
+        valid = rows[:count] == rows[words - 1:]
+        valid &= cumulative[words:] - cumulative[:count] >= 2
+        starts = np.flatnonzero(valid)
+        yield words, hashes[starts], starts
+
+
+class CountMinSketch:
+    """
+    Conteos aproximados en una tabla fija de `depth` filas × `width`
+    columnas. La estimación de una clave es el mínimo de sus `depth`
+    contadores: nunca menor que el conteo real.
+    """
+
+    def __init__(self, width: int, depth: int = 4, seed: int = 0):
+        bits = max(int(width), 2).bit_length() - 1
+        self.width = 1 << bits
+        self.depth = depth
+        self._shift = np.uint64(64 - bits)
+        # Multiplicadores impares: índice = (clave * a) >> (64 - bits)
+        rng = np.random.default_rng(seed)
+        self._multipliers = rng.integers(0, 1 << 63, size=depth, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self.table = np.zeros((depth, self.width), dtype=np.int64)
+
+    @classmethod
+    def for_memory(cls, memory_bytes: int, depth: int = 4, seed: int = 0) -> 'CountMinSketch':
+        """Sketch con el mayor ancho (potencia de 2) que entra en `memory_bytes`"""
+        return cls(max(memory_bytes // (depth * 8), 2), depth, seed)
+
+    @property
+    def nbytes(self) -> int:
+        return self.table.nbytes
+
+    def _columns(self, keys: np.ndarray) -> Iterator[np.ndarray]:
+        for multiplier in self._multipliers:
+            yield (keys * multiplier) >> self._shift
+
+    def add(self, keys: np.ndarray, counts: np.ndarray):
+        """Suma `counts` a cada clave (las claves no deben repetirse)"""
+        for row, columns in zip(self.table, self._columns(keys)):
+            np.add.at(row, columns, counts)
+
+    def estimate(self, keys: np.ndarray) -> np.ndarray:
+        estimates = None
+        for row, columns in zip(self.table, self._columns(keys)):
+            values = row[columns]
+            estimates = values if estimates is None else np.minimum(estimates, values)
+        return estimates if estimates is not None else np.zeros(len(keys), dtype=np.int64)
+
+
+class PhraseCounter:
+    """
+    Cuenta las frases de un corpus bloque por bloque.
+
+    Los conteos son exactos hasta que la tabla de frases distintas supera
+    `memory_bytes`; desde ese momento se usa un count-min sketch de ese
+    mismo tamaño. En ambos casos se guarda el texto de las `top` × 4 frases
+    más frecuentes hasta el momento (una frase entra a la lista, con su
+    texto, en un bloque donde aparece).
+    """
+
+    def __init__(self, memory_bytes: int = DEFAULT_PHRASE_MEMORY, top: int = DEFAULT_TOP_PHRASES,
+                 depth: int = 4):
+        self.memory_bytes = memory_bytes
+        self.top_count = top
+        self.depth = depth
+        self.sketch: CountMinSketch = None
+        self.keys = np.zeros(0, dtype=np.uint64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        # Texto de las frases candidatas, por hash
+        self.texts: Dict[int, str] = {}
+
+    @property
+    def approximate(self) -> bool:
+        """Indica si los conteos ya son estimaciones del sketch"""
+        return self.sketch is not None
+
+    @property
+    def nbytes(self) -> int:
+        """Memoria de los conteos (exactos o del sketch)"""
+        if self.sketch is not None:
+            return self.sketch.nbytes
+        return len(self.keys) * EXACT_ENTRY_BYTES
+
+    def count(self, keys: np.ndarray) -> np.ndarray:
+        """Conteo (exacto o estimado) de cada hash"""
+        if self.sketch is not None:
+            return self.sketch.estimate(keys)
+        positions = np.searchsorted(self.keys, keys)
+        found = positions < len(self.keys)
+        found[found] = self.keys[positions[found]] == keys[found]
+        counts = np.zeros(len(keys), dtype=np.int64)
+        counts[found] = self.counts[positions[found]]
+        return counts
+
+    def add(self, tokens: Sequence[str], rows: np.ndarray, word_hashes: np.ndarray, content: np.ndarray):
+        """
+        Cuenta las frases de un bloque de documentos: sus tokens, el
+        documento de cada token, el ``token_hash`` de cada token y si es una
+        palabra de contenido
+        """
+        hashes, starts, lengths = [], [], []
+        for words, phrase_hashes, phrase_starts in iter_phrase_hashes(word_hashes, rows, content):
+            hashes.append(phrase_hashes)
+            starts.append(phrase_starts)
+            lengths.append(np.full(len(phrase_starts), words, dtype=np.int64))
+        if not hashes:
+            return
+        # Frases distintas del bloque (ordenadas), su conteo y su primera aparición
+        codes, keys = pd.factorize(np.concatenate(hashes))
+        if not len(keys):
+            return
+        counts = np.bincount(codes, minlength=len(keys))
+        first = np.empty(len(keys), dtype=np.int64)
+        first[codes[::-1]] = np.arange(len(codes) - 1, -1, -1)
+        order = np.argsort(keys)
+        keys, counts, first = keys[order], counts[order], first[order]
+
+        if self.sketch is None:
+            self._add_exact(keys, counts)
+            if self.nbytes > self.memory_bytes:
+                self.sketch = CountMinSketch.for_memory(self.memory_bytes, self.depth)
+                self.sketch.add(self.keys, self.counts)
+                self.keys = self.counts = None
+        else:
+            self.sketch.add(keys, counts)
+
+        # Candidatas: las que ya tenían texto y las del bloque; se conservan
+        # las más frecuentes que se repiten
+        held = np.fromiter(self.texts, dtype=np.uint64, count=len(self.texts))
+        pool = np.concatenate((keys, np.setdiff1d(held, keys, assume_unique=True)))
+        estimates = self.count(pool)
+        capacity = self.top_count * 4
+        if len(pool) > capacity:
+            selected = np.argpartition(-estimates, capacity - 1)[:capacity]
+            pool, estimates = pool[selected], estimates[selected]
+        keep = pool[estimates > 1]
+
+        starts, lengths = np.concatenate(starts), np.concatenate(lengths)
+        positions = np.searchsorted(keys, keep)
+        texts = {}
+        for key, position in zip(keep.tolist(), positions.tolist()):
+            text = self.texts.get(key)
+            if text is None:
+                index = first[position]
+                start = starts[index]
+                text = ' '.join(tokens[start:start + lengths[index]])
+            texts[key] = text
+        self.texts = texts
+
+    def _add_exact(self, keys: np.ndarray, counts: np.ndarray):
+        positions = np.searchsorted(self.keys, keys)
+        found = positions < len(self.keys)
+        found[found] = self.keys[positions[found]] == keys[found]
+        self.counts[positions[found]] += counts[found]
+        new = ~found
+        self.keys = np.insert(self.keys, positions[new], keys[new])
+        self.counts = np.insert(self.counts, positions[new], counts[new])
+
+    def top(self, count: int = None) -> List[Tuple[str, int, int]]:
+        """
+        Frases más frecuentes como (frase, palabras, apariciones). Una frase
+        que aparece tantas veces como otra de una palabra más que la
+        contiene se omite.
+        """
+        count = self.top_count if count is None else count
+        keys = np.fromiter(self.texts, dtype=np.uint64, count=len(self.texts))
+        phrases = sorted(
+            ((text, text.count(' ') + 1, int(occurrences))
+             for text, occurrences in zip(self.texts.values(), self.count(keys))),
+            key=lambda entry: (-entry[2], -entry[1], entry[0])
+        )
+        # Apariciones máximas de las frases que contienen a cada frase
+        containing: Dict[str, int] = {}
+        for text, _, occurrences in phrases:
+            for part in (text.rsplit(' ', 1)[0], text.split(' ', 1)[1]):
+                containing[part] = max(containing.get(part, 0), occurrences)
+        return [
+            entry for entry in phrases if containing.get(entry[0], 0) < entry[2]
+        ][:count]
@@ -0,0 +1,342 @@
+"""
+Cachés de resultados de análisis compartidas entre sesiones.
+
+``ResultCache`` vive en la memoria del proceso. ``DiskResultCache`` guarda
+los resultados en SQLite, por lo que sobreviven a los reinicios y pueden
+compartirse entre réplicas que monten el mismo volumen.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Tipos de clave (ver text_key) que se guardan también en disco: resultados
+# pequeños y serializables en JSON. Las marcas y el HTML se recalculan
+DISK_KINDS = ('analysis', 'document')
+
+
+def text_key(text: str, rules_version: str, kind: str = 'analysis') -> str:
+    """Clave de caché a partir del contenido del texto y la versión de las reglas"""
+    digest = hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+    return f'{kind}:{rules_version}:{digest}'
+
+
+def estimate_size(obj: Any) -> int:
+    """Estima (en bytes) la memoria ocupada por un resultado de análisis"""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(estimate_size(key) + estimate_size(value) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item) for item in obj)
+    return size
+
+
+class ResultCache:
+    """
+    Caché LRU en memoria limitada por el tamaño aproximado de sus entradas.
+
+    Es segura entre hilos, por lo que una sola instancia puede compartirse
+    entre todas las sesiones de Streamlit del proceso.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, disk: 'DiskResultCache' = None):
+        self.max_bytes = max_bytes
+        # Segundo nivel opcional para los tipos de DISK_KINDS
+        self.disk = disk
+        self.hits = 0
+        self.misses = 0
+        self._bytes = 0
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Devuelve el valor guardado o None, marcándolo como usado"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        # Lo que no está en memoria puede haberlo calculado otro proceso
+        if self.disk is None or not self._persistent(key):
+            return None
+        value = self.disk.get(key)
+        if value is not None:
+            self._store(key, value, estimate_size(value))
+        return value
+
+    def put(self, key: str, value: Any, size: int = None):
+        """Guarda un valor y descarta los menos usados si se supera el límite"""
+        if self.disk is not None and self._persistent(key):
+            self.disk.put(key, value)
+        self._store(key, value, estimate_size(value) if size is None else size)
+
+    @staticmethod
+    def _persistent(key: str) -> bool:
+        return key.split(':', 1)[0] in DISK_KINDS
+
+    def _store(self, key: str, value: Any, size: int):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        """Devuelve el valor guardado o lo calcula y lo guarda"""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Aciertos, fallos, entradas y memoria estimada de la caché"""
+        lookups = self.hits + self.misses
+        stats = {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': len(self._entries),
+            'bytes': self._bytes
+        }
+        if self.disk is not None:
+            stats['disk'] = self.disk.stats()
+        return stats
+
+
+class DiskResultCache:
+    """
+    Caché persistente en un archivo SQLite, direccionada por contenido (las
+    claves de ``text_key`` ya incluyen el hash del texto y la versión de las
+    reglas) y limitada en tamaño: al superar ``max_bytes`` se descartan las
+    entradas usadas hace más tiempo.
+
+    Varios hilos, procesos y réplicas pueden compartir el archivo: SQLite en
+    modo WAL permite lecturas simultáneas con una escritura. El archivo debe
+    estar en un volumen local (no NFS). Los errores de la base se registran
+    y se tratan como fallos de caché: nunca interrumpen un análisis.
+    """
+
+    SCHEMA_VERSION = 1
+    SCHEMA = (
+        """CREATE TABLE IF NOT EXISTS entries (
+               key TEXT PRIMARY KEY,
+               value TEXT NOT NULL,
+               size INTEGER NOT NULL,
+               used REAL NOT NULL
+           ) WITHOUT ROWID""",
+        'CREATE INDEX IF NOT EXISTS entries_used ON entries (used)',
+        # Totales mantenidos por disparadores: consultarlos no recorre la tabla
+        """CREATE TABLE IF NOT EXISTS totals (
+               id INTEGER PRIMARY KEY CHECK (id = 0),
+               entries INTEGER NOT NULL,
+               bytes INTEGER NOT NULL
+           )""",
+        'INSERT OR IGNORE INTO totals VALUES (0, 0, 0)',
+        """CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN
+               UPDATE totals SET entries = entries + 1, bytes = bytes + new.size;
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN
+               UPDATE totals SET entries = entries - 1, bytes = bytes - old.size;
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE OF size ON entries BEGIN
+               UPDATE totals SET bytes = bytes + new.size - old.size;
+           END"""
+    )
+
+    # Al superar el límite se libera espacio hasta esta fracción, para no
+    # tener que descartar entradas en cada escritura
+    LOW_WATER = 0.9
+
+    def __init__(self, path: str, max_bytes: int = 1024 * 1024 * 1024, timeout: float = 5.0):
+        self.path = os.path.abspath(path)
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pid = None
+        # Momento del último uso de las entradas leídas: se escribe junto con
+        # la siguiente entrada nueva, así las lecturas nunca escriben
+        self._touched: Dict[str, float] = {}
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._lock:
+            self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Un proceso hijo (fork) no puede usar la conexión de su padre
+        if self._connection is not None and self._pid == os.getpid():
+            return self._connection
+        connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                                     check_same_thread=False)
+        connection.execute('PRAGMA journal_mode = WAL')
+        connection.execute('PRAGMA synchronous = NORMAL')
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            version = connection.execute('PRAGMA user_version').fetchone()[0]
+            if version != self.SCHEMA_VERSION:
+                # Es una caché: un esquema de otra versión se descarta
+                connection.execute('DROP TABLE IF EXISTS entries')
+                connection.execute('DROP TABLE IF EXISTS totals')
+                for statement in self.SCHEMA:
+                    connection.execute(statement)
+                connection.execute(f'PRAGMA user_version = {self.SCHEMA_VERSION}')
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            connection.close()
+            raise
+        self._connection, self._pid = connection, os.getpid()
+        return connection
+
+    def _failed(self, action: str, error: Exception):
+        self.errors += 1
+        logger.warning('Caché en disco %s: no se pudo %s: %s', self.path, action, error)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Devuelve el valor guardado o None"""
+        try:
+            with self._lock:
+                row = self._connect().execute(
+                    'SELECT value FROM entries WHERE key = ?', (key,)
+                ).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None
+                self.hits += 1
+                if len(self._touched) < 10000:
+                    self._touched[key] = time.time()
+        except sqlite3.Error as error:
+            self._failed('leer', error)
+            return None
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Any):
+        """Guarda un valor serializable en JSON y descarta entradas viejas si hace falta"""
+        data = json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+        size = len(key) + len(data.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        try:
+            with self._lock:
+                connection = self._connect()
+                touched, self._touched = self._touched, {}
+                connection.execute('BEGIN IMMEDIATE')
+                try:
+                    connection.executemany(
+                        'UPDATE entries SET used = ? WHERE key = ?',
+                        [(used, touched_key) for touched_key, used in touched.items()]
+                    )
+                    connection.execute(
+                        'INSERT INTO entries (key, value, size, used) VALUES (?, ?, ?, ?) '
+                        'ON CONFLICT (key) DO UPDATE SET value = excluded.value, '
+                        'size = excluded.size, used = excluded.used',
+                        (key, data, size, time.time())
+                    )
+                    total = connection.execute('SELECT bytes FROM totals').fetchone()[0]
+                    if total > self.max_bytes:
+                        self._evict(connection, total - int(self.max_bytes * self.LOW_WATER))
+                    connection.execute('COMMIT')
+                except BaseException:
+                    connection.execute('ROLLBACK')
+                    raise
+        except sqlite3.Error as error:
+            self._failed('escribir', error)
+
+    @staticmethod
+    def _evict(connection: sqlite3.Connection, excess: int):
+        """Borra las entradas usadas hace más tiempo hasta liberar `excess` bytes"""
+        keys = []
+        for key, size in connection.execute('SELECT key, size FROM entries ORDER BY used'):
+            keys.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        connection.executemany('DELETE FROM entries WHERE key = ?', keys)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        """Devuelve el valor guardado o lo calcula y lo guarda"""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def _totals(self) -> Tuple[int, int]:
+        with self._lock:
+            return self._connect().execute('SELECT entries, bytes FROM totals').fetchone()
+
+    def __len__(self) -> int:
+        return self._totals()[0]
+
+    def clear(self):
+        with self._lock:
+            self._touched.clear()
+            self._connect().execute('DELETE FROM entries')
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None and self._pid == os.getpid():
+                self._connection.close()
+            self._connection = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Aciertos y fallos de este proceso; entradas y bytes de todo el archivo"""
+        lookups = self.hits + self.misses
+        stats = {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'errors': self.errors,
+            'path': self.path,
+            'max_bytes': self.max_bytes
+        }
+        try:
+            stats['entries'], stats['bytes'] = self._totals()
+        except sqlite3.Error as error:
+            self._failed('leer los totales', error)
+        return stats
+
+
+def default_disk_cache() -> Optional[DiskResultCache]:
+    """
+    Caché en disco indicada por TEXTUAL_GUARDIAN_DISK_CACHE (ruta del archivo
+    SQLite) y limitada por TEXTUAL_GUARDIAN_DISK_CACHE_MB, o None si no hay
+    """
+    path = os.environ.get('TEXTUAL_GUARDIAN_DISK_CACHE')
+    if not path:
+        return None
+    max_mb = int(os.environ.get('TEXTUAL_GUARDIAN_DISK_CACHE_MB', '1024'))
+    try:
+        return DiskResultCache(path, max_bytes=max_mb * 1024 * 1024)
+    except (OSError, sqlite3.Error) as error:
+        logger.warning('No se pudo abrir la caché en disco %s: %s', path, error)
+        return None
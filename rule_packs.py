@@ -0,0 +1,341 @@
+"""
+Paquetes de reglas declarativos por idioma y por curso.
+
+Cada paquete es un archivo JSON o TOML en el directorio ``rules/`` (o en
+el indicado por TEXTUAL_GUARDIAN_RULES_DIR) con las listas de reglas del
+analizador y algunos ajustes (p. ej. la ventana de repeticiones cercanas).
+Un paquete puede heredar de otro con ``extends`` y redefinir solo algunas
+listas o ajustes. Los buscadores compilados se guardan en disco según
+el hash del archivo (como JSON, que al leerse no puede ejecutar código),
+y los paquetes se recargan solos cuando su archivo cambia.
+
+Uso (compilar por adelantado, p. ej. al construir la imagen):
+    python rule_packs.py
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+RULES_DIR = Path(__file__).resolve().parent / 'rules'
+DEFAULT_PACK = 'es'
+
+# El idioma de la interfaz no cambia las reglas: el texto analizado se
+# revisa siempre con las reglas de redacción académica en español
+LANGUAGE_PACKS = {
+    "🇪🇸 Español": "es",
+    "🇺🇸 English": "es"
+}
+
+# Listas de reglas que define un paquete
+RULE_FIELDS = (
+    'forbidden_expressions', 'problematic_adjectives', 'common_words',
+    'participio_exclusions', 'specific_words', 'connectors', 'abbreviations',
+    'leading_abbreviations'
+)
+
+# Ajustes de un paquete y su valor por defecto
+SETTING_DEFAULTS = {
+    # Dos apariciones de una palabra son una repetición cercana si caben en
+    # una ventana de este número de oraciones o de palabras
+    'repetition_window': 3,
+    'repetition_unit': 'sentences'
+}
+
+# Unidades de la ventana de repeticiones cercanas
+REPETITION_UNITS = ('sentences', 'tokens')
+
+# Listas que se compilan en buscadores de expresiones
+MATCHER_FIELDS = ('forbidden_expressions', 'problematic_adjectives')
+
+
+class RulePackError(ValueError):
+    """Paquete de reglas inexistente o mal formado"""
+
+
+class RulePack:
+    """Conjunto de reglas del analizador cargado desde un archivo"""
+
+    def __init__(self, name: str, rules: Dict[str, List[str]], title: str = '',
+                 description: str = '', digest: str = '', sources: Tuple[Path, ...] = (),
+                 settings: Dict = None):
+        self.name = name
+        self.title = title or name
+        self.description = description
+        self.digest = digest
+        self.sources = sources
+        for field in RULE_FIELDS:
+            setattr(self, field, tuple(rules[field]))
+        for setting, default in SETTING_DEFAULTS.items():
+            setattr(self, setting, (settings or {}).get(setting, default))
+
+    @property
+    def version(self) -> str:
+        """Versión del paquete (cambia con el contenido de sus archivos)"""
+        return self.digest[:16]
+
+    def __repr__(self) -> str:
+        return f'RulePack({self.name!r}, version={self.version!r})'
+
+
+def _read_rule_file(path: Path) -> Tuple[Dict, bytes]:
+    data = path.read_bytes()
+    try:
+        if path.suffix == '.toml':
+            if tomllib is None:
+                raise RulePackError(f'Se necesita Python 3.11+ o el paquete tomli para leer {path}')
+            content = tomllib.loads(data.decode('utf-8'))
+        else:
+            content = json.loads(data.decode('utf-8'))
+    except (ValueError, UnicodeDecodeError) as error:
+        raise RulePackError(f'No se pudo leer el paquete de reglas {path}: {error}') from error
+    if not isinstance(content, dict):
+        raise RulePackError(f'El paquete de reglas {path} debe ser un objeto')
+    return content, data
+
+
+def _validate(path: Path, content: Dict):
+    allowed = set(RULE_FIELDS) | set(SETTING_DEFAULTS) | {'name', 'description', 'extends'}
+    unknown = set(content) - allowed
+    if unknown:
+        raise RulePackError(f'Claves desconocidas en {path}: {", ".join(sorted(unknown))}')
+    for field in RULE_FIELDS:
+        values = content.get(field, [])
+        if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+            raise RulePackError(f"'{field}' en {path} debe ser una lista de textos")
+    window = content.get('repetition_window', 1)
+    if not isinstance(window, int) or isinstance(window, bool) or window < 1:
+        raise RulePackError(f"'repetition_window' en {path} debe ser un entero positivo")
+    if content.get('repetition_unit', REPETITION_UNITS[0]) not in REPETITION_UNITS:
+        raise RulePackError(
+            f"'repetition_unit' en {path} debe ser uno de: {', '.join(REPETITION_UNITS)}"
+        )
+
+
+def default_cache_dir() -> Path:
+    """Directorio de los buscadores compilados"""
+    configured = os.environ.get('TEXTUAL_GUARDIAN_RULE_CACHE')
+    if configured:
+        return Path(configured)
+    return Path.home() / '.cache' / 'textual-guardian' / 'rules'
+
+
+def compile_rule_pack(pack: RulePack, cache_dir: Optional[Path] = None):
+    """
+    Prepara los buscadores de un paquete, leyéndolos del caché en disco si
+    ya se compilaron antes para el mismo contenido
+    """
+    # Importación diferida: text_analyzer usa este módulo al crear analizadores
+    from text_analyzer import ExpressionMatcher, compile_matcher, register_matcher
+
+    cache_dir = default_cache_dir() if cache_dir is None else cache_dir
+    cache_file = cache_dir / f'{pack.name}-{pack.digest[:32]}-v{ExpressionMatcher.CACHE_FORMAT}.json'
+
+    # El directorio del caché puede ser escribible por otros: se guardan
+    # solo datos (nunca pickle) y cada buscador debe corresponder a las
+    # reglas del paquete, si no se vuelve a compilar
+    try:
+        data = json.loads(cache_file.read_text(encoding='utf-8'))
+        matchers = {}
+        for field in MATCHER_FIELDS:
+            matcher = ExpressionMatcher.from_data(data[field])
+            if matcher.expressions != ExpressionMatcher.normalize(getattr(pack, field)):
+                raise ValueError(f'El caché de {field} no corresponde al paquete')
+            matchers[field] = matcher
+        for field in MATCHER_FIELDS:
+            register_matcher(getattr(pack, field), matchers[field])
+        return
+    except (OSError, ValueError, AttributeError, KeyError, TypeError):
+        pass
+
+    matchers = {field: compile_matcher(getattr(pack, field)) for field in MATCHER_FIELDS}
+
+    # Escritura atómica: otros procesos pueden estar leyendo el mismo archivo
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        with os.fdopen(descriptor, 'w', encoding='utf-8') as target:
+            json.dump({field: matcher.to_data() for field, matcher in matchers.items()},
+                      target, ensure_ascii=False)
+        os.replace(temporary, cache_file)
+    except OSError:
+        # Sin caché en disco (p. ej. sistema de archivos de solo lectura)
+        pass
+
+
+class RulePackRegistry:
+    """
+    Carga paquetes de reglas por nombre y los recarga cuando sus archivos
+    cambian, sin reiniciar el proceso
+    """
+
+    EXTENSIONS = ('.json', '.toml')
+
+    def __init__(self, directories: List[Path] = None, cache_dir: Path = None,
+                 check_interval: float = 2.0):
+        if directories is None:
+            directories = [RULES_DIR]
+            extra = os.environ.get('TEXTUAL_GUARDIAN_RULES_DIR')
+            if extra:
+                directories.insert(0, Path(extra))
+        self.directories = [Path(directory) for directory in directories]
+        self.cache_dir = cache_dir
+        self.check_interval = check_interval
+        self._packs: Dict[str, Tuple[RulePack, Dict[Path, Tuple[int, int]], float]] = {}
+        self._lock = threading.RLock()
+
+    def available(self) -> List[str]:
+        """Nombres de los paquetes disponibles"""
+        names = set()
+        for directory in self.directories:
+            if directory.is_dir():
+                names.update(
+                    path.stem for path in directory.iterdir() if path.suffix in self.EXTENSIONS
+                )
+        return sorted(names)
+
+    def find(self, name: str) -> Path:
+        """Ruta del archivo de un paquete (los directorios se revisan en orden)"""
+        for directory in self.directories:
+            for extension in self.EXTENSIONS:
+                path = directory / f'{name}{extension}'
+                if path.is_file():
+                    return path
+        raise RulePackError(f'No existe el paquete de reglas {name!r}')
+
+    def get(self, name: str) -> RulePack:
+        """Devuelve el paquete, recargándolo si alguno de sus archivos cambió"""
+        entry = self._packs.get(name)
+        now = time.monotonic()
+        if entry is not None and now - entry[2] < self.check_interval:
+            return entry[0]
+
+        with self._lock:
+            entry = self._packs.get(name)
+            if entry is not None and self._signatures(entry[1]) == entry[1]:
+                self._packs[name] = (entry[0], entry[1], now)
+                return entry[0]
+            pack = self._load(name, ())
+            previous = entry[0] if entry is not None else None
+            if previous is not None and previous.digest == pack.digest:
+                pack = previous
+            else:
+                compile_rule_pack(pack, self.cache_dir)
+            signatures = {path: self._signature(path) for path in pack.sources}
+            self._packs[name] = (pack, signatures, now)
+            return pack
+
+    @staticmethod
+    def _signature(path: Path) -> Tuple[int, int]:
+        try:
+            stat = path.stat()
+        except OSError:
+            return (-1, -1)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _signatures(self, previous: Dict[Path, Tuple[int, int]]) -> Dict[Path, Tuple[int, int]]:
+        return {path: self._signature(path) for path in previous}
+
+    def _load(self, name: str, chain: Tuple[str, ...]) -> RulePack:
+        if name in chain:
+            raise RulePackError(f'Herencia circular de paquetes: {" -> ".join(chain + (name,))}')
+        path = self.find(name)
+        content, data = _read_rule_file(path)
+        _validate(path, content)
+
+        digest = hashlib.sha256(data)
+        rules = {field: [] for field in RULE_FIELDS}
+        settings = dict(SETTING_DEFAULTS)
+        sources = (path,)
+        base_name = content.get('extends')
+        if base_name:
+            base = self._load(base_name, chain + (name,))
+            rules.update({field: list(getattr(base, field)) for field in RULE_FIELDS})
+            settings.update({setting: getattr(base, setting) for setting in SETTING_DEFAULTS})
+            digest.update(base.digest.encode('ascii'))
+            sources += base.sources
+        for field in RULE_FIELDS:
+            if field in content:
+                rules[field] = content[field]
+        for setting in SETTING_DEFAULTS:
+            if setting in content:
+                settings[setting] = content[setting]
+
+        return RulePack(
+            name, rules,
+            title=content.get('name', ''),
+            description=content.get('description', ''),
+            digest=digest.hexdigest(),
+            sources=sources,
+            settings=settings
+        )
+
+
+_default_registry: Optional[RulePackRegistry] = None
+_default_registry_lock = threading.Lock()
+
+
+def default_registry() -> RulePackRegistry:
+    """Registro de paquetes compartido por todo el proceso"""
+    global _default_registry
+    if _default_registry is None:
+        with _default_registry_lock:
+            if _default_registry is None:
+                _default_registry = RulePackRegistry()
+    return _default_registry
+
+
+def resolve_pack_name(language: str) -> str:
+    """
+    Nombre del paquete para un idioma de la interfaz o un nombre de paquete.
+    TEXTUAL_GUARDIAN_RULE_PACK permite fijar el paquete de un despliegue
+    (p. ej. el de un curso).
+    """
+    if language in LANGUAGE_PACKS:
+        return os.environ.get('TEXTUAL_GUARDIAN_RULE_PACK') or LANGUAGE_PACKS[language]
+    return language or DEFAULT_PACK
+
+
+def get_rule_pack(language: str = DEFAULT_PACK) -> RulePack:
+    """Paquete de reglas para un idioma o nombre de paquete"""
+    return default_registry().get(resolve_pack_name(language))
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='python rule_packs.py',
+        description='Compila los paquetes de reglas y guarda sus buscadores en el caché en disco'
+    )
+    parser.add_argument('names', nargs='*', help='Paquetes a compilar (por defecto: todos)')
+    args = parser.parse_args(argv)
+
+    registry = default_registry()
+    try:
+        for name in args.names or registry.available():
+            started = time.perf_counter()
+            pack = registry.get(name)
+            print(f'{pack.name} {pack.version}: {(time.perf_counter() - started) * 1000:.1f} ms',
+                  file=sys.stderr)
+    except RulePackError as error:
+        print(error, file=sys.stderr)
+        return 1
+    print(f'Caché: {registry.cache_dir or default_cache_dir()}', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,225 @@
+"""
+Resultados de las sesiones de Streamlit en un almacén compartido.
+
+Cada sesión guarda en ``st.session_state`` solo la clave de su último
+análisis (``text_key``: hash del texto y versión de las reglas). El
+resultado vive una sola vez en ``SessionStore``, aunque lo muestren muchas
+sesiones, con un conteo de referencias y, si se pide, comprimido. Los
+objetos propios de cada sesión (analizadores incrementales, hilo de
+análisis en vivo) también se registran aquí, así las sesiones inactivas
+pueden liberarse desde cualquier otra: primero sus recursos, que solo
+sirven mientras se edita, y más tarde también su resultado.
+"""
+import os
+import pickle
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from result_cache import estimate_size
+
+# Minutos sin actividad tras los que se desaloja una sesión
+DEFAULT_IDLE_MINUTES = 30
+
+# Segundos sin actividad tras los que una sesión cuenta como inactiva y se
+# liberan sus recursos (se vuelven a crear si la sesión sigue editando)
+RESOURCE_IDLE_SECONDS = 120
+
+# Resultados descomprimidos que se conservan, para no descomprimir en cada ejecución
+DECODED_ENTRIES = 8
+
+
+class _Entry:
+    __slots__ = ('value', 'size', 'raw_size', 'refs')
+
+    def __init__(self, value: Any, size: int, raw_size: int):
+        self.value = value
+        self.size = size
+        self.raw_size = raw_size
+        self.refs = 0
+
+
+class _Session:
+    __slots__ = ('key', 'seen', 'resources')
+
+    def __init__(self, seen: float):
+        self.key: Optional[str] = None
+        self.seen = seen
+        self.resources: Dict[str, Any] = {}
+
+
+class SessionStore:
+    """
+    Resultados de análisis deduplicados por clave y referenciados por las
+    sesiones. Un resultado se descarta cuando ninguna sesión lo referencia.
+    Los recursos de una sesión sin actividad durante `resource_idle_seconds`
+    se pasan a `on_evict` para cerrarlos; tras `idle_seconds` la sesión se
+    desaloja y suelta también su resultado.
+
+    Es segura entre hilos. Con `compress=True` los resultados se guardan
+    serializados con pickle y comprimidos con zlib, y solo los últimos
+    DECODED_ENTRIES usados se conservan descomprimidos.
+    """
+
+    def __init__(self, idle_seconds: float = DEFAULT_IDLE_MINUTES * 60, compress: bool = True,
+                 on_evict: Callable[[Dict[str, Any]], None] = None,
+                 resource_idle_seconds: float = RESOURCE_IDLE_SECONDS):
+        self.idle_seconds = idle_seconds
+        self.resource_idle_seconds = min(resource_idle_seconds, idle_seconds)
+        self.compress = compress
+        self.on_evict = on_evict
+        self.evicted = 0
+        self._entries: Dict[str, _Entry] = {}
+        self._sessions: Dict[str, _Session] = {}
+        self._decoded: 'OrderedDict[str, Any]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._next_sweep = time.monotonic() + self.resource_idle_seconds / 10
+
+    def touch(self, session_id: str) -> Dict[str, Any]:
+        """
+        Marca la sesión como activa y devuelve sus recursos (un diccionario
+        que la sesión puede llenar). De paso libera las sesiones inactivas
+        """
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = _Session(now)
+            session.seen = now
+            resources = session.resources
+        if now >= self._next_sweep:
+            self.evict_idle(now)
+        return resources
+
+    def publish(self, session_id: str, key: str, value: Any):
+        """Hace que la sesión referencie el resultado `value` con clave `key`"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            entry = self._encode(value)
+        with self._lock:
+            entry = self._entries.setdefault(key, entry)
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = _Session(time.monotonic())
+            if session.key != key:
+                entry.refs += 1
+                self._release_key(session.key)
+                session.key = key
+            session.seen = time.monotonic()
+            if self.compress:
+                self._remember(key, value)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Resultado guardado con esa clave, o None si ninguna sesión lo referencia"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if not self.compress:
+                return entry.value
+            value = self._decoded.get(key)
+            if value is not None:
+                self._decoded.move_to_end(key)
+                return value
+            data = entry.value
+        value = pickle.loads(zlib.decompress(data))
+        with self._lock:
+            self._remember(key, value)
+        return value
+
+    def release(self, session_id: str):
+        """Desaloja una sesión: suelta su resultado y cierra sus recursos"""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is None:
+                return
+            self._release_key(session.key)
+            self.evicted += 1
+        if self.on_evict is not None and session.resources:
+            self.on_evict(session.resources)
+
+    def evict_idle(self, now: float = None) -> int:
+        """
+        Libera los recursos de las sesiones sin actividad desde hace
+        `resource_idle_seconds` y desaloja las que llevan `idle_seconds`;
+        devuelve cuántas se desalojaron
+        """
+        now = time.monotonic() if now is None else now
+        self._next_sweep = now + self.resource_idle_seconds / 10
+        idle, trimmed = [], []
+        with self._lock:
+            for session_id, session in self._sessions.items():
+                if now - session.seen >= self.idle_seconds:
+                    idle.append(session_id)
+                elif now - session.seen >= self.resource_idle_seconds and session.resources:
+                    trimmed.append(session.resources)
+                    session.resources = {}
+        if self.on_evict is not None:
+            for resources in trimmed:
+                self.on_evict(resources)
+        for session_id in idle:
+            self.release(session_id)
+        return len(idle)
+
+    def _encode(self, value: Any) -> _Entry:
+        if not self.compress:
+            size = estimate_size(value)
+            return _Entry(value, size, size)
+        # Sin comprimir se cuenta el tamaño serializado: estimar el de los
+        # objetos recorriéndolos cuesta más que comprimir
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        compressed = zlib.compress(data, 1)
+        return _Entry(compressed, len(compressed), len(data))
+
+    def _remember(self, key: str, value: Any):
+        self._decoded[key] = value
+        self._decoded.move_to_end(key)
+        while len(self._decoded) > DECODED_ENTRIES:
+            self._decoded.popitem(last=False)
+
+    def _release_key(self, key: Optional[str]):
+        entry = self._entries.get(key) if key is not None else None
+        if entry is None:
+            return
+        entry.refs -= 1
+        if entry.refs <= 0:
+            del self._entries[key]
+            self._decoded.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Sesiones registradas e inactivas, resultados guardados y su memoria.
+        La memoria por sesión inactiva reparte cada resultado entre las
+        sesiones que lo referencian
+        """
+        now = time.monotonic()
+        with self._lock:
+            idle = [session for session in self._sessions.values()
+                    if now - session.seen >= self.resource_idle_seconds]
+            idle_bytes = sum(
+                self._entries[session.key].size / self._entries[session.key].refs
+                for session in idle if session.key in self._entries
+            )
+            return {
+                'sessions': len(self._sessions),
+                'idle_sessions': len(idle),
+                'evicted_sessions': self.evicted,
+                'entries': len(self._entries),
+                'bytes': sum(entry.size for entry in self._entries.values()),
+                'uncompressed_bytes': sum(entry.raw_size for entry in self._entries.values()),
+                'decoded_entries': len(self._decoded),
+                'bytes_per_idle_session': idle_bytes / len(idle) if idle else 0.0
+            }
+
+
+def default_session_store(on_evict: Callable[[Dict[str, Any]], None] = None) -> SessionStore:
+    """
+    Almacén configurado con TEXTUAL_GUARDIAN_SESSION_IDLE_MINUTES y
+    TEXTUAL_GUARDIAN_COMPRESS_RESULTS (0 para guardar sin comprimir)
+    """
+    idle_minutes = float(os.environ.get('TEXTUAL_GUARDIAN_SESSION_IDLE_MINUTES', DEFAULT_IDLE_MINUTES))
+    compress = os.environ.get('TEXTUAL_GUARDIAN_COMPRESS_RESULTS', '1') != '0'
+    return SessionStore(idle_seconds=idle_minutes * 60, compress=compress, on_evict=on_evict)
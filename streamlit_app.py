@@ -1,7 +1,53 @@
+import hashlib
+import heapq
+import html
+import io
+import logging
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
 import streamlit as st
-import pandas as pd
-import re
-from text_analyzer import TextAnalyzer
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from analysis_service import AnalysisClient, ServiceBusy
+from document_reader import DocumentError, analyze_document
+from live_analyzer import LiveAnalyzer
+from result_cache import ResultCache, default_disk_cache, text_key
+from rule_packs import default_registry, resolve_pack_name
+from session_store import default_session_store
+from text_analyzer import (
+    IncrementalAnalyzer, SentenceIndex, TextAnalyzer, log_metrics, split_pages
+)
+
+# Instrumentación opcional: tiempos por detector y por etapa de render,
+# registrados en el log y mostrados en un panel de depuración
+DEBUG_METRICS = os.environ.get("TEXTUAL_GUARDIAN_DEBUG") == "1"
+if DEBUG_METRICS:
+    metrics_logger = logging.getLogger("text_analyzer")
+    metrics_logger.setLevel(logging.INFO)
+    if not metrics_logger.handlers:
+        metrics_logger.addHandler(logging.StreamHandler())
+
+# Análisis en vivo: espera sin cambios antes de analizar, espera máxima del
+# rerun por el resultado y frecuencia con que se revisa si ya está listo
+LIVE_DEBOUNCE_SECONDS = 0.075
+LIVE_INLINE_WAIT_SECONDS = 0.15
+LIVE_POLL_INTERVAL_SECONDS = 0.1
+
+# Caracteres por página del texto marcado: en documentos largos solo la
+# página visible se convierte en HTML
+MARKED_TEXT_PAGE_CHARS = 20000
+
+# Oraciones que se listan en el panel de oraciones
+SENTENCE_TABLE_ROWS = 10
+
+# Frases repetidas que se listan en la leyenda (las más marcadas). En
+# textos de al menos LEGEND_LONG_TEXT_WORDS palabras se omiten las
+# marcadas solo dos veces; las demás se resumen en "+k más"
+LEGEND_MAX_PHRASES = 20
+LEGEND_LONG_TEXT_WORDS = 5000
 
 # Diccionarios de idiomas
 LANGUAGES = {
@@ -10,14 +56,34 @@ LANGUAGES = {
         "input_text": "📝 Ingresa tu texto:",
         "placeholder": "Escribe o pega aquí el texto que deseas analizar...\n\nPresiona 'Analizar' o sal del área de texto para ver los resultados.",
         "analyze_button": "🔍 Analizar Texto",
+        "live_mode": "⚡ Análisis en vivo",
+        "live_pending": "⏳ Analizando la última versión del texto...",
         "legend_title": "🎨 Leyenda de Colores:",
         "specific_counts": "🔤 Conteos Específicos:",
         "marked_text": "🎨 Texto con Errores Marcados:",
+        "page": "Página",
+        "page_summary": "Página {page} de {pages} · {issues} marcas en esta página",
+        "previous_issue": "⏮ Problema anterior",
+        "next_issue": "Siguiente problema ⏭",
+        "sentences_title": "📏 Oraciones",
+        "sentences_summary": "{sentences} oraciones · {words:.1f} palabras por oración · {connectors:.1f} conectores cada 100 palabras",
+        "sentence_number": "N.º",
+        "sentence_words": "Palabras",
+        "sentence_connectors": "Conectores",
+        "sentence_issues": "Marcas",
+        "sentence_text": "Oración",
         "info_message": "👈 Escribe texto y presiona 'Analizar' o sal del área de texto para ver los resultados",
+        "upload_document": "📄 O sube un documento (.docx, .odt)",
+        "document_results": "📄 Resultados de {name}",
+        "document_summary": "{paragraphs} párrafos · {flagged} con hallazgos",
+        "document_error": "No se pudo leer {name} como documento .docx u .odt",
+        "paragraph_number": "Párrafo",
+        "paragraph_findings": "Hallazgos",
+        "paragraph_text": "Texto",
         "no_problems": "🎉 ¡No se detectaron problemas en tu texto!",
         "total_words": "📊 Total de palabras:",
         "total_sentences": "📝 Total de oraciones:",
-        "repeated_words": "🔄 Palabras repetidas:",
+        "close_repetitions": "🔄 Repeticiones cercanas:",
         "total_problems": "⚠️ Total de problemas:",
         "count_y": "Cantidad de \"y\":",
         "count_pero": "Cantidad de \"pero\":",
@@ -28,22 +94,45 @@ LANGUAGES = {
         "gerunds": "Gerundios", 
         "problematic_expressions": "Expresiones problemáticas",
         "qualitative_adjectives": "Adjetivos calificativos",
-        "repeated_words_label": "Palabras repetidas",
-        "incorrect_commas": "Comas antes de 'y'"
+        "close_repetitions_label": "Repeticiones cercanas",
+        "repeated_phrases_label": "Frases repetidas",
+        "more_phrases": "+{count} más",
+        "incorrect_commas": "Comas antes de 'y'",
+        "service_busy": "⏳ El servicio de análisis está ocupado. Intenta de nuevo en unos segundos."
     },
     "🇺🇸 English": {
         "title": "📝 Textual Guardian",
         "input_text": "📝 Enter your text:",
         "placeholder": "Write or paste the text you want to analyze here...\n\nPress 'Analyze' or leave the text area to see results.",
         "analyze_button": "🔍 Analyze Text",
+        "live_mode": "⚡ Live analysis",
+        "live_pending": "⏳ Analyzing the latest version of the text...",
         "legend_title": "🎨 Color Legend:",
         "specific_counts": "🔤 Specific Counts:",
         "marked_text": "🎨 Text with Marked Errors:",
+        "page": "Page",
+        "page_summary": "Page {page} of {pages} · {issues} marks on this page",
+        "previous_issue": "⏮ Previous issue",
+        "next_issue": "Next issue ⏭",
+        "sentences_title": "📏 Sentences",
+        "sentences_summary": "{sentences} sentences · {words:.1f} words per sentence · {connectors:.1f} connectors per 100 words",
+        "sentence_number": "No.",
+        "sentence_words": "Words",
+        "sentence_connectors": "Connectors",
+        "sentence_issues": "Marks",
+        "sentence_text": "Sentence",
         "info_message": "👈 Write text and press 'Analyze' or leave the text area to see results",
+        "upload_document": "📄 Or upload a document (.docx, .odt)",
+        "document_results": "📄 Results for {name}",
+        "document_summary": "{paragraphs} paragraphs · {flagged} with findings",
+        "document_error": "Could not read {name} as a .docx or .odt document",
+        "paragraph_number": "Paragraph",
+        "paragraph_findings": "Findings",
+        "paragraph_text": "Text",
         "no_problems": "🎉 No problems detected in your text!",
         "total_words": "📊 Total words:",
         "total_sentences": "📝 Total sentences:",
-        "repeated_words": "🔄 Repeated words:",
+        "close_repetitions": "🔄 Close repetitions:",
         "total_problems": "⚠️ Total problems:",
         "count_y": "Count of \"y\":",
         "count_pero": "Count of \"pero\":",
@@ -54,15 +143,224 @@ LANGUAGES = {
         "gerunds": "Gerunds",
         "problematic_expressions": "Problematic expressions",
         "qualitative_adjectives": "Qualitative adjectives", 
-        "repeated_words_label": "Repeated words",
-        "incorrect_commas": "Commas before 'y'"
+        "close_repetitions_label": "Close repetitions",
+        "repeated_phrases_label": "Repeated phrases",
+        "more_phrases": "+{count} more",
+        "incorrect_commas": "Commas before 'y'",
+        "service_busy": "⏳ The analysis service is busy. Please try again in a few seconds."
     }
 }
 
+# Clase CSS usada para marcar cada categoría de hallazgo
+HIGHLIGHT_CLASSES = {
+    "close_repetitions": "palabra-repetida",
+    "repeated_phrases": "frase-repetida",
+    "participios": "participio",
+    "gerundios": "gerundio",
+    "forbidden_expressions": "expresion-problematica",
+    "problematic_adjectives": "adjetivo-problematico",
+    "comma_before_y": "coma-incorrecta"
+}
+
 def get_text(key, language="🇪🇸 Español"):
     """Obtiene texto traducido según el idioma seleccionado"""
     return LANGUAGES.get(language, LANGUAGES["🇪🇸 Español"]).get(key, key)
 
+@st.cache_resource(max_entries=8)
+def build_analyzer(pack_name, pack_version, language="🇪🇸 Español"):
+    """Analizador compartido por todas las sesiones para una versión del paquete de reglas"""
+    return TextAnalyzer(language=language, rule_pack=default_registry().get(pack_name))
+
+def get_analyzer(language="🇪🇸 Español"):
+    """
+    Analizador del paquete de reglas del idioma. El paquete se revisa en
+    cada ejecución, así que editar su archivo cambia las reglas sin reiniciar
+    """
+    pack = default_registry().get(resolve_pack_name(language))
+    return build_analyzer(pack.name, pack.version, language)
+
+@st.cache_resource
+def start_warm_up(language="🇪🇸 Español"):
+    """
+    Prepara en segundo plano, una vez por proceso, lo que el primer análisis
+    tendría que esperar: buscadores compilados, un recorrido de todos los
+    detectores y las librerías de las tablas (pandas/pyarrow, que no se
+    importan al arrancar)
+    """
+    def warm_up():
+        started = time.perf_counter()
+        pack = default_registry().get(resolve_pack_name(language))
+        stages = {"rule_pack": time.perf_counter() - started}
+        stages.update(TextAnalyzer(language=language, rule_pack=pack).warm_up())
+        
+        started = time.perf_counter()
+        import pandas  # noqa: F401
+        import pyarrow  # noqa: F401
+        stages["dataframe_libraries"] = time.perf_counter() - started
+        log_metrics("warm_up", {"stages": stages, "seconds": sum(stages.values())})
+    
+    thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+@st.cache_resource
+def get_service_client():
+    """Cliente del servicio de análisis, si TEXTUAL_GUARDIAN_SERVICE_URL está configurada"""
+    url = os.environ.get("TEXTUAL_GUARDIAN_SERVICE_URL")
+    return AnalysisClient(url) if url else None
+
+def analyze_with(incremental, client, text):
+    """
+    Analiza el texto en el servicio de análisis o, si no hay uno configurado
+    (o no responde), con el analizador incremental. Devuelve (resultados,
+    fragmentos a marcar o None); lanza ServiceBusy si el servicio está
+    saturado. No usa el estado de Streamlit, así que sirve fuera del hilo
+    de la página. Las posiciones que ubica el analizador incremental se
+    convierten en los fragmentos a marcar y no se guardan con el resultado
+    """
+    if client is not None:
+        try:
+            response = client.analyze(text, spans=True, instrument=DEBUG_METRICS)
+            return response["results"], response["spans"]
+        except OSError as error:
+            logging.getLogger(__name__).warning("Servicio de análisis no disponible: %s", error)
+    results = incremental.analyze_text(text, instrument=DEBUG_METRICS)
+    spans = incremental.analyzer.find_highlight_spans(text, results)
+    del results["highlights"]
+    return results, spans
+
+def run_analysis(text, language="🇪🇸 Español"):
+    """Analiza el texto en el hilo de la página"""
+    # Analizador incremental de la sesión: al reanalizar un texto
+    # editado solo se procesan los párrafos que cambiaron
+    analyzer = get_analyzer(language)
+    resources = session_resources()
+    incremental = resources.get("incremental_analyzer")
+    if incremental is None or incremental.analyzer is not analyzer:
+        incremental = IncrementalAnalyzer(analyzer, locate=True)
+        resources["incremental_analyzer"] = incremental
+    return analyze_with(incremental, get_service_client(), text)
+
+def get_live_analyzer(language="🇪🇸 Español"):
+    """
+    Analizador en segundo plano de la sesión. Tiene su propio analizador
+    incremental porque se usa desde otro hilo
+    """
+    analyzer = get_analyzer(language)
+    resources = session_resources()
+    live = resources.get("live_analyzer")
+    if live is None or live["analyzer"] is not analyzer:
+        if live is not None:
+            live["runner"].close()
+        incremental = IncrementalAnalyzer(analyzer, locate=True)
+        client = get_service_client()
+        live = resources["live_analyzer"] = {
+            "analyzer": analyzer,
+            "runner": LiveAnalyzer(
+                lambda text: analyze_with(incremental, client, text),
+                debounce=LIVE_DEBOUNCE_SECONDS
+            ),
+            "published": 0
+        }
+    return live
+
+def publish_live_result(live, text, language, render_metrics=None):
+    """
+    Pasa al estado de la sesión el último resultado en segundo plano, si es
+    nuevo y corresponde al texto actual
+    """
+    result = live["runner"].latest()
+    if result is None or result.generation <= live["published"]:
+        return
+    live["published"] = result.generation
+    if result.text != text:
+        return
+    if result.error is not None:
+        if not isinstance(result.error, ServiceBusy):
+            raise result.error
+        st.warning(get_text("service_busy", language))
+        return
+    
+    results, spans = result.value
+    rules_version = live["analyzer"].rules_version
+    get_result_cache().put(text_key(result.text, rules_version), results)
+    save_session_result(result.text, rules_version, results, spans)
+    if render_metrics is not None:
+        render_metrics["cache_hit"] = False
+        render_metrics["live_latency_seconds"] = result.latency
+
+def has_unpublished_result(live):
+    result = live["runner"].latest()
+    return result is not None and result.generation > live["published"]
+
+def poll_live_result():
+    """Vuelve a ejecutar la página cuando el análisis en segundo plano termina"""
+    live = session_resources().get("live_analyzer")
+    if live is not None and has_unpublished_result(live):
+        st.rerun()
+
+@st.cache_resource
+def get_result_cache():
+    """
+    Caché de resultados y HTML marcado compartida por todas las sesiones.
+    Con TEXTUAL_GUARDIAN_DISK_CACHE los resultados de análisis se guardan
+    además en disco y sobreviven a los reinicios
+    """
+    max_mb = int(os.environ.get("TEXTUAL_GUARDIAN_CACHE_MB", "256"))
+    return ResultCache(max_bytes=max_mb * 1024 * 1024, disk=default_disk_cache())
+
+def close_session_resources(resources):
+    """Detiene el análisis en vivo de una sesión desalojada y suelta sus analizadores"""
+    live = resources.get("live_analyzer")
+    if live is not None:
+        live["runner"].close()
+    resources.clear()
+
+@st.cache_resource
+def get_session_store():
+    """
+    Resultados de las sesiones, compartidos por todas y sin duplicar. Las
+    sesiones inactivas (TEXTUAL_GUARDIAN_SESSION_IDLE_MINUTES) se desalojan
+    """
+    return default_session_store(on_evict=close_session_resources)
+
+def current_session_id():
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else ""
+
+def session_resources():
+    """Objetos propios de la sesión actual (analizadores), que se liberan al desalojarla"""
+    return get_session_store().touch(current_session_id())
+
+def save_session_result(text, rules_version, results, spans=None):
+    """
+    Publica el resultado en el almacén compartido. La sesión guarda solo su
+    clave y la versión de las reglas con que se obtuvo
+    """
+    key = text_key(text, rules_version)
+    get_session_store().publish(current_session_id(), key, (results, spans))
+    st.session_state.analysis_key = key
+    st.session_state.analysis_rules = rules_version
+
+def session_result(text):
+    """
+    (resultados, fragmentos a marcar o None) del último análisis de la
+    sesión si corresponde al texto actual; si no, None. Se comparan hashes,
+    no el texto
+    """
+    key = st.session_state.get("analysis_key")
+    if key is None or not text or text_key(text, st.session_state.analysis_rules) != key:
+        return None
+    value = get_session_store().get(key)
+    if value is None:
+        # La sesión se desalojó por inactividad: el resultado puede seguir en la caché
+        results = get_result_cache().get(key)
+        if results is None:
+            return None
+        value = (results, None)
+        save_session_result(text, st.session_state.analysis_rules, results)
+    return value
+
 def main():
     # Configuración de la página
     st.set_page_config(
@@ -70,6 +368,7 @@ def main():
         page_icon="📝",
         layout="wide"
     )
+    start_warm_up()
     
     # CSS personalizado para colores de highlighting y tema oscuro
     st.markdown("""
@@ -79,6 +378,7 @@ def main():
     .expresion-problematica { background-color: #f44336; color: white; padding: 2px 4px; border-radius: 3px; font-weight: bold; }
     .adjetivo-problematico { background-color: #9c27b0; color: white; padding: 2px 4px; border-radius: 3px; font-weight: bold; }
     .palabra-repetida { background-color: #2196f3; color: white; padding: 2px 4px; border-radius: 3px; font-weight: bold; }
+    .frase-repetida { background-color: #009688; color: white; padding: 2px 4px; border-radius: 3px; font-weight: bold; }
     .coma-incorrecta { background-color: #e91e63; color: white; padding: 2px 4px; border-radius: 3px; font-weight: bold; }
     
     .metric-card {
@@ -150,6 +450,10 @@ def main():
     
     # Layout principal en dos columnas
     col1, col2 = st.columns([1, 1])
+    result_cache = get_result_cache()
+    render_metrics = {} if DEBUG_METRICS else None
+    # Cualquier ejecución cuenta como actividad de la sesión
+    session_resources()
     
     # COLUMNA IZQUIERDA - Área de texto y leyenda
     with col1:
@@ -165,6 +469,18 @@ def main():
         # Botón de análisis
         analyze_button = st.button(get_text("analyze_button", selected_language), type="primary", use_container_width=True)
         
+        # En vivo, cada versión del texto se analiza en segundo plano y la
+        # página no espera análisis de versiones anteriores
+        live_mode = st.toggle(get_text("live_mode", selected_language), value=True, key="live_mode")
+        live = get_live_analyzer(selected_language) if live_mode else None
+        
+        # Documentos de Word o LibreOffice: se leen y analizan párrafo a
+        # párrafo, sin pasar por el área de texto
+        uploaded_document = st.file_uploader(
+            get_text("upload_document", selected_language), type=["docx", "odt"],
+            key="document_upload"
+        )
+        
         # Inicializar session state
         if "trigger_analysis" not in st.session_state:
             st.session_state.trigger_analysis = False
@@ -179,43 +495,150 @@ def main():
             # Resetear trigger
             st.session_state.trigger_analysis = False
             
-            # Crear instancia del analizador con idioma
-            analyzer = TextAnalyzer(language=selected_language)
+            # Reutilizar el resultado si el mismo texto ya se analizó
+            # (en esta u otra sesión) con las mismas reglas
+            started = time.perf_counter()
+            analyzer = get_analyzer(selected_language)
+            cache_key = text_key(text_input, analyzer.rules_version)
+            results = result_cache.get(cache_key)
+            spans = None
+            
+            if results is None and live is not None:
+                # Esperar brevemente: un análisis rápido se muestra en esta
+                # misma ejecución y uno lento se publica al terminar
+                runner = live["runner"]
+                runner.wait(runner.submit(text_input), timeout=LIVE_INLINE_WAIT_SECONDS)
+            elif results is None:
+                # Realizar análisis
+                try:
+                    results, spans = run_analysis(text_input, selected_language)
+                except ServiceBusy:
+                    st.warning(get_text("service_busy", selected_language))
+                else:
+                    result_cache.put(cache_key, results)
+                    if render_metrics is not None:
+                        render_metrics["cache_hit"] = False
+            elif render_metrics is not None:
+                render_metrics["cache_hit"] = True
             
-            # Realizar análisis
-            results = analyzer.analyze_text(text_input)
+            if render_metrics is not None:
+                render_metrics["analysis_seconds"] = time.perf_counter() - started
             
-            # Guardar resultados en session state
-            st.session_state.analysis_results = results
-            st.session_state.analyzed_text = text_input
-            st.session_state.analysis_language = selected_language
+            # Guardar en la sesión solo la clave del resultado
+            if results is not None:
+                save_session_result(text_input, analyzer.rules_version, results, spans)
+        
+        if live is not None:
+            publish_live_result(live, text_input, selected_language, render_metrics)
+        current = session_result(text_input)
+        if live is not None and live["runner"].busy and current is None:
+            st.caption(get_text("live_pending", selected_language))
         
         # Mostrar leyenda si hay resultados
-        if ("analysis_results" in st.session_state and 
-            "analyzed_text" in st.session_state and 
-            st.session_state.analyzed_text == text_input):
+        if current is not None:
             st.markdown(f"##### {get_text('legend_title', selected_language)}")
-            display_dynamic_legend(st.session_state.analysis_results, selected_language)
+            results = current[0]
+            spans = get_highlight_spans(text_input, results, selected_language)
+            display_dynamic_legend(results, selected_language, marked_phrases(text_input, spans))
     
     # COLUMNA DERECHA - Análisis
     with col2:
-        if ("analysis_results" in st.session_state and 
-            "analyzed_text" in st.session_state and 
-            text_input and text_input.strip() and
-            st.session_state.analyzed_text == text_input):
+        if current is not None and text_input.strip():
+            results = current[0]
             
             # Mostrar conteos específicos
-            display_specific_counts(st.session_state.analysis_results, selected_language)
+            display_specific_counts(results, selected_language)
             
             # Mostrar texto marcado
             st.markdown(f"##### {get_text('marked_text', selected_language)}")
-            marked_text = create_highlighted_text(text_input, st.session_state.analysis_results)
-            st.markdown(marked_text, unsafe_allow_html=True)
+            started = time.perf_counter()
+            html_chars = display_marked_text(text_input, results, selected_language, render_metrics)
+            marked_text_seconds = time.perf_counter() - started
+            
+            # Mostrar métricas por oración
+            display_sentence_metrics(text_input, results, selected_language)
             
-        else:
+            if render_metrics is not None:
+                render_metrics["input_chars"] = len(text_input)
+                render_metrics["html_chars"] = html_chars
+                render_metrics["marked_text_seconds"] = marked_text_seconds
+                render_metrics["result_cache"] = result_cache.stats()
+                render_metrics["session_store"] = get_session_store().stats()
+                log_metrics("render", render_metrics)
+                display_debug_panel(results, render_metrics)
+            
+        elif uploaded_document is None:
             st.info(get_text("info_message", selected_language))
+    
+    if uploaded_document is not None:
+        display_document_results(uploaded_document, selected_language)
+    
+    # Mientras haya un análisis en segundo plano, revisar periódicamente si
+    # terminó (sin volver a ejecutar toda la página en cada revisión)
+    if live is not None and (live["runner"].busy or has_unpublished_result(live)):
+        st.fragment(run_every=LIVE_POLL_INTERVAL_SECONDS)(poll_live_result)()
+
+# Categorías de hallazgos por párrafo y su etiqueta
+PARAGRAPH_FINDING_LABELS = {
+    "participios": "participles",
+    "gerundios": "gerunds",
+    "forbidden_expressions": "problematic_expressions",
+    "problematic_adjectives": "qualitative_adjectives",
+    "comma_before_y": "incorrect_commas",
+    "close_repetitions": "close_repetitions_label"
+}
+
+def display_document_results(uploaded, language="🇪🇸 Español"):
+    """Muestra el análisis de un documento subido, con los hallazgos por párrafo"""
+    analyzer = get_analyzer(language)
+    content = uploaded.getvalue()
+    digest = hashlib.blake2b(content, digest_size=16).hexdigest()
+    try:
+        results = get_result_cache().get_or_compute(
+            f"document:{analyzer.rules_version}:{digest}",
+            lambda: analyze_document(io.BytesIO(content), analyzer)
+        )
+    except DocumentError:
+        st.error(get_text("document_error", language).format(name=uploaded.name))
+        return
+    
+    st.markdown(f"#### {get_text('document_results', language).format(name=html.escape(uploaded.name))}")
+    st.caption(get_text("document_summary", language).format(
+        paragraphs=results["paragraph_count"], flagged=len(results["paragraphs"])
+    ))
+    counts_col, paragraphs_col = st.columns([1, 2])
+    with counts_col:
+        display_specific_counts(results, language)
+        display_dynamic_legend(results, language)
+    with paragraphs_col:
+        rows = [
+            {
+                get_text("paragraph_number", language): located["paragraph"],
+                get_text("paragraph_findings", language): "; ".join(
+                    f"{get_text(PARAGRAPH_FINDING_LABELS[category], language)}: {', '.join(items)}"
+                    for category, items in located["findings"].items()
+                ),
+                get_text("paragraph_text", language): located["preview"]
+            }
+            for located in results["paragraphs"]
+        ]
+        st.dataframe(rows, hide_index=True, use_container_width=True)
 
-def display_dynamic_legend(results, language="🇪🇸 Español"):
+def display_debug_panel(results, render_metrics):
+    """Muestra las métricas de análisis y render en un panel plegable"""
+    with st.expander("🛠️ Debug"):
+        if "metrics" in results:
+            st.json(results["metrics"])
+        st.json(render_metrics)
+
+def marked_phrases(text, spans):
+    """Frases repetidas marcadas en el texto y cuántas veces se marcaron"""
+    return Counter(
+        " ".join(text[start:end].lower().split())
+        for start, end, category in spans if category == "repeated_phrases"
+    )
+
+def display_dynamic_legend(results, language="🇪🇸 Español", phrases=None):
     """Muestra leyenda de colores con palabras reales encontradas"""
     
     legend_items = []
@@ -240,10 +663,22 @@ def display_dynamic_legend(results, language="🇪🇸 Español"):
         adjetivos_text = ', '.join(results['problematic_adjectives'])
         legend_items.append(f'<span class="adjetivo-problematico">{get_text("qualitative_adjectives", language)}</span>: {adjetivos_text}')
     
-    # Palabras repetidas
-    if results['repeated_words']:
-        repetidas_text = ', '.join(list(results['repeated_words'].keys()))
-        legend_items.append(f'<span class="palabra-repetida">{get_text("repeated_words_label", language)}</span>: {repetidas_text}')
+    # Palabras repetidas a poca distancia
+    if results['close_repetitions']:
+        repetidas_text = ', '.join(results['close_repetitions'])
+        legend_items.append(f'<span class="palabra-repetida">{get_text("close_repetitions_label", language)}</span>: {repetidas_text}')
+    
+    # Frases repetidas (de la más marcada a la menos, solo las primeras)
+    if phrases:
+        min_count = 3 if results['word_count'] >= LEGEND_LONG_TEXT_WORDS else 2
+        shown = [
+            phrase for phrase, count in phrases.most_common(LEGEND_MAX_PHRASES) if count >= min_count
+        ]
+        frases = [f'"{html.escape(phrase)}"' for phrase in shown]
+        if len(phrases) > len(shown):
+            frases.append(get_text("more_phrases", language).format(count=len(phrases) - len(shown)))
+        frases_text = ', '.join(frases)
+        legend_items.append(f'<span class="frase-repetida">{get_text("repeated_phrases_label", language)}</span>: {frases_text}')
     
     # Comas incorrectas
     if results['comma_before_y']:
@@ -267,7 +702,7 @@ def display_specific_counts(results, language="🇪🇸 Español"):
     # Conteos específicos
     word_count = results['word_count']
     sentence_count = results['sentence_count']
-    repeated_count = len(results['repeated_words'])
+    repeated_count = len(results['close_repetitions'])
     participios_count = len(results['participios'])
     gerundios_count = len(results['gerundios'])
     expresiones_count = len(results['forbidden_expressions'])
@@ -295,7 +730,7 @@ def display_specific_counts(results, language="🇪🇸 Español"):
     <div class="metric-card">
         <p><strong>{get_text("total_words", language)}</strong> {word_count}</p>
         <p><strong>{get_text("total_sentences", language)}</strong> {sentence_count}</p>
-        <p><strong>{get_text("repeated_words", language)}</strong> {repeated_count}</p>
+        <p><strong>{get_text("close_repetitions", language)}</strong> {repeated_count}</p>
         <p><strong>{get_text("total_problems", language)}</strong> {total_issues}</p>
         <hr>
         <p><strong>{count1_label}</strong> {count1_value}</p>
@@ -312,7 +747,7 @@ def display_live_stats(results):
     # Conteos específicos
     word_count = results['word_count']
     sentence_count = results['sentence_count']
-    repeated_count = len(results['repeated_words'])
+    repeated_count = len(results['close_repetitions'])
     participios_count = len(results['participios'])
     gerundios_count = len(results['gerundios'])
     expresiones_count = len(results['forbidden_expressions'])
@@ -331,7 +766,7 @@ def display_live_stats(results):
         <h4>📊 Estadísticas Generales</h4>
         <p><strong>Total de palabras:</strong> {word_count}</p>
         <p><strong>Total de oraciones:</strong> {sentence_count}</p>
-        <p><strong>Palabras repetidas:</strong> {repeated_count}</p>
+        <p><strong>Repeticiones cercanas:</strong> {repeated_count}</p>
         <p><strong>Total de problemas:</strong> {total_issues}</p>
     </div>
     """, unsafe_allow_html=True)
@@ -392,11 +827,11 @@ def display_live_stats(results):
             """, unsafe_allow_html=True)
         
         if repeated_count > 0:
-            st.markdown("#### 🔄 Palabras Repetidas:")
-            for word, count in results['repeated_words'].items():
+            st.markdown("#### 🔄 Repeticiones Cercanas:")
+            for word, count in results['close_repetitions'].items():
                 st.markdown(f"""
                 <div class="error-card">
-                    <strong>'{word}'</strong> aparece <strong>{count} veces</strong>
+                    <strong>'{word}'</strong> se repite a poca distancia <strong>{count} veces</strong>
                 </div>
                 """, unsafe_allow_html=True)
     
@@ -408,71 +843,204 @@ def display_live_stats(results):
         </div>
         """, unsafe_allow_html=True)
 
-def create_highlighted_text(text, results):
-    """Crea texto con highlighting de colores para errores"""
-    highlighted_text = text
-    
-    # Marcar palabras repetidas (primero para que otros colores tomen prioridad)
-    for word in results['repeated_words'].keys():
-        pattern = r'\b' + re.escape(word) + r'\b'
-        highlighted_text = re.sub(
-            pattern, 
-            f'<span class="palabra-repetida">{word}</span>',
-            highlighted_text,
-            flags=re.IGNORECASE
-        )
+def get_highlight_spans(text, results, language="🇪🇸 Español", metrics=None):
+    """Fragmentos a marcar del texto completo (del servicio de análisis o calculados una vez)"""
+    current = session_result(text)
+    if current is not None and current[1] is not None:
+        return current[1]
     
-    # Marcar participios
-    for participio in results['participios']:
-        pattern = r'\b' + re.escape(participio) + r'\b'
-        highlighted_text = re.sub(
-            pattern,
-            f'<span class="participio">{participio}</span>',
-            highlighted_text,
-            flags=re.IGNORECASE
-        )
+    analyzer = get_analyzer(language)
     
-    # Marcar gerundios
-    for gerundio in results['gerundios']:
-        pattern = r'\b' + re.escape(gerundio) + r'\b'
-        highlighted_text = re.sub(
-            pattern,
-            f'<span class="gerundio">{gerundio}</span>',
-            highlighted_text,
-            flags=re.IGNORECASE
-        )
+    def compute():
+        started = time.perf_counter()
+        spans = analyzer.find_highlight_spans(text, results)
+        if metrics is not None:
+            metrics["highlight_spans"] = len(spans)
+            metrics["highlight_spans_seconds"] = time.perf_counter() - started
+        return spans
     
-    # Marcar expresiones problemáticas
-    for expression in results['forbidden_expressions']:
-        pattern = r'\b' + re.escape(expression) + r'\b'
-        highlighted_text = re.sub(
-            pattern,
-            f'<span class="expresion-problematica">{expression}</span>',
-            highlighted_text,
-            flags=re.IGNORECASE
-        )
+    return get_result_cache().get_or_compute(text_key(text, analyzer.rules_version, "spans"), compute)
+
+def get_sentence_metrics(text, results, language="🇪🇸 Español", metrics=None):
+    """Métricas por oración del texto, calculadas una vez por texto y reglas"""
+    analyzer = get_analyzer(language)
+    spans = get_highlight_spans(text, results, language, metrics)
+    return get_result_cache().get_or_compute(
+        text_key(text, analyzer.rules_version, "sentences"),
+        lambda: analyzer.sentence_metrics(text, spans)
+    )
+
+def display_sentence_metrics(text, results, language="🇪🇸 Español"):
+    """Muestra un resumen por oración y las oraciones con más marcas o más largas"""
+    sentences = get_sentence_metrics(text, results, language)
+    count = len(sentences["starts"])
+    if not count:
+        return
+    words = sum(sentences["words"])
     
-    # Marcar adjetivos problemáticos
-    for adjetivo in results['problematic_adjectives']:
-        pattern = r'\b' + re.escape(adjetivo) + r'\b'
-        highlighted_text = re.sub(
-            pattern,
-            f'<span class="adjetivo-problematico">{adjetivo}</span>',
-            highlighted_text,
-            flags=re.IGNORECASE
+    with st.expander(get_text("sentences_title", language)):
+        st.caption(get_text("sentences_summary", language).format(
+            sentences=count, words=words / count,
+            connectors=100 * sum(sentences["connectors"]) / max(words, 1)
+        ))
+        ranked = heapq.nlargest(
+            SENTENCE_TABLE_ROWS, range(count),
+            key=lambda i: (sentences["issues"][i], sentences["words"][i])
         )
+        rows = []
+        for i in ranked:
+            # Copiar solo el comienzo de cada oración listada
+            start, end = sentences["starts"][i], sentences["ends"][i]
+            preview = text[start:min(end, start + 120)] + ("…" if end - start > 120 else "")
+            rows.append({
+                get_text("sentence_number", language): i + 1,
+                get_text("sentence_words", language): sentences["words"][i],
+                get_text("sentence_connectors", language): sentences["connectors"][i],
+                get_text("sentence_issues", language): sentences["issues"][i],
+                get_text("sentence_text", language): preview
+            })
+        st.dataframe(rows, hide_index=True, use_container_width=True)
+
+def get_span_bounds(text, spans, language="🇪🇸 Español"):
+    """
+    Inicios y finales de los fragmentos a marcar en arrays aparte, para
+    buscarlos por posición con bisect; se calculan una vez por texto y reglas
+    """
+    return get_result_cache().get_or_compute(
+        text_key(text, get_analyzer(language).rules_version, "span-bounds"),
+        lambda: (array("q", (span[0] for span in spans)), array("q", (span[1] for span in spans)))
+    )
+
+def jump_to_issue(bounds, pages, direction):
+    """
+    Va a la página del problema siguiente (direction=1) o anterior
+    (direction=-1); `bounds` son los inicios y finales de los fragmentos
+    """
+    span_starts, span_ends = bounds
+    start, end = pages[st.session_state.marked_page_number - 1]
+    if direction > 0:
+        index = bisect_left(span_starts, end)
+        if index == len(span_starts):
+            return
+    else:
+        index = bisect_right(span_ends, start) - 1
+        if index < 0:
+            return
+    target = span_starts[index]
+    page = bisect_right([page_start for page_start, _ in pages], target) - 1
+    st.session_state.marked_page_number = page + 1
+
+def display_marked_text(text, results, language="🇪🇸 Español", metrics=None):
+    """
+    Muestra el texto marcado. Los documentos largos se dividen en páginas
+    con un navegador entre problemas, y solo la página visible se convierte
+    en HTML. Devuelve la cantidad de caracteres de HTML enviados
+    """
+    result_cache = get_result_cache()
+    rules_version = get_analyzer(language).rules_version
+    spans = get_highlight_spans(text, results, language, metrics)
+    bounds = get_span_bounds(text, spans, language)
+    span_starts, span_ends = bounds
     
-    # Marcar comas antes de 'y'
-    for comma_y in results['comma_before_y']:
-        highlighted_text = highlighted_text.replace(
-            comma_y,
-            f'<span class="coma-incorrecta">{comma_y}</span>'
+    # Un párrafo más largo que una página se corta al final de una oración
+    sentences = None
+    if len(text) > MARKED_TEXT_PAGE_CHARS:
+        sentence_metrics = get_sentence_metrics(text, results, language, metrics)
+        sentences = SentenceIndex(sentence_metrics["starts"], sentence_metrics["ends"])
+    pages = split_pages(text, MARKED_TEXT_PAGE_CHARS, sentences)
+    
+    page = 0
+    if len(pages) > 1:
+        # Volver a la primera página cuando cambia el texto
+        document_key = text_key(text, rules_version)
+        if st.session_state.get("marked_page_document") != document_key:
+            st.session_state.marked_page_document = document_key
+            st.session_state.marked_page_number = 1
+        
+        start, end = pages[st.session_state.marked_page_number - 1]
+        nav_previous, nav_page, nav_next = st.columns([1, 1, 1])
+        with nav_previous:
+            st.button(
+                get_text("previous_issue", language), use_container_width=True,
+                disabled=not spans or spans[0][1] > start,
+                on_click=jump_to_issue, args=(bounds, pages, -1)
+            )
+        with nav_page:
+            st.number_input(
+                get_text("page", language), min_value=1, max_value=len(pages),
+                key="marked_page_number", label_visibility="collapsed"
+            )
+        with nav_next:
+            st.button(
+                get_text("next_issue", language), use_container_width=True,
+                disabled=not spans or spans[-1][0] < end,
+                on_click=jump_to_issue, args=(bounds, pages, 1)
+            )
+        
+        page = st.session_state.marked_page_number - 1
+        start, end = pages[page]
+        issues = bisect_left(span_starts, end) - bisect_right(span_ends, start)
+        st.caption(get_text("page_summary", language).format(
+            page=page + 1, pages=len(pages), issues=issues
+        ))
+    
+    start, end = pages[page]
+    marked_text = result_cache.get_or_compute(
+        text_key(text, rules_version, f"html-page-{MARKED_TEXT_PAGE_CHARS}-{page}"),
+        lambda: render_highlighted_text(text, spans, start, end, metrics, span_ends)
+    )
+    st.markdown(marked_text, unsafe_allow_html=True)
+    return len(marked_text)
+
+def render_highlighted_text(text, spans, start=0, end=None, metrics=None, span_ends=None):
+    """
+    Convierte en HTML marcado el fragmento text[start:end]. Las marcas que
+    cruzan los bordes del fragmento se recortan. Con los finales de los
+    fragmentos (`span_ends`, ver get_span_bounds) el primero a marcar se
+    busca con bisect en lugar de recorrer los anteriores
+    """
+    started = time.perf_counter()
+    end = len(text) if end is None else end
+    
+    # Construir el HTML en una sola pasada, escapando el texto original
+    parts = []
+    position = start
+    first = 0 if span_ends is None else bisect_right(span_ends, start)
+    for index in range(first, len(spans)):
+        span_start, span_end, category = spans[index]
+        if span_end <= start:
+            continue
+        if span_start >= end:
+            break
+        span_start, span_end = max(span_start, start), min(span_end, end)
+        parts.append(html.escape(text[position:span_start], quote=False))
+        parts.append(
+            f'<span class="{HIGHLIGHT_CLASSES[category]}">'
+            f'{html.escape(text[span_start:span_end], quote=False)}</span>'
         )
+        position = span_end
+    parts.append(html.escape(text[position:end], quote=False))
     
     # Preservar saltos de línea
-    highlighted_text = highlighted_text.replace('\n', '<br>')
+    highlighted_text = ''.join(parts).replace('\n', '<br>')
+    if metrics is not None:
+        metrics["highlight_html_seconds"] = time.perf_counter() - started
     
     return f'<div class="text-highlight-container">{highlighted_text}</div>'
 
+def create_highlighted_text(text, results, metrics=None, spans=None, language="🇪🇸 Español"):
+    """
+    Crea texto con highlighting de colores para errores (documento completo).
+    Los fragmentos a marcar se calculan aquí, con el paquete de reglas del
+    idioma, salvo que ya vengan dados
+    """
+    started = time.perf_counter()
+    if spans is None:
+        spans = get_analyzer(language).find_highlight_spans(text, results)
+    if metrics is not None:
+        metrics["highlight_spans"] = len(spans)
+        metrics["highlight_spans_seconds"] = time.perf_counter() - started
+    return render_highlighted_text(text, spans, metrics=metrics)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,214 @@
+"""
+Los caminos alternativos de análisis (por partes, en paralelo, incremental
+y por párrafos) deben dar el mismo resultado que ``analyze_text``. Los
+textos se generan con semillas fijas para que cada fallo sea reproducible.
+"""
+import json
+import random
+
+import pytest
+
+from benchmarks.run_benchmarks import generate_text
+from parallel_analyzer import analyze_parallel
+from rule_packs import MATCHER_FIELDS, RULE_FIELDS, RulePack, compile_rule_pack, get_rule_pack
+from session_store import SessionStore
+from text_analyzer import (PHRASE_MAX_WORDS, PHRASE_MIN_WORDS, ExpressionMatcher,
+                           IncrementalAnalyzer, TextAnalyzer, compile_matcher)
+
+SEEDS = [1, 7, 42]
+
+# Texto corto con un hallazgo de cada detector
+SAMPLE = (
+    'El presente trabajo pretende analizar diversas perspectivas, y el estudio realizado '
+    'muestra un impacto grande. Considerando los datos obtenidos, el marco teórico '
+    'establece que el marco teórico puede lograr muchos cambios.\n\n'
+    'Sin embargo, etc. La investigación ha analizado varios elementos importantes '
+    'debido a que los resultados pueden motivar algunos aspectos relevantes.'
+)
+
+
+@pytest.fixture(scope='module')
+def analyzer():
+    return TextAnalyzer()
+
+
+def normalized(results):
+    """
+    Resultados comparables entre caminos: las listas de hallazgos son
+    conjuntos y los caminos que combinan fragmentos no conservan su orden
+    """
+    return {key: sorted(value) if isinstance(value, list) else value
+            for key, value in results.items() if key != 'metrics'}
+
+
+def texts():
+    yield SAMPLE
+    for seed in SEEDS:
+        yield generate_text(20_000, seed)
+
+
+@pytest.mark.parametrize('text', list(texts()))
+@pytest.mark.parametrize('chunk_size', [64, 1000, 1 << 20])
+def test_stream_matches_analyze_text(analyzer, text, chunk_size):
+    expected = normalized(analyzer.analyze_text(text))
+    assert normalized(analyzer.analyze_stream(text, chunk_size=chunk_size)) == expected
+    data = text.encode('utf-8')
+    chunks = (data[start:start + chunk_size] for start in range(0, len(data), chunk_size))
+    assert normalized(analyzer.analyze_stream(chunks, chunk_size=chunk_size)) == expected
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_paragraphs_match_analyze_text(analyzer, seed):
+    paragraphs = generate_text(20_000, seed).split('\n\n')
+    expected = normalized(analyzer.analyze_text('\n\n'.join(paragraphs)))
+    for block_chars in (1, 500, 1 << 16):
+        results = analyzer.analyze_paragraphs(paragraphs, block_chars=block_chars)
+        assert normalized(results) == expected
+
+
+@pytest.mark.parametrize('seed', SEEDS[:2])
+def test_parallel_matches_analyze_text(analyzer, seed):
+    text = generate_text(40_000, seed)
+    results = analyze_parallel(text, analyzer, workers=2, pieces_per_worker=3, min_piece_bytes=1024)
+    assert normalized(results) == normalized(analyzer.analyze_text(text))
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_incremental_matches_analyze_text(analyzer, seed):
+    rnd = random.Random(seed)
+    paragraphs = generate_text(8_000, seed).split('\n\n') + SAMPLE.split('\n\n')
+    incremental = IncrementalAnalyzer(analyzer, locate=True)
+    for _ in range(40):
+        edit = rnd.random()
+        if edit < 0.4:
+            paragraphs.insert(rnd.randrange(len(paragraphs) + 1), rnd.choice(paragraphs))
+        elif edit < 0.6 and len(paragraphs) > 1:
+            paragraphs.pop(rnd.randrange(len(paragraphs)))
+        elif edit < 0.8:
+            index = rnd.randrange(len(paragraphs))
+            words = paragraphs[index].split()
+            words.insert(rnd.randrange(len(words) + 1), rnd.choice(words))
+            paragraphs[index] = ' '.join(words)
+        else:
+            rnd.shuffle(paragraphs)
+        text = '\n\n'.join(paragraphs)
+        results = incremental.analyze_text(text)
+        expected = analyzer.analyze_text(text, locate=True)
+        assert normalized(results) == normalized(expected)
+        assert (analyzer.find_highlight_spans(text, results)
+                == analyzer.find_highlight_spans(text, expected))
+
+
+@pytest.mark.parametrize('text', list(texts()))
+def test_highlight_spans_reuse_located_results(analyzer, text):
+    expected = analyzer.find_highlight_spans(text)
+    assert analyzer.find_highlight_spans(text, analyzer.analyze_text(text)) == expected
+    assert analyzer.find_highlight_spans(text, analyzer.analyze_text(text, locate=True)) == expected
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_repeated_phrases_match_brute_force(analyzer, seed):
+    text = generate_text(4_000, seed) + '\n\n' + SAMPLE
+    doc = analyzer.tokenize(text)
+    tokens = doc.tokens
+    # Búsqueda directa: posiciones de cada secuencia de palabras con al
+    # menos dos de contenido, sin las contenidas en otra más larga que se
+    # repite las mismas veces
+    positions = {}
+    for words in range(PHRASE_MIN_WORDS, PHRASE_MAX_WORDS + 1):
+        for start in range(len(tokens) - words + 1):
+            phrase = tuple(tokens[start:start + words])
+            if sum(map(analyzer._is_content_word, phrase)) >= 2:
+                positions.setdefault(phrase, []).append(start)
+    repeated = {phrase: found for phrase, found in positions.items() if len(found) > 1}
+    expected = {
+        ' '.join(phrase): [(doc.starts[i], doc._ends[i + len(phrase) - 1]) for i in found]
+        for phrase, found in repeated.items()
+        if not any(len(repeated.get(longer, ())) == len(found)
+                   for longer in (phrase + (tokens[found[0] + len(phrase)],),
+                                  (tokens[found[0] - 1],) + phrase)
+                   if len(longer) <= PHRASE_MAX_WORDS)
+    }
+    assert analyzer.find_repeated_phrases(text) == expected
+
+
+def test_matcher_data_round_trip():
+    matcher = compile_matcher(('de que', 'puede lograr', 'puede', 'etc.', 'su', 'Su'))
+    loaded = ExpressionMatcher.from_data(json.loads(json.dumps(matcher.to_data())))
+    assert loaded.expressions == matcher.expressions
+    doc = TextAnalyzer().tokenize(SAMPLE + ' Su suma, de que etc. puede')
+    assert loaded.find(doc) == matcher.find(doc)
+    assert loaded.spans(doc) == matcher.spans(doc)
+    with pytest.raises(ValueError):
+        ExpressionMatcher.from_data({**matcher.to_data(), 'expressions': [1]})
+
+
+def test_rule_pack_cache_is_written_read_and_checked(tmp_path):
+    rules = {field: getattr(get_rule_pack(), field) for field in RULE_FIELDS}
+    pack = RulePack('prueba', rules, digest='0' * 64)
+    compile_rule_pack(pack, tmp_path)
+    cache_files = list(tmp_path.glob('prueba-*.json'))
+    assert len(cache_files) == 1
+    cache_file = cache_files[0]
+    original = json.loads(cache_file.read_text(encoding='utf-8'))
+    assert set(original) == set(MATCHER_FIELDS)
+
+    # El caché vigente se lee sin reescribirlo
+    modified = cache_file.stat().st_mtime_ns
+    compile_rule_pack(pack, tmp_path)
+    assert cache_file.stat().st_mtime_ns == modified
+
+    # Un caché que no corresponde a las reglas o mal formado se descarta y se recompila
+    tampered = dict(original, forbidden_expressions=ExpressionMatcher(['otra cosa']).to_data())
+    for content in (json.dumps(tampered), '{no es json'):
+        cache_file.write_text(content, encoding='utf-8')
+        compile_rule_pack(pack, tmp_path)
+        assert json.loads(cache_file.read_text(encoding='utf-8')) == original
+
+
+@pytest.mark.parametrize('compress', [True, False])
+def test_session_store_shares_and_releases_results(compress):
+    store = SessionStore(compress=compress)
+    result = {'word_count': 3, 'participios': ['realizado']}
+    store.publish('a', 'clave', result)
+    store.publish('b', 'clave', dict(result))
+    assert store.stats()['entries'] == 1
+    assert store.get('clave') == result
+
+    store.release('a')
+    assert store.get('clave') == result
+    # Cambiar de resultado suelta la referencia al anterior
+    store.publish('b', 'otra', {'word_count': 1})
+    assert store.get('clave') is None
+    assert store.get('otra') == {'word_count': 1}
+    store.release('b')
+    assert store.get('otra') is None
+    assert store.stats()['entries'] == 0
+
+
+def test_session_store_evicts_idle_sessions():
+    closed = []
+    store = SessionStore(idle_seconds=100, resource_idle_seconds=10, on_evict=closed.append)
+    store.touch('a')['live'] = 'a'
+    store.touch('b')['live'] = 'b'
+    store.publish('a', 'clave', {'word_count': 1})
+    store.publish('b', 'clave', {'word_count': 1})
+    now = store._sessions['a'].seen
+
+    assert store.evict_idle(now + 1) == 0
+    assert closed == []
+
+    # Primero se liberan solo los recursos
+    store.touch('b')
+    store._sessions['b'].seen = now + 50
+    assert store.evict_idle(now + 20) == 0
+    assert closed == [{'live': 'a'}]
+    assert store.get('clave') == {'word_count': 1}
+
+    # Luego se desaloja la sesión y con ella su referencia
+    assert store.evict_idle(now + 120) == 1
+    assert store.get('clave') == {'word_count': 1}
+    assert store.evict_idle(now + 200) == 1
+    assert closed == [{'live': 'a'}, {'live': 'b'}]
+    assert store.get('clave') is None
+    assert store.stats()['evicted_sessions'] == 2
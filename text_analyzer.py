@@ -1,146 +1,1752 @@
+import codecs
+import hashlib
+import json
+import logging
 import re
-from collections import Counter
-from typing import List, Dict, Set
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter, OrderedDict
+from functools import lru_cache
+from itertools import chain, compress, repeat
+from operator import add, and_, sub
+from typing import IO, Callable, FrozenSet, List, Dict, Iterable, Iterator, Set, Tuple, Union
+
+from lexicon import VerbLexicon, default_lexicon
+from rule_packs import RulePack, get_rule_pack
+
+logger = logging.getLogger(__name__)
+
+# Patrón de palabra compartido por todos los detectores
+WORD_PATTERN = re.compile(r'\b\w+\b')
+
+# Separador de párrafos (una o más líneas en blanco)
+PARAGRAPH_SEPARATOR = re.compile(r'\n\s*\n')
+
+# Signos que cierran una oración
+SENTENCE_TERMINATORS = '.!?'
+
+# Fin de oración: signos de cierre (más comillas o paréntesis que los
+# sigan) seguidos de un espacio o del final del texto
+SENTENCE_END = re.compile(r'[.!?]+[\'"»”’)\]]*(?=\s|\Z)')
+
+# Primer carácter que no es espacio
+NON_SPACE = re.compile(r'\S')
+
+# Último bloque de espacios seguido de texto sin espacios (punto de corte
+# seguro al leer un texto por partes)
+TRAILING_SPACE = re.compile(r'\s+\S*\Z')
+
+# Coma seguida del conectivo 'y'
+COMMA_Y_PATTERN = re.compile(r',\s+y\b', re.IGNORECASE)
+
+# Texto breve que recorre todos los detectores al preparar un analizador
+WARM_UP_TEXT = (
+    "El trabajo realizado, y considerando que el trabajo puede lograr un cambio "
+    "grande ya que etc. Vino el Dr. Pérez.\n\nOtro párrafo pero pequeño."
+)
+
+# Orden de prioridad al marcar el texto: si dos hallazgos se solapan,
+# gana la categoría que aparece antes en esta tupla
+HIGHLIGHT_PRIORITY = (
+    'comma_before_y', 'forbidden_expressions', 'repeated_phrases',
+    'problematic_adjectives', 'gerundios', 'participios', 'close_repetitions'
+)
+
+# Longitud (en palabras) de las frases repetidas que se buscan
+PHRASE_MIN_WORDS = 2
+PHRASE_MAX_WORDS = 5
+
+# Hash de una frase al contarlas en un corpus (ver phrase_sketch):
+# polinomio módulo 2**64 sobre los hashes de sus palabras,
+# h = h * PHRASE_HASH_BASE + token_hash(palabra)
+PHRASE_HASH_BASE = 0x9E3779B97F4A7C15
+HASH_MASK = (1 << 64) - 1
+
+
+def _lower_preserving_offsets(text: str) -> str:
+    """Convierte a minúsculas sin alterar la longitud del texto"""
+    lower = text.lower()
+    if len(lower) == len(text):
+        return lower
+    # Algunos caracteres (p. ej. 'İ') se expanden al pasar a minúsculas;
+    # se dejan tal cual para que las posiciones coincidan con el original
+    return ''.join(
+        ch_lower if len(ch_lower) == 1 else ch
+        for ch, ch_lower in ((ch, ch.lower()) for ch in text)
+    )
+
+
+class TokenizedDocument:
+    """
+    Texto tokenizado una sola vez para que todos los detectores lo compartan.
+
+    Las posiciones de los tokens son válidas tanto para ``text`` como para
+    ``lower`` porque ambos tienen la misma longitud.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.lower = _lower_preserving_offsets(text)
+        self.tokens: List[str] = WORD_PATTERN.findall(self.lower)
+        self._counts = None
+        self._starts = None
+        self._ends = None
+        # Índice de oraciones y las abreviaturas con que se calculó
+        self._sentences = None
+        # Recorridos de los detectores que se reutilizan al ubicar las
+        # marcas, por tipo y reglas
+        self._scans: Dict[Tuple, List] = {}
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    @property
+    def counts(self) -> Counter:
+        """Frecuencia de cada token, en orden de primera aparición"""
+        if self._counts is None:
+            self._counts = Counter(self.tokens)
+        return self._counts
+
+    def _compute_offsets(self):
+        if self._starts is None:
+            starts = array('q')
+            ends = array('q')
+            for match in WORD_PATTERN.finditer(self.lower):
+                starts.append(match.start())
+                ends.append(match.end())
+            self._starts, self._ends = starts, ends
+
+    @property
+    def starts(self) -> array:
+        """Posición de inicio de cada token"""
+        self._compute_offsets()
+        return self._starts
+
+    @property
+    def offsets(self) -> List[Tuple[int, int]]:
+        """Posiciones (inicio, fin) de cada token en el texto"""
+        self._compute_offsets()
+        return list(zip(self._starts, self._ends))
+
+    def iter_tokens(self) -> Iterator[Tuple[str, int, int]]:
+        """Genera (token, inicio, fin) sin construir listas intermedias"""
+        self._compute_offsets()
+        return zip(self.tokens, self._starts, self._ends)
+
+
+def _next_non_space(text: str, position: int) -> int:
+    match = NON_SPACE.search(text, position)
+    return len(text) if match is None else match.start()
+
+
+def _word_before(text: str, position: int) -> str:
+    """Palabra (solo letras) que termina justo antes de la posición"""
+    word_start = position
+    while word_start > 0 and text[word_start - 1].isalpha():
+        word_start -= 1
+    return text[word_start:position]
+
+
+def _abbreviation_continues(text: str, dot: int, abbreviations: FrozenSet[str],
+                            leading_abbreviations: FrozenSet[str]) -> bool:
+    """Indica si el punto en ``dot`` es de una abreviatura que no cierra la oración"""
+    word = _word_before(text, dot)
+    # Tratamientos ('Dr.', 'Sra.') e iniciales ('J. R.') preceden siempre a otra palabra
+    if word.lower() + '.' in leading_abbreviations or (len(word) == 1 and word.isupper()):
+        return True
+    if word.lower() + '.' not in abbreviations:
+        return False
+    # Otras abreviaturas ('etc.', 'pág.') cierran la oración ante una
+    # mayúscula, un cambio de párrafo o el final del texto
+    following = _next_non_space(text, dot + 1)
+    return (following < len(text) and not text[following].isupper()
+            and text.count('\n', dot + 1, following) < 2)
+
+
+class SentenceIndex:
+    """
+    Posiciones (inicio, fin) de las oraciones de un texto, guardadas en dos
+    arrays de enteros en lugar de copias de cada oración
+    """
+
+    def __init__(self, starts: array, ends: array, terminated: bool = True):
+        self.starts = starts
+        self.ends = ends
+        # Indica si la última oración termina con un signo de cierre
+        self.terminated = terminated
+
+    @classmethod
+    def build(cls, text: str, abbreviations: FrozenSet[str] = frozenset(),
+              leading_abbreviations: FrozenSet[str] = frozenset()) -> 'SentenceIndex':
+        """Segmenta el texto en una sola pasada"""
+        starts, ends = array('q'), array('q')
+        start = _next_non_space(text, 0)
+        for match in SENTENCE_END.finditer(text):
+            if match.start() <= start:
+                # Signos sin texto antes (p. ej. '...' al inicio)
+                start = _next_non_space(text, match.end())
+                continue
+            if match.group() == '.' and _abbreviation_continues(
+                    text, match.start(), abbreviations, leading_abbreviations):
+                continue
+            starts.append(start)
+            ends.append(match.end())
+            start = _next_non_space(text, match.end())
+        
+        terminated = start == len(text)
+        if not terminated:
+            starts.append(start)
+            ends.append(len(text.rstrip()))
+        return cls(starts, ends, terminated)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, index: int) -> Tuple[int, int]:
+        return self.starts[index], self.ends[index]
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        return zip(self.starts, self.ends)
+
+    def find(self, position: int) -> int:
+        """Número de la oración que contiene la posición, o -1 si cae entre oraciones"""
+        index = bisect_right(self.starts, position) - 1
+        return index if index >= 0 and position < self.ends[index] else -1
+
+
+def _sentence_numbers(doc: TokenizedDocument, sentences: SentenceIndex) -> Iterator[int]:
+    """
+    Número de la oración de cada token. Entre dos oraciones solo hay
+    espacios, así que basta con contar los tokens que empiezan en cada una.
+    """
+    starts = doc.starts
+    bounds = [bisect_left(starts, start) for start in sentences.starts]
+    bounds.append(len(starts))
+    sizes = (bounds[number + 1] - bounds[number] for number in range(len(sentences)))
+    return chain.from_iterable(repeat(number, size) for number, size in enumerate(sizes))
+
+
+class RepetitionWindow:
+    """
+    Ventana deslizante para detectar palabras repetidas a poca distancia.
+
+    Recibe las palabras en orden con su posición (número de token u
+    oración) y recuerda la última posición de cada una. Las palabras que ya
+    quedaron fuera de la ventana se descartan cada vez que el diccionario
+    duplica su tamaño, por lo que la memoria depende del tamaño de la
+    ventana y no de la longitud del texto.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._last: Dict[str, int] = {}
+        self._limit = 64
+
+    def seen(self, word: str, position: int) -> bool:
+        """Indica si la palabra apareció dentro de la ventana que termina en ``position``"""
+        last = self._last.get(word)
+        return last is not None and position - last < self.size
+
+    def feed(self, word: str, position: int) -> bool:
+        """Agrega una palabra e indica si repite otra de la ventana"""
+        repeated = self.seen(word, position)
+        self._last[word] = position
+        if len(self._last) > self._limit:
+            self._prune(position)
+        return repeated
+
+    def scan(self, words: Iterable[str], positions: Iterable[int],
+             content: Set[str]) -> Iterator[Tuple[int, str]]:
+        """
+        Como ``feed`` para una secuencia de palabras con sus posiciones, en
+        un solo ciclo: considera solo las que están en ``content`` y genera
+        (índice, palabra) de las que repiten otra de la ventana
+        """
+        size = self.size
+        last = self._last
+        for index, (word, position) in enumerate(zip(words, positions)):
+            if word in content:
+                previous = last.get(word)
+                last[word] = position
+                if previous is None:
+                    if len(last) > self._limit:
+                        self._prune(position)
+                elif position - previous < size:
+                    yield index, word
+
+    def _prune(self, position: int):
+        """Descarta las palabras que ya no pueden repetirse dentro de la ventana"""
+        since = position - self.size
+        for word in [word for word, last in self._last.items() if last <= since]:
+            del self._last[word]
+        self._limit = 2 * len(self._last) + 64
+
+    def recent(self, since: int) -> List[Tuple[str, int]]:
+        """Palabras vistas por última vez desde la posición ``since``, como (palabra, posición)"""
+        return [(word, last) for word, last in self._last.items() if last >= since]
+
+
+def _ranked(counts: Counter) -> Dict[str, int]:
+    """Conteos ordenados de mayor a menor (y alfabéticamente si empatan)"""
+    return dict(sorted(counts.items(), key=lambda item: (-item[1], item[0])))
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == '_'
+
+
+def _trie_regex(node: Dict, word_edge: bool) -> str:
+    """Convierte un nodo del trie en una expresión regular equivalente"""
+    branches = [
+        re.escape(ch) + _trie_regex(child, _is_word_char(ch))
+        for ch, child in sorted(node.items()) if ch != ''
+    ]
+    # El final de una expresión va después de sus extensiones para que
+    # siempre gane la coincidencia más larga
+    if '' in node:
+        branches.append(r'(?!\w)' if word_edge else '')
+    if len(branches) == 1:
+        return branches[0]
+    return '(?:' + '|'.join(branches) + ')'
+
+
+class ExpressionMatcher:
+    """
+    Buscador de expresiones compilado una sola vez por conjunto de reglas.
+
+    Las expresiones se combinan en una única expresión regular con forma de
+    trie, de modo que el texto se recorre una sola vez sin importar cuántas
+    reglas haya. Se respetan los límites de palabra en los extremos que son
+    letras o dígitos ("su" no coincide dentro de "suma", pero "etc." sí
+    coincide antes de un espacio).
+    """
+
+    # Incrementar si cambian los atributos o ``to_data``: invalida los
+    # buscadores guardados en disco (ver rule_packs.compile_rule_pack)
+    CACHE_FORMAT = 2
+
+    def __init__(self, expressions: Iterable[str]):
+        self.expressions = self.normalize(expressions)
+        
+        # Las palabras sueltas se consultan directamente en el vocabulario
+        self._words = frozenset(
+            expr for expr in self.expressions if WORD_PATTERN.fullmatch(expr)
+        )
+        phrases = [expr for expr in self.expressions if expr not in self._words]
+        
+        # Las expresiones regulares se compilan al usarse por primera vez;
+        # así un buscador leído de disco no paga la compilación de inmediato
+        self._sources = {
+            'all': self._regex_source(self.expressions),
+            'phrases': self._regex_source(phrases) if phrases else None
+        }
+        self._compiled: Dict[str, re.Pattern] = {}
+        
+        # Expresiones más cortas que empiezan en la misma posición que otra
+        # (p. ej. "puede" dentro de "puede lograr")
+        trie = self._build_trie(self.expressions)
+        self._prefixes = {}
+        for expr in self.expressions:
+            prefixes = []
+            node = trie
+            for i, ch in enumerate(expr[:-1]):
+                node = node[ch]
+                if '' in node and not (_is_word_char(ch) and _is_word_char(expr[i + 1])):
+                    prefixes.append(expr[:i + 1])
+            self._prefixes[expr] = tuple(prefixes)
+
+    @staticmethod
+    def normalize(expressions: Iterable[str]) -> Tuple[str, ...]:
+        """Expresiones en minúsculas, sin vacías ni repetidas, en su orden"""
+        return tuple(dict.fromkeys(expr.lower() for expr in expressions if expr))
+
+    @staticmethod
+    def _build_trie(expressions: Iterable[str]) -> Dict:
+        trie: Dict = {}
+        for expr in expressions:
+            node = trie
+            for ch in expr:
+                node = node.setdefault(ch, {})
+            node[''] = {}
+        return trie
+
+    def __getstate__(self) -> Dict:
+        state = self.__dict__.copy()
+        state['_compiled'] = {}
+        return state
+
+    def to_data(self) -> Dict:
+        """Estado del buscador con solo cadenas y listas, para guardarlo como JSON"""
+        return {
+            'expressions': list(self.expressions),
+            'words': sorted(self._words),
+            'sources': dict(self._sources),
+            'prefixes': {expr: list(prefixes) for expr, prefixes in self._prefixes.items() if prefixes}
+        }
+
+    @classmethod
+    def from_data(cls, data: Dict) -> 'ExpressionMatcher':
+        """
+        Reconstruye un buscador guardado con ``to_data`` sin volver a armar
+        sus expresiones regulares. Lanza ValueError si los datos no tienen
+        la forma esperada
+        """
+        expressions = data['expressions']
+        sources = data['sources']
+        if (not all(isinstance(expr, str) for expr in expressions)
+                or set(sources) != {'all', 'phrases'}
+                or not isinstance(sources['all'], str)
+                or not isinstance(sources['phrases'], (str, type(None)))):
+            raise ValueError('Buscador guardado con un formato inválido')
+        matcher = cls.__new__(cls)
+        matcher.expressions = tuple(expressions)
+        matcher._words = frozenset(data['words'])
+        matcher._sources = {'all': sources['all'], 'phrases': sources['phrases']}
+        matcher._compiled = {}
+        prefixes = data['prefixes']
+        matcher._prefixes = {expr: tuple(prefixes.get(expr, ())) for expr in matcher.expressions}
+        return matcher
+
+    def compile(self) -> 'ExpressionMatcher':
+        """Compila de inmediato las expresiones regulares que se compilarían al usarse"""
+        for kind, source in self._sources.items():
+            if source is not None:
+                self._regex(kind)
+        return self
+
+    def _regex(self, kind: str) -> re.Pattern:
+        pattern = self._compiled.get(kind)
+        if pattern is None:
+            pattern = self._compiled[kind] = re.compile(self._sources[kind])
+        return pattern
+
+    @classmethod
+    def _regex_source(cls, expressions: Iterable[str]) -> str:
+        branches = []
+        for ch, child in sorted(cls._build_trie(expressions).items()):
+            # El límite izquierdo va después del primer carácter para que cada
+            # alternativa empiece con un literal y la búsqueda sea más rápida
+            guard = r'(?<!\w.)' if _is_word_char(ch) else ''
+            branches.append(re.escape(ch) + guard + _trie_regex(child, _is_word_char(ch)))
+        return '|'.join(branches) or '(?!)'
+
+    def _scan(self, pattern: re.Pattern, text: str) -> Iterator[Tuple[int, int, str]]:
+        search = pattern.search
+        match = search(text)
+        while match is not None:
+            start, end = match.span()
+            expression = match.group()
+            yield start, end, expression
+            for prefix in self._prefixes[expression]:
+                yield start, start + len(prefix), prefix
+            # Reanudar justo después del inicio para no perder solapamientos
+            match = search(text, start + 1)
+
+    def finditer(self, text: str) -> Iterator[Tuple[int, int, str]]:
+        """Genera (inicio, fin, expresión) para cada coincidencia en un texto en minúsculas"""
+        return self._scan(self._regex('all'), text)
+
+    @property
+    def words(self) -> FrozenSet[str]:
+        """Expresiones de una sola palabra (se buscan en el vocabulario)"""
+        return self._words
+
+    def finditer_phrases(self, text: str) -> Iterator[Tuple[int, int, str]]:
+        """Como ``finditer``, pero solo para las expresiones de varias palabras"""
+        if self._sources['phrases'] is None:
+            return iter(())
+        return (
+            match for match in self._scan(self._regex('phrases'), text)
+            if match[2] not in self._words
+        )
+
+    def find(self, doc: TokenizedDocument) -> List[str]:
+        """Devuelve las expresiones presentes en el documento, en el orden de las reglas"""
+        vocabulary = doc.counts
+        if len(self._words) <= len(vocabulary):
+            found = {word for word in self._words if word in vocabulary}
+        else:
+            found = {word for word in vocabulary if word in self._words}
+        
+        found.update(expression for _, _, expression in self._phrase_matches(doc))
+        return [expr for expr in self.expressions if expr in found]
+
+    def spans(self, doc: TokenizedDocument) -> List[Tuple[int, int]]:
+        """
+        Posiciones (inicio, fin) de las coincidencias en el documento, las
+        mismas que ``finditer(doc.lower)``, ordenadas. Las de una sola
+        palabra salen de los tokens en lugar de la expresión regular
+        """
+        tokens = doc.tokens
+        starts, ends = doc.starts, doc._ends
+        found = {
+            (starts[i], ends[i])
+            for i in compress(range(len(tokens)), map(self._words.__contains__, tokens))
+        }
+        found.update((start, end) for start, end, _ in self._phrase_matches(doc))
+        return sorted(found)
+    
+    def _phrase_matches(self, doc: TokenizedDocument) -> List[Tuple[int, int, str]]:
+        """Coincidencias de las expresiones de varias palabras, recorridas una vez por documento"""
+        if self._sources['phrases'] is None:
+            return []
+        key = ('expressions', self.expressions)
+        matches = doc._scans.get(key)
+        if matches is None:
+            matches = doc._scans[key] = list(self._scan(self._regex('phrases'), doc.lower))
+        return matches
+
+
+# Buscadores compilados por conjunto de reglas (los más recientes primero)
+_matchers: 'OrderedDict[Tuple[str, ...], ExpressionMatcher]' = OrderedDict()
+_MAX_MATCHERS = 32
+
+
+def register_matcher(expressions: Tuple[str, ...], matcher: ExpressionMatcher):
+    """Registra un buscador ya compilado (p. ej. leído del caché en disco)"""
+    _matchers[expressions] = matcher
+    _matchers.move_to_end(expressions)
+    while len(_matchers) > _MAX_MATCHERS:
+        _matchers.popitem(last=False)
+
+
+def compile_matcher(expressions: Tuple[str, ...]) -> ExpressionMatcher:
+    """Compila (una vez por conjunto de reglas) el buscador de expresiones"""
+    matcher = _matchers.get(expressions)
+    if matcher is None:
+        matcher = ExpressionMatcher(expressions)
+        register_matcher(expressions, matcher)
+    return matcher
+
+
+class PhraseIndex:
+    """
+    Número exacto de cada frase de hasta PHRASE_MAX_WORDS palabras.
+
+    Cada palabra recibe un número, y la frase de n + 1 palabras que empieza
+    en la palabra i se identifica por el par (frase de n palabras en i, frase
+    de n palabras en i + 1). Así cada longitud se calcula con una búsqueda
+    por palabra sobre la anterior, y dos frases son iguales si y solo si
+    tienen el mismo número: no hay colisiones que comprobar. Los números
+    valen solo dentro del mismo índice.
+    """
+
+    def __init__(self, is_content_word: Callable[[str], bool]):
+        self.is_content_word = is_content_word
+        # Por longitud: el número de cada palabra o par de frases, el par
+        # de cada número y cuántas palabras de contenido tiene la frase
+        self._tables: List[Dict] = [{} for _ in range(PHRASE_MAX_WORDS)]
+        self._pairs: List[List[Tuple[int, int]]] = [[] for _ in range(PHRASE_MAX_WORDS)]
+        self._content = [bytearray() for _ in range(PHRASE_MAX_WORDS)]
+
+    def __len__(self) -> int:
+        """Cantidad de palabras y frases distintas numeradas"""
+        return sum(map(len, self._tables))
+
+    def _number(self, n: int, keys: List) -> List[int]:
+        """Números de las palabras (n = 0) o pares de frases de n palabras dados"""
+        table = self._tables[n]
+        known = len(table)
+        level = [table.setdefault(key, len(table)) for key in keys]
+        if len(table) == known:
+            return level
+        # Las claves nuevas, en el orden de sus números
+        added = list(dict(zip(
+            compress(level, map(known.__le__, level)),
+            compress(keys, map(known.__le__, level))
+        )).values())
+        if n == 0:
+            self._content[0].extend(map(self.is_content_word, added))
+            return level
+        self._pairs[n].extend(added)
+        content = self._content[n - 1]
+        prefixes = [prefix for prefix, _ in added]
+        suffixes = [suffix for _, suffix in added]
+        if n == 1:
+            shared = repeat(0)
+        else:
+            # Las palabras que las dos frases comparten se cuentan una vez
+            middle = (pair[0] for pair in map(self._pairs[n - 1].__getitem__, suffixes))
+            shared = map(self._content[n - 2].__getitem__, middle)
+        self._content[n].extend(map(
+            sub, map(add, map(content.__getitem__, prefixes), map(content.__getitem__, suffixes)), shared
+        ))
+        return level
+
+    def encode(self, tokens: List[str]) -> List[List[int]]:
+        """
+        Números de las frases de un texto: ``levels[n][i]`` es el de la
+        frase de n + 1 palabras que empieza en la palabra i
+        """
+        level = self._number(0, tokens)
+        levels = [level]
+        for n in range(1, PHRASE_MAX_WORDS):
+            level = self._number(n, list(zip(level, level[1:])))
+            levels.append(level)
+        return levels
+
+    def join(self, parts: List[List[List[int]]]) -> List[List[int]]:
+        """
+        Une los números de textos consecutivos (p. ej. los párrafos de un
+        documento) calculados con ``encode``, agregando las frases que
+        cruzan de un texto a otro
+        """
+        lengths = [len(levels[0]) for levels in parts]
+        total = sum(lengths)
+        joined = [list(chain.from_iterable(levels[0] for levels in parts))]
+        for n in range(1, PHRASE_MAX_WORDS):
+            shorter = joined[-1]
+            pieces = []
+            start = 0
+            for levels, length in zip(parts, lengths):
+                pieces.append(levels[n])
+                # Frases que empiezan al final de este texto
+                crossing = range(start + max(length - n, 0), min(start + length, total - n))
+                if crossing:
+                    pieces.append(self._number(n, [(shorter[i], shorter[i + 1]) for i in crossing]))
+                start += length
+            joined.append(list(chain.from_iterable(pieces)))
+        return joined
+
+    def repeated(self, levels: List[List[int]]) -> List[Tuple[int, List[int], Set[int]]]:
+        """
+        Frases de PHRASE_MIN_WORDS a PHRASE_MAX_WORDS palabras que aparecen
+        más de una vez y tienen al menos dos palabras de contenido. Una
+        frase contenida en otra más larga que se repite las mismas veces se
+        omite. Devuelve (palabras, números de cada posición, números de las
+        frases) por longitud.
+        """
+        found = []
+        mask = None
+        for words in range(PHRASE_MIN_WORDS, PHRASE_MAX_WORDS + 1):
+            level = levels[words - 1]
+            # Solo se repite una frase cuyas dos frases de una palabra menos
+            # (desde su palabra y desde la siguiente) se repiten
+            frequency = Counter(level if mask is None else compress(level, map(and_, mask, mask[1:])))
+            repeated = {value for value, count in frequency.items() if count > 1}
+            if not repeated:
+                break
+            mask = bytes(map(repeated.__contains__, level))
+            found.append((words, level, frequency, repeated))
+
+        # Una frase que se repite tantas veces como otra que la contiene (a
+        # partir de su misma palabra o de la siguiente) no se informa
+        absorbed = [set() for _ in found]
+        for n in range(1, len(found)):
+            shorter_frequency = found[n - 1][2]
+            words, _, frequency, repeated = found[n]
+            pairs = self._pairs[words - 1]
+            for value in repeated:
+                for contained in pairs[value]:
+                    if shorter_frequency[contained] == frequency[value]:
+                        absorbed[n - 1].add(contained)
+
+        return [
+            (words, level, {
+                value for value in repeated
+                if value not in absorbed[n] and self._content[words - 1][value] >= 2
+            })
+            for n, (words, level, _, repeated) in enumerate(found)
+        ]
+
+    def longest(self, levels: List[List[int]]) -> bytearray:
+        """Palabras de la frase repetida más larga que empieza en cada posición (0 si ninguna)"""
+        longest = bytearray(len(levels[0]))
+        for words, level, phrases in self.repeated(levels):
+            for i in compress(range(len(level)), map(phrases.__contains__, level)):
+                longest[i] = words
+        return longest
+
+
+@lru_cache(maxsize=1 << 16)
+def token_hash(token: str) -> int:
+    """Hash de 64 bits de un token, igual en todos los procesos"""
+    return int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+@lru_cache(maxsize=32)
+def rules_fingerprint(*rule_lists: Tuple[str, ...]) -> str:
+    """Calcula una huella estable de un conjunto de reglas"""
+    digest = hashlib.blake2b(digest_size=8)
+    for rules in rule_lists:
+        digest.update('\x1f'.join(rules).encode('utf-8') + b'\x1e')
+    return digest.hexdigest()
+
+
+def log_metrics(event: str, metrics: Dict):
+    """Escribe métricas como una línea de log estructurada (JSON)"""
+    logger.info(json.dumps({'event': event, **metrics}, ensure_ascii=False))
+
+
+def _iter_text_chunks(source: Union[str, bytes, IO, Iterable[Union[str, bytes]]],
+                      chunk_size: int, encoding: str) -> Iterator[str]:
+    """Lee bloques de texto de un archivo, mmap o iterador de fragmentos"""
+    if isinstance(source, (str, bytes)):
+        chunks = iter((source,))
+    elif hasattr(source, 'read'):
+        chunks = iter(lambda: source.read(chunk_size), None)
+    else:
+        chunks = iter(source)
+    
+    # Los bloques binarios se decodifican sin partir caracteres multibyte
+    decoder = codecs.getincrementaldecoder(encoding)()
+    for chunk in chunks:
+        if not chunk:
+            if hasattr(source, 'read'):
+                break
+            continue
+        if not isinstance(chunk, str):
+            chunk = decoder.decode(bytes(chunk))
+        if chunk:
+            yield chunk
+    remainder = decoder.decode(b'', final=True)
+    if remainder:
+        yield remainder
+
 
 class TextAnalyzer:
     """
     Analizador de texto para detectar problemas comunes en redacción académica
     """
     
-    def __init__(self, language="🇪🇸 Español"):
+    # Detectores del análisis completo: (clave del resultado, método)
+    DETECTORS = (
+        ('word_count', 'count_words'),
+        ('sentence_count', 'count_sentences'),
+        ('repeated_words', 'find_repeated_words'),
+        ('close_repetitions', 'find_close_repetitions'),
+        ('participios', 'find_participios'),
+        ('gerundios', 'find_gerundios'),
+        ('forbidden_expressions', 'find_forbidden_expressions'),
+        ('problematic_adjectives', 'find_problematic_adjectives'),
+        ('comma_before_y', 'check_comma_before_y'),
+        ('specific_word_counts', 'count_specific_words')
+    )
+    
+    def __init__(self, language="🇪🇸 Español", rule_pack: RulePack = None,
+                 lexicon: VerbLexicon = None):
         self.language = language
         
-        # Mantener siempre las reglas en español (solo cambia la interfaz)
-        self.forbidden_expressions = [
-            "ya que", "de que", "puesto que", "etc.", "pero",
-            "puede lograr", "pueden motivar", "puede", "pueden",
-            "pretende", "su", "sus"
-        ]
+        # El idioma (de la interfaz o nombre de paquete) selecciona el
+        # paquete de reglas; ver rule_packs.LANGUAGE_PACKS
+        if rule_pack is None:
+            rule_pack = get_rule_pack(language)
+        self.rule_pack = rule_pack
         
-        self.problematic_adjectives = [
-            "grande", "pequeño", "muchos", "pocos", "algunos",
-            "varios", "diversas", "múltiples"
-        ]
+        self.forbidden_expressions = list(rule_pack.forbidden_expressions)
+        self.problematic_adjectives = list(rule_pack.problematic_adjectives)
+        
+        # Palabras muy comunes que es normal repetir
+        self.common_words = frozenset(rule_pack.common_words)
+        
+        # Palabras terminadas en -ado/-ido que no son participios problemáticos
+        self.participio_exclusions = frozenset(rule_pack.participio_exclusions)
+        
+        # Palabras cuyo uso se contabiliza en los conteos específicos
+        self.specific_words = tuple(rule_pack.specific_words)
+        
+        # Conectores cuya densidad se mide en cada oración
+        self.connectors = frozenset(rule_pack.connectors)
+        
+        # Abreviaturas que no cierran la oración al segmentar el texto
+        self.abbreviations = frozenset(rule_pack.abbreviations)
+        self.leading_abbreviations = frozenset(rule_pack.leading_abbreviations)
+        
+        # Ventana de las repeticiones cercanas: número de oraciones o de palabras
+        self.repetition_window = rule_pack.repetition_window
+        self.repetition_unit = rule_pack.repetition_unit
+        
+        # Léxico opcional de formas verbales; sin él, los participios y
+        # gerundios se reconocen solo por su terminación
+        self.lexicon = lexicon if lexicon is not None else default_lexicon()
     
-    def count_words(self, text: str) -> int:
+    @property
+    def rules_version(self) -> str:
+        """Huella de las reglas activas; cambia si se modifica cualquier lista"""
+        return rules_fingerprint(
+            tuple(self.forbidden_expressions), tuple(self.problematic_adjectives),
+            tuple(sorted(self.common_words)), tuple(sorted(self.participio_exclusions)),
+            self.specific_words, tuple(sorted(self.connectors)),
+            tuple(sorted(self.abbreviations)), tuple(sorted(self.leading_abbreviations)),
+            (self.repetition_unit, str(self.repetition_window)),
+            (self.lexicon.digest if self.lexicon is not None else '',)
+        )
+    
+    def warm_up(self) -> Dict[str, float]:
+        """
+        Compila los buscadores y recorre una vez todos los detectores, para
+        que el primer análisis real cueste lo mismo que los siguientes.
+        Devuelve los segundos de cada etapa.
+        """
+        started = time.perf_counter()
+        self.forbidden_matcher.compile()
+        self.adjective_matcher.compile()
+        stages = {'matchers': time.perf_counter() - started}
+        
+        started = time.perf_counter()
+        doc = self.tokenize(WARM_UP_TEXT)
+        self.sentence_metrics(doc, self.find_highlight_spans(doc))
+        self.analyze_paragraphs(WARM_UP_TEXT.split('\n\n'))
+        stages['analysis'] = time.perf_counter() - started
+        return stages
+    
+    @staticmethod
+    def tokenize(text: Union[str, TokenizedDocument]) -> TokenizedDocument:
+        """Devuelve el documento tokenizado, reutilizándolo si ya lo está"""
+        if isinstance(text, TokenizedDocument):
+            return text
+        return TokenizedDocument(text)
+    
+    def count_words(self, text: Union[str, TokenizedDocument]) -> int:
         """Cuenta el número de palabras en el texto"""
-        words = re.findall(r'\b\w+\b', text.lower())
-        return len(words)
+        return len(self.tokenize(text))
     
-    def find_repeated_words(self, text: str) -> Dict[str, int]:
+    def count_content_words(self, text: Union[str, TokenizedDocument]) -> Counter:
+        """Cuenta las palabras que se consideran al buscar repeticiones"""
+        doc = self.tokenize(text)
+        
+        # Excluir palabras muy cortas o muy comunes
+        return Counter({
+            word: count for word, count in doc.counts.items() if self._is_content_word(word)
+        })
+    
+    def find_repeated_words(self, text: Union[str, TokenizedDocument]) -> Dict[str, int]:
         """Encuentra palabras repetidas en el texto (más de una vez)"""
-        # Extraer solo palabras (sin puntuación)
-        words = re.findall(r'\b\w+\b', text.lower())
-        
-        # Filtrar palabras muy comunes que es normal repetir
-        common_words = {
-            'el', 'la', 'los', 'las', 'un', 'una', 'unos', 'unas',
-            'de', 'del', 'en', 'con', 'por', 'para', 'a', 'al',
-            'se', 'es', 'son', 'y', 'o', 'que', 'no', 'si',
-            'como', 'cuando', 'donde', 'este', 'esta', 'estos', 'estas'
+        # Retornar solo las que aparecen más de una vez
+        return {
+            word: count for word, count in self.count_content_words(text).items()
+            if count > 1
         }
+    
+    def _unit_positions(self, doc: TokenizedDocument,
+                        sentences: SentenceIndex = None) -> Iterator[int]:
+        """Posición de cada token en la ventana de repeticiones: su número o el de su oración"""
+        if self.repetition_unit == 'tokens':
+            return iter(range(len(doc)))
+        if sentences is None:
+            sentences = self.split_sentences(doc)
+        return _sentence_numbers(doc, sentences)
+    
+    def _is_content_word(self, word: str) -> bool:
+        """Indica si una palabra se considera al buscar repeticiones"""
+        return len(word) > 2 and word not in self.common_words
+    
+    def _scan_repetitions(self, doc: TokenizedDocument, window: RepetitionWindow = None,
+                          sentences: SentenceIndex = None) -> Iterator[Tuple[int, str]]:
+        """
+        Genera (índice, palabra) de cada palabra de contenido que repite otra
+        dentro de la ventana. Sin ``window`` el documento es el texto
+        completo y se omiten las palabras que aparecen una sola vez.
+        """
+        if window is not None:
+            content = {word for word in doc.counts if self._is_content_word(word)}
+            return window.scan(doc.tokens, self._unit_positions(doc, sentences), content)
         
-        # Contar palabras excluyendo las comunes
-        filtered_words = [word for word in words if word not in common_words and len(word) > 2]
-        word_counts = Counter(filtered_words)
+        # Las del texto completo se guardan para ubicarlas sin recorrerlo de nuevo
+        key = ('repetitions', self.rules_version)
+        found = doc._scans.get(key)
+        if found is None:
+            content = {
+                word for word, count in doc.counts.items()
+                if count > 1 and self._is_content_word(word)
+            }
+            window = RepetitionWindow(self.repetition_window)
+            found = doc._scans[key] = list(
+                window.scan(doc.tokens, self._unit_positions(doc, sentences), content)
+            )
+        return iter(found)
+    
+    def find_close_repetitions(self, text: Union[str, TokenizedDocument]) -> Dict[str, int]:
+        """
+        Encuentra palabras repetidas a poca distancia: dentro de una ventana
+        de ``repetition_window`` oraciones (o palabras, según
+        ``repetition_unit``). Devuelve cuántas veces se repitió cada una,
+        de mayor a menor.
+        """
+        doc = self.tokenize(text)
+        return _ranked(Counter(word for _, word in self._scan_repetitions(doc)))
+    
+    def find_repeated_phrases(self, text: Union[str, TokenizedDocument]) -> Dict[str, List[Tuple[int, int]]]:
+        """
+        Encuentra frases de PHRASE_MIN_WORDS a PHRASE_MAX_WORDS palabras, con
+        al menos dos palabras de contenido, que aparecen más de una vez.
+        Devuelve las posiciones (inicio, fin) de cada aparición, de la frase
+        más repetida a la menos. Una frase contenida en otra más larga que
+        se repite las mismas veces se omite.
+        """
+        doc = self.tokenize(text)
+        tokens = doc.tokens
+        index = PhraseIndex(self._is_content_word)
+        found: Dict[Tuple[str, ...], List[int]] = {}
+        for words, level, phrases in index.repeated(index.encode(tokens)):
+            positions: Dict[int, List[int]] = {}
+            for i in compress(range(len(level)), map(phrases.__contains__, level)):
+                positions.setdefault(level[i], []).append(i)
+            for group in positions.values():
+                found[tuple(tokens[group[0]:group[0] + words])] = group
+        starts, ends = doc.starts, doc._ends
+        ranked = sorted(found.items(), key=lambda item: (-len(item[1]), -len(item[0]), item[0]))
+        return {
+            ' '.join(phrase): [(starts[i], ends[i + len(phrase) - 1]) for i in positions]
+            for phrase, positions in ranked
+        }
+    
+    def _phrase_spans(self, doc: TokenizedDocument) -> List[Tuple[int, int]]:
+        """Posiciones (inicio, fin) de la frase repetida más larga que empieza en cada palabra"""
+        index = PhraseIndex(self._is_content_word)
+        longest = index.longest(index.encode(doc.tokens))
+        starts, ends = doc.starts, doc._ends
+        return [(starts[i], ends[i + longest[i] - 1]) for i in compress(range(len(longest)), longest)]
+    
+    def is_participio(self, word: str) -> bool:
+        """Indica si una palabra (en minúsculas) se considera participio"""
+        if word in self.participio_exclusions:
+            return False
+        if self.lexicon is not None:
+            return self.lexicon.is_participle(word)
+        return word.endswith(('ado', 'ido'))
+    
+    def is_gerundio(self, word: str) -> bool:
+        """Indica si una palabra (en minúsculas) se considera gerundio"""
+        if self.lexicon is not None:
+            return self.lexicon.is_gerund(word)
+        return word.endswith(('ando', 'endo'))
+    
+    def find_participios(self, text: Union[str, TokenizedDocument]) -> List[str]:
+        """Encuentra participios (según el léxico, o por las terminaciones -ado, -ido)"""
+        doc = self.tokenize(text)
         
-        # Retornar solo las que aparecen más de una vez
-        return {word: count for word, count in word_counts.items() if count > 1}
+        # Basta con recorrer el vocabulario: cada palabra se reporta una vez
+        return [word for word in doc.counts if self.is_participio(word)]
+    
+    def find_gerundios(self, text: Union[str, TokenizedDocument]) -> List[str]:
+        """Encuentra gerundios (según el léxico, o por las terminaciones -ando, -endo)"""
+        doc = self.tokenize(text)
+        return [word for word in doc.counts if self.is_gerundio(word)]
+    
+    @property
+    def forbidden_matcher(self) -> ExpressionMatcher:
+        """Buscador compilado para las expresiones prohibidas actuales"""
+        return compile_matcher(tuple(self.forbidden_expressions))
+    
+    @property
+    def adjective_matcher(self) -> ExpressionMatcher:
+        """Buscador compilado para los adjetivos problemáticos actuales"""
+        return compile_matcher(tuple(self.problematic_adjectives))
+    
+    def find_forbidden_expressions(self, text: Union[str, TokenizedDocument]) -> List[str]:
+        """Encuentra expresiones prohibidas según las indicaciones"""
+        return self.forbidden_matcher.find(self.tokenize(text))
+    
+    def find_problematic_adjectives(self, text: Union[str, TokenizedDocument]) -> List[str]:
+        """Encuentra adjetivos calificativos problemáticos"""
+        return self.adjective_matcher.find(self.tokenize(text))
+    
+    def check_comma_before_y(self, text: Union[str, TokenizedDocument]) -> List[str]:
+        """Detecta comas antes del conectivo 'y'"""
+        if isinstance(text, TokenizedDocument):
+            text = text.text
+        return [match.group() for match in COMMA_Y_PATTERN.finditer(text)]
+    
+    def count_specific_words(self, text: Union[str, TokenizedDocument]) -> Dict[str, int]:
+        """Cuenta palabras específicas como 'y', 'pero', etc."""
+        counts = self.tokenize(text).counts
+        return {word: counts.get(word, 0) for word in self.specific_words}
+    
+    def split_sentences(self, text: Union[str, TokenizedDocument]) -> SentenceIndex:
+        """Índice de posiciones de las oraciones del texto (se guarda en el documento tokenizado)"""
+        abbreviations = (self.abbreviations, self.leading_abbreviations)
+        if not isinstance(text, TokenizedDocument):
+            return SentenceIndex.build(text, *abbreviations)
+        if text._sentences is None or text._sentences[0] != abbreviations:
+            text._sentences = (abbreviations, SentenceIndex.build(text.text, *abbreviations))
+        return text._sentences[1]
+    
+    def count_sentences(self, text: Union[str, TokenizedDocument]) -> int:
+        """Cuenta el número de oraciones en el texto"""
+        return len(self.split_sentences(text))
+    
+    def sentence_metrics(self, text: Union[str, TokenizedDocument],
+                         spans: List[Tuple[int, int, str]] = None) -> Dict[str, array]:
+        """
+        Métricas por oración, en arrays paralelos: posiciones ('starts',
+        'ends'), palabras ('words'), conectores ('connectors') y fragmentos
+        marcados ('issues'). Cada conteo es una búsqueda binaria por oración
+        sobre las posiciones ya calculadas de los tokens y las marcas.
+        """
+        doc = self.tokenize(text)
+        index = self.split_sentences(doc)
+        if spans is None:
+            spans = self.find_highlight_spans(doc)
+        
+        def count_between(positions: List[int]) -> array:
+            # Elementos (ordenados por posición) que empiezan en cada oración
+            return array('q', (
+                bisect_left(positions, end) - bisect_left(positions, start)
+                for start, end in index
+            ))
+        
+        token_starts = doc.starts
+        connector_starts = [
+            start for token, start in zip(doc.tokens, token_starts) if token in self.connectors
+        ]
+        words = count_between(token_starts)
+        connectors = count_between(connector_starts)
+        issues = count_between([span[0] for span in spans])
+        return {
+            'starts': index.starts, 'ends': index.ends,
+            'words': words, 'connectors': connectors, 'issues': issues
+        }
     
-    def find_participios(self, text: str) -> List[str]:
-        """Encuentra participios (terminaciones -ado, -ido)"""
-        words = re.findall(r'\b\w+\b', text.lower())
-        participios = []
+    def analyze_text(self, text: Union[str, TokenizedDocument], instrument: bool = False,
+                     locate: bool = False) -> Dict:
+        """
+        Realiza un análisis completo del texto. Con ``instrument=True`` el
+        resultado incluye además la clave 'metrics' con el tiempo y la
+        cantidad de hallazgos de cada etapa. Con ``locate=True`` incluye la
+        clave 'highlights' con las posiciones que usa ``find_highlight_spans``.
+        """
+        if instrument:
+            return self._analyze_instrumented(text, locate)
         
-        for word in words:
-            if word.endswith('ado') or word.endswith('ido'):
-                # Excluir algunas palabras que no son participios problemáticos
-                if word not in ['estado', 'lado', 'caso', 'modo', 'todo', 'nido', 'ido']:
-                    participios.append(word)
+        # Tokenizar una sola vez y compartir el documento entre detectores
+        doc = self.tokenize(text)
+        results = {key: getattr(self, method)(doc) for key, method in self.DETECTORS}
+        if locate:
+            results['highlights'] = self.locate_highlights(doc, results)
+        return results
+    
+    def _analyze_instrumented(self, text: Union[str, TokenizedDocument], locate: bool = False) -> Dict:
+        started = time.perf_counter()
+        doc = self.tokenize(text)
+        # El vocabulario se construye como parte de la tokenización
+        doc.counts
+        stages = {'tokenize': {'seconds': time.perf_counter() - started, 'matches': len(doc)}}
+        
+        results = {}
+        for key, method in self.DETECTORS:
+            stage_start = time.perf_counter()
+            value = getattr(self, method)(doc)
+            stages[key] = {
+                'seconds': time.perf_counter() - stage_start,
+                'matches': value if isinstance(value, int) else len(value)
+            }
+            results[key] = value
+        if locate:
+            stage_start = time.perf_counter()
+            results['highlights'] = self.locate_highlights(doc, results)
+            stages['highlights'] = {
+                'seconds': time.perf_counter() - stage_start,
+                'matches': sum(map(len, results['highlights'].values()))
+            }
         
-        return list(set(participios))  # Eliminar duplicados
+        results['metrics'] = {
+            'input_chars': len(doc.text),
+            'tokens': len(doc),
+            'seconds': time.perf_counter() - started,
+            'stages': stages
+        }
+        log_metrics('analyze_text', results['metrics'])
+        return results
     
-    def find_gerundios(self, text: str) -> List[str]:
-        """Encuentra gerundios (terminaciones -ando, -endo)"""
-        words = re.findall(r'\b\w+\b', text.lower())
-        gerundios = []
+    def analyze_fragment(self, text: Union[str, TokenizedDocument], locate: bool = False) -> Dict:
+        """
+        Calcula resultados parciales de un fragmento (p. ej. un párrafo) que
+        se pueden combinar con los de otros fragmentos mediante ResultAccumulator.
+        Con ``locate=True`` incluye 'highlights', las posiciones a marcar
+        dentro del fragmento salvo las frases repetidas (ver
+        ``locate_highlights``), y 'head_spans', la posición de cada palabra
+        de su comienzo que se marca si repite otra de un fragmento anterior
+        """
+        doc = self.tokenize(text)
+        text = doc.text
+        sentences = self.split_sentences(doc)
+        stripped = text.strip()
         
-        for word in words:
-            if word.endswith('ando') or word.endswith('endo'):
-                gerundios.append(word)
+        # Repeticiones cercanas dentro del fragmento, y las palabras de su
+        # comienzo y de su final que pueden repetirse con las de sus vecinos
+        # (ver RepetitionJoiner)
+        size = self.repetition_window
+        units = len(doc) if self.repetition_unit == 'tokens' else len(sentences)
+        window = RepetitionWindow(size)
+        repetitions = list(self._scan_repetitions(doc, window, sentences))
+        close_repetitions = Counter(word for _, word in repetitions)
+        head: Dict[str, int] = {}
+        for token, position in zip(doc.tokens, self._unit_positions(doc, sentences)):
+            if position >= size:
+                break
+            if self._is_content_word(token):
+                head.setdefault(token, position)
         
-        return list(set(gerundios))  # Eliminar duplicados
+        partial = {
+            'word_count': self.count_words(doc),
+            'sentence_count': len(sentences),
+            # Si el fragmento empieza sin signo de cierre o su última oración
+            # queda abierta, esa oración continúa la del fragmento vecino
+            'opens_sentence': bool(stripped) and stripped[0] not in SENTENCE_TERMINATORS,
+            'closes_sentence': bool(stripped) and not sentences.terminated,
+            # Datos para decidir si una abreviatura final ('etc.') cierra la
+            # oración, que depende del texto siguiente
+            'ends_with_abbreviation': (
+                stripped.endswith('.') and not stripped.endswith('..')
+                and _word_before(stripped, len(stripped) - 1).lower() + '.' in self.abbreviations
+            ),
+            'opens_uppercase': stripped[:1].isupper(),
+            'leading_newlines': text.count('\n', 0, len(text) - len(text.lstrip())),
+            'content_words': self.count_content_words(doc),
+            'close_repetitions': close_repetitions,
+            'repetition_edges': (tuple(head.items()), tuple(window.recent(units - size)), units),
+            'participios': self.find_participios(doc),
+            'gerundios': self.find_gerundios(doc),
+            'forbidden_expressions': self.find_forbidden_expressions(doc),
+            'problematic_adjectives': self.find_problematic_adjectives(doc),
+            'comma_before_y': self.check_comma_before_y(text),
+            'specific_word_counts': self.count_specific_words(doc)
+        }
+        if locate:
+            partial['highlights'] = self._locate(doc, partial, (index for index, _ in repetitions))
+            # Las palabras con otra categoría ya están marcadas
+            marked = set(chain.from_iterable(partial[category] for category in HIGHLIGHT_PRIORITY[3:-1]))
+            tokens, starts, ends = doc.tokens, doc.starts, doc._ends
+            partial['head_spans'] = {}
+            for word in head:
+                if word not in marked:
+                    index = tokens.index(word)
+                    partial['head_spans'][word] = (starts[index], ends[index])
+        return partial
     
-    def find_forbidden_expressions(self, text: str) -> List[str]:
-        """Encuentra expresiones prohibidas según las indicaciones"""
-        found_expressions = []
-        text_lower = text.lower()
-        
-        for expression in self.forbidden_expressions:
-            # Para expresiones de múltiples palabras, buscar exactamente
-            if ' ' in expression:
-                if expression in text_lower:
-                    found_expressions.append(expression)
-            else:
-                # Para palabras individuales, usar límites de palabra
-                pattern = r'\b' + re.escape(expression) + r'\b'
-                if re.search(pattern, text_lower):
-                    found_expressions.append(expression)
-        
-        return found_expressions
-    
-    def find_problematic_adjectives(self, text: str) -> List[str]:
-        """Encuentra adjetivos calificativos problemáticos"""
-        words = re.findall(r'\b\w+\b', text.lower())
-        found_adjectives = []
+    def analyze_stream(self, source: Union[str, bytes, IO, Iterable[Union[str, bytes]]],
+                       chunk_size: int = 1 << 20, encoding: str = 'utf-8') -> Dict:
+        """
+        Analiza un texto leído por partes (archivo, mmap o iterador de
+        fragmentos) sin cargarlo completo en memoria. Devuelve el mismo
+        resultado que ``analyze_text``.
+        """
+        merger = FragmentMerger(self)
+        
+        def add_fragment(fragment: str):
+            if fragment.strip():
+                merger.add(self.analyze_fragment(fragment), *merger.edges(fragment))
         
-        for word in words:
-            if word in self.problematic_adjectives:
-                found_adjectives.append(word)
+        # Cortar siempre antes de un espacio para no partir palabras; el
+        # resto queda pendiente hasta el siguiente bloque
+        pending = ''
+        for chunk in _iter_text_chunks(source, chunk_size, encoding):
+            pending += chunk
+            match = TRAILING_SPACE.search(pending)
+            if match is None:
+                continue
+            add_fragment(pending[:match.start()])
+            pending = pending[match.start():]
+        add_fragment(pending)
         
-        return list(set(found_adjectives))
+        return merger.results()
     
-    def check_comma_before_y(self, text: str) -> List[str]:
-        """Detecta comas antes del conectivo 'y'"""
-        pattern = r',\s+y\b'
-        matches = re.finditer(pattern, text, re.IGNORECASE)
-        return [match.group() for match in matches]
+    def analyze_paragraphs(self, paragraphs: Iterable[str],
+                           on_paragraph: Callable[[int, str, Dict[str, List[str]]], None] = None,
+                           block_chars: int = 1 << 16) -> Dict:
+        """
+        Analiza un texto recibido párrafo a párrafo (p. ej. leído de un
+        documento) sin unirlo completo en memoria: los párrafos se analizan
+        en bloques de unos ``block_chars`` caracteres. Devuelve el mismo
+        resultado que ``analyze_text`` sobre los párrafos separados por
+        líneas en blanco. ``on_paragraph`` recibe el número (desde 1), el
+        texto y los hallazgos de cada párrafo que tenga alguno.
+        """
+        totals = ResultAccumulator(self)
+        repetitions = RepetitionJoiner(self)
+        sentence_count = 0
+        comma_before_y: List[str] = []
+        previous = None
+        block: List[Tuple[int, str]] = []
+        block_size = 0
+        
+        def flush():
+            nonlocal sentence_count, previous
+            text = '\n\n'.join(paragraph for _, paragraph in block)
+            doc = self.tokenize(text)
+            partial = self.analyze_fragment(doc)
+            totals.apply(partial)
+            sentence_count += partial['sentence_count']
+            
+            # Los bloques se separan siempre entre párrafos
+            commas = []
+            continues = False
+            if previous is not None:
+                previous_text, previous_partial = previous
+                continues = continues_sentence(previous_partial, partial, paragraph_break=True)
+                if continues:
+                    sentence_count -= 1
+                stripped = previous_text.rstrip()
+                if stripped.endswith(','):
+                    spaces = len(text) - len(text.lstrip())
+                    boundary = previous_text[len(stripped) - 1:] + '\n\n' + text[:spaces + 2]
+                    match = COMMA_Y_PATTERN.match(boundary)
+                    if match is not None:
+                        commas.append(match.group())
+            comma_before_y.extend(commas)
+            comma_before_y.extend(partial['comma_before_y'])
+            repeated = repetitions.add(partial, continues)
+            
+            if on_paragraph is not None:
+                self._locate_findings(doc, block, partial, commas, repeated, on_paragraph)
+            previous = (text, partial)
+        
+        has_text = False
+        for number, paragraph in enumerate(paragraphs, 1):
+            block.append((number, paragraph))
+            block_size += len(paragraph) + 2
+            has_text = has_text or bool(paragraph.strip())
+            # Un bloque sin texto se une al siguiente
+            if block_size >= block_chars and has_text:
+                flush()
+                block, block_size, has_text = [], 0, False
+        if has_text:
+            flush()
+        
+        return totals.results(sentence_count, comma_before_y, repetitions.counts)
     
-    def count_specific_words(self, text: str) -> Dict[str, int]:
-        """Cuenta palabras específicas como 'y', 'pero', etc."""
-        text_lower = text.lower()
-        words = re.findall(r'\b\w+\b', text_lower)
-        
-        specific_counts = {
-            'y': words.count('y'),
-            'pero': words.count('pero'),
-            'que': words.count('que'),
-            'de': words.count('de'),
-            'el': words.count('el'),
-            'la': words.count('la'),
-            'en': words.count('en'),
-            'con': words.count('con'),
-            'por': words.count('por'),
-            'para': words.count('para')
+    def _locate_findings(self, doc: TokenizedDocument, block: List[Tuple[int, str]],
+                         partial: Dict, boundary_commas: List[str], boundary_repetitions: List[str],
+                         on_paragraph: Callable[[int, str, Dict[str, List[str]]], None]):
+        """Reparte los hallazgos de un bloque entre sus párrafos según su posición"""
+        starts = []
+        position = 0
+        for _, paragraph in block:
+            starts.append(position)
+            position += len(paragraph) + 2
+        findings: List[Dict[str, List[str]]] = [{} for _ in block]
+        
+        def add(position: int, category: str, item: str):
+            findings[bisect_right(starts, position) - 1].setdefault(category, []).append(item)
+        
+        # Una coma antes de 'y' se asigna al párrafo de la 'y', también
+        # cuando la coma quedó en el bloque anterior
+        if boundary_commas:
+            first = next(i for i, (_, paragraph) in enumerate(block) if paragraph.strip())
+            findings[first]['comma_before_y'] = list(boundary_commas)
+        
+        words: Dict[str, List[str]] = {}
+        for category in ('participios', 'gerundios'):
+            for word in partial[category]:
+                words.setdefault(word, []).append(category)
+        if words:
+            for token, start, _ in doc.iter_tokens():
+                for category in words.get(token, ()):
+                    add(start, category, token)
+        for category, matcher in (('forbidden_expressions', self.forbidden_matcher),
+                                  ('problematic_adjectives', self.adjective_matcher)):
+            if partial[category]:
+                for start, _, expression in matcher.finditer(doc.lower):
+                    add(start, category, expression)
+        for match in COMMA_Y_PATTERN.finditer(doc.text):
+            add(match.end() - 1, 'comma_before_y', match.group())
+        # Una palabra que repite otra del bloque anterior es la primera de su
+        # tipo en este bloque
+        if partial['close_repetitions'] or boundary_repetitions:
+            token_starts = doc.starts
+            for word in boundary_repetitions:
+                add(token_starts[doc.tokens.index(word)], 'close_repetitions', word)
+            for index, word in self._scan_repetitions(doc):
+                add(token_starts[index], 'close_repetitions', word)
+        
+        for (number, paragraph), found in zip(block, findings):
+            if found:
+                on_paragraph(number, paragraph, {
+                    # Cada palabra o expresión una vez; las comas, todas
+                    category: items if category == 'comma_before_y' else list(dict.fromkeys(items))
+                    for category, items in found.items()
+                })
+    
+    def _locate(self, doc: TokenizedDocument, results: Dict, repetitions: Iterable[int]) -> Dict:
+        """
+        Posiciones de las comas, expresiones y palabras a marcar en un
+        documento (ver ``locate_highlights``); ``repetitions`` son los
+        índices de sus repeticiones cercanas
+        """
+        # Categoría de mayor prioridad para cada palabra marcada; las
+        # repeticiones cercanas dependen de la posición, no solo de la palabra
+        word_categories = {}
+        for category in reversed(HIGHLIGHT_PRIORITY[3:-1]):
+            for word in results[category]:
+                word_categories[word] = category
+        tokens = doc.tokens
+        starts, ends = doc.starts, doc._ends
+        candidates = set(compress(range(len(tokens)), map(word_categories.__contains__, tokens)))
+        candidates.update(repetitions)
+        return {
+            'comma_before_y': [match.span() for match in COMMA_Y_PATTERN.finditer(doc.text)],
+            'forbidden_expressions': (
+                self.forbidden_matcher.spans(doc) if results['forbidden_expressions'] else []
+            ),
+            'words': [
+                (starts[i], ends[i], word_categories.get(tokens[i], 'close_repetitions'))
+                for i in sorted(candidates)
+            ]
         }
+    
+    def locate_highlights(self, text: Union[str, TokenizedDocument], results: Dict = None) -> Dict:
+        """
+        Posiciones en el texto de lo que se marca, para guardarlas junto al
+        resultado del análisis: (inicio, fin) de cada coma antes de 'y'
+        ('comma_before_y'), expresión prohibida ('forbidden_expressions') y
+        frase repetida más larga que empieza en cada palabra
+        ('repeated_phrases'), y (inicio, fin, categoría) de cada palabra
+        marcada ('words'), por orden de posición
+        """
+        doc = self.tokenize(text)
+        if results is None:
+            results = self.analyze_text(doc)
+        repetitions = ()
+        if results['close_repetitions']:
+            repetitions = (index for index, _ in self._scan_repetitions(doc))
+        highlights = self._locate(doc, results, repetitions)
+        highlights['repeated_phrases'] = self._phrase_spans(doc)
+        return highlights
+    
+    def find_highlight_spans(self, text: Union[str, TokenizedDocument],
+                             results: Dict = None) -> List[Tuple[int, int, str]]:
+        """
+        Devuelve los fragmentos a marcar como (inicio, fin, categoría),
+        ordenados y sin solapamientos según HIGHLIGHT_PRIORITY. Si
+        ``results`` trae 'highlights' (ver ``locate_highlights``) el texto
+        no se vuelve a recorrer
+        """
+        if results is None:
+            results = self.analyze_text(text, locate=True)
+        highlights = results.get('highlights')
+        if highlights is None:
+            highlights = self.locate_highlights(text, results)
+        
+        # Fragmentos que pueden abarcar varias palabras: comas, expresiones y
+        # frases repetidas, como (inicio, prioridad, -largo, fin, categoría)
+        # para que el orden natural de las tuplas sea el de selección. De las
+        # frases que empiezan en una misma palabra solo llega la más larga:
+        # las demás se solapan con ella y tienen su prioridad
+        fragments = []
+        for rank, category in enumerate(HIGHLIGHT_PRIORITY[:3]):
+            fragments.extend(
+                (start, rank, start - end, end, category) for start, end in highlights[category]
+            )
+        fragments.sort()
+        
+        selected: List[Tuple[int, int, str]] = []
+        last_rank = None
+        for start, span_rank, _, end, category in fragments:
+            if not selected or start >= selected[-1][1]:
+                selected.append((start, end, category))
+                last_rank = span_rank
+            elif span_rank < last_rank:
+                # Si se solapan, se conserva la categoría de mayor prioridad
+                selected[-1] = (start, end, category)
+                last_rank = span_rank
+        
+        # Mezclar en una sola pasada las palabras con los fragmentos anteriores
+        spans = []
+        phrase_iter = iter(selected)
+        phrase = next(phrase_iter, None)
+        for start, end, category in highlights['words']:
+            while phrase is not None and phrase[1] <= start:
+                spans.append(phrase)
+                phrase = next(phrase_iter, None)
+            if phrase is None or end <= phrase[0]:
+                spans.append((start, end, category))
+        if phrase is not None:
+            spans.append(phrase)
+            spans.extend(phrase_iter)
         
-        return specific_counts
+        return spans
+
+
+def split_paragraphs(text: str) -> List[Tuple[int, int]]:
+    """Devuelve las posiciones (inicio, fin) de cada párrafo del texto"""
+    paragraphs = []
+    start = 0
+    for separator in PARAGRAPH_SEPARATOR.finditer(text):
+        paragraphs.append((start, separator.start()))
+        start = separator.end()
+    paragraphs.append((start, len(text)))
+    return paragraphs
+
+
+def split_pages(text: str, max_chars: int = 20000,
+                sentences: SentenceIndex = None) -> List[Tuple[int, int]]:
+    """
+    Divide el texto en páginas contiguas (inicio, fin) de hasta ``max_chars``
+    caracteres, cortando entre párrafos; un párrafo más largo que una página
+    se corta al final de una oración (si se da su índice) o en el último espacio
+    """
+    starts = [start for start, _ in split_paragraphs(text)[1:]]
+    pages = []
+    start = 0
+    while len(text) - start > max_chars:
+        limit = start + max_chars
+        i = bisect_right(starts, limit) - 1
+        j = -1 if sentences is None else bisect_right(sentences.ends, limit) - 1
+        if i >= 0 and starts[i] > start:
+            cut = starts[i]
+        elif j >= 0 and sentences.ends[j] > start:
+            cut = sentences.ends[j]
+        else:
+            space = max(text.rfind(' ', start + 1, limit), text.rfind('\n', start + 1, limit))
+            cut = space + 1 if space > start else limit
+        pages.append((start, cut))
+        start = cut
+    pages.append((start, len(text)))
+    return pages
+
+
+def continues_sentence(previous: Dict, partial: Dict, paragraph_break: bool = False) -> bool:
+    """Indica si la última oración de un fragmento sigue en el siguiente"""
+    if not partial['opens_sentence']:
+        return False
+    if previous['closes_sentence']:
+        return True
+    # Una abreviatura al final no cierra la oración si el fragmento
+    # siguiente sigue en minúscula dentro del mismo párrafo
+    return (previous['ends_with_abbreviation'] and not partial['opens_uppercase']
+            and not paragraph_break and partial['leading_newlines'] < 2)
+
+
+class ResultAccumulator:
+    """
+    Totales de resultados parciales (de párrafos o fragmentos de texto) que
+    se pueden sumar y restar. Su tamaño depende del vocabulario, no de la
+    longitud del texto.
+    """
     
-    def count_sentences(self, text: str) -> int:
-        """Cuenta el número de oraciones en el texto"""
-        sentences = re.split(r'[.!?]+', text.strip())
-        return len([s for s in sentences if s.strip()])
+    # Hallazgos que se combinan como unión de conjuntos
+    SET_KEYS = ('participios', 'gerundios', 'forbidden_expressions', 'problematic_adjectives')
+    
+    def __init__(self, analyzer: TextAnalyzer):
+        self.analyzer = analyzer
+        self.word_count = 0
+        self.sentence_count = 0
+        self.content_words: Counter = Counter()
+        self.close_repetitions: Counter = Counter()
+        self.specific_counts: Counter = Counter()
+        self.findings = {key: Counter() for key in self.SET_KEYS}
+    
+    def apply(self, partial: Dict, sign: int = 1):
+        """Suma (sign=1) o resta (sign=-1) un resultado parcial de los totales"""
+        self.word_count += sign * partial['word_count']
+        self.sentence_count += sign * partial['sentence_count']
+        
+        counters = [(self.content_words, partial['content_words']),
+                    (self.close_repetitions, partial['close_repetitions']),
+                    (self.specific_counts, partial['specific_word_counts'])]
+        counters.extend(
+            (self.findings[key], dict.fromkeys(partial[key], 1)) for key in self.SET_KEYS
+        )
+        for total, counts in counters:
+            for item, count in counts.items():
+                value = total[item] + sign * count
+                if value > 0:
+                    total[item] = value
+                else:
+                    del total[item]
     
-    def analyze_text(self, text: str) -> Dict:
-        """Realiza un análisis completo del texto"""
+    def results(self, sentence_count: int, comma_before_y: List[str],
+                boundary_repetitions: Counter = None) -> Dict:
+        """
+        Construye un resultado con la forma de ``TextAnalyzer.analyze_text``;
+        ``boundary_repetitions`` son las repeticiones cercanas entre fragmentos
+        """
         return {
-            'word_count': self.count_words(text),
-            'sentence_count': self.count_sentences(text),
-            'repeated_words': self.find_repeated_words(text),
-            'participios': self.find_participios(text),
-            'gerundios': self.find_gerundios(text),
-            'forbidden_expressions': self.find_forbidden_expressions(text),
-            'problematic_adjectives': self.find_problematic_adjectives(text),
-            'comma_before_y': self.check_comma_before_y(text),
-            'specific_word_counts': self.count_specific_words(text)
+            'word_count': self.word_count,
+            'sentence_count': sentence_count,
+            'repeated_words': {
+                word: count for word, count in self.content_words.items() if count > 1
+            },
+            'close_repetitions': _ranked(
+                self.close_repetitions + (boundary_repetitions or Counter())
+            ),
+            'participios': list(self.findings['participios']),
+            'gerundios': list(self.findings['gerundios']),
+            'forbidden_expressions': [
+                expr for expr in self.analyzer.forbidden_matcher.expressions
+                if expr in self.findings['forbidden_expressions']
+            ],
+            'problematic_adjectives': list(self.findings['problematic_adjectives']),
+            'comma_before_y': comma_before_y,
+            'specific_word_counts': {
+                word: self.specific_counts.get(word, 0) for word in self.analyzer.specific_words
+            }
         }
+
+
+class FragmentMerger:
+    """
+    Combina en orden los resultados parciales de fragmentos consecutivos de
+    un texto. Cada fragmento termina en un carácter que no es espacio y el
+    siguiente empieza con el resto del texto (p. ej. los espacios y líneas
+    en blanco que los separan). Además de sumar los parciales corrige lo que
+    ocurre en cada frontera: oraciones que continúan, expresiones y comas
+    antes de "y" que quedan partidas y palabras repetidas a los dos lados.
+    Basta con el comienzo y el final de cada fragmento (ver ``edges``), no
+    con su texto completo.
+    """
+    
+    def __init__(self, analyzer: TextAnalyzer):
+        self.totals = ResultAccumulator(analyzer)
+        self.repetitions = RepetitionJoiner(analyzer)
+        self.matcher = analyzer.forbidden_matcher
+        self.window = max((len(expr) for expr in self.matcher.expressions), default=0) + 1
+        self.sentence_count = 0
+        self.comma_before_y: List[str] = []
+        self._previous = None
+        self._tail = ''
+    
+    def edges(self, fragment: str) -> Tuple[str, str]:
+        """Comienzo (con los espacios iniciales) y final de un fragmento"""
+        spaces = len(fragment) - len(fragment.lstrip())
+        return fragment[:spaces + self.window], fragment[-self.window:]
+    
+    def add(self, partial: Dict, head: str, tail: str):
+        """Suma el parcial de un fragmento no vacío, dados sus ``edges``"""
+        self.totals.apply(partial)
+        self.sentence_count += partial['sentence_count']
+        
+        continues = False
+        if self._previous is not None:
+            continues = continues_sentence(self._previous, partial)
+            if continues:
+                self.sentence_count -= 1
+            
+            # Coincidencias que cruzan la frontera entre fragmentos
+            boundary = self._tail + head
+            lower = _lower_preserving_offsets(boundary)
+            for start, end, expression in self.matcher.finditer(lower):
+                if start < len(self._tail) < end:
+                    self.totals.findings['forbidden_expressions'][expression] += 1
+            if self._tail.endswith(','):
+                match = COMMA_Y_PATTERN.match(boundary, len(self._tail) - 1)
+                if match is not None:
+                    self.comma_before_y.append(match.group())
+        
+        self.comma_before_y.extend(partial['comma_before_y'])
+        self.repetitions.add(partial, continues)
+        self._previous = partial
+        self._tail = tail
+    
+    def results(self) -> Dict:
+        """Resultado combinado, con la forma de ``TextAnalyzer.analyze_text``"""
+        return self.totals.results(self.sentence_count, self.comma_before_y,
+                                   self.repetitions.counts)
+
+
+class RepetitionJoiner:
+    """
+    Repeticiones cercanas entre fragmentos consecutivos de un texto. Cada
+    parcial trae en 'repetition_edges' las primeras palabras de su
+    comienzo, las de su final y su tamaño en la unidad de la ventana; con
+    eso se detectan las palabras que repiten otra del fragmento anterior
+    (o de varios anteriores, si son cortos) sin volver a leer el texto.
+    """
+    
+    def __init__(self, analyzer: TextAnalyzer):
+        self.sentences = analyzer.repetition_unit == 'sentences'
+        self.window = RepetitionWindow(analyzer.repetition_window)
+        self.counts: Counter = Counter()
+        self._end = 0
+    
+    def add(self, partial: Dict, continues: bool = False) -> List[str]:
+        """
+        Agrega el parcial del fragmento siguiente (``continues`` indica si
+        su primera oración sigue la del anterior) y devuelve las palabras de
+        su comienzo que repiten otra anterior
+        """
+        head, tail, units = partial['repetition_edges']
+        offset = self._end - 1 if continues and self.sentences else self._end
+        repeated = [word for word, position in head if self.window.seen(word, offset + position)]
+        self.counts.update(repeated)
+        for word, position in tail:
+            self.window.feed(word, offset + position)
+        self._end = offset + units
+        return repeated
+
+
+class IncrementalAnalyzer:
+    """
+    Análisis incremental por párrafos para textos que se editan y reanalizan.
+
+    Los resultados parciales de cada párrafo se guardan según el hash de su
+    contenido. Al reanalizar solo se procesan los párrafos nuevos o
+    modificados y los totales se actualizan restando los párrafos que
+    desaparecieron y sumando los que aparecieron, por lo que el costo
+    depende del tamaño de la edición y no del documento. El resultado tiene
+    la misma forma que ``TextAnalyzer.analyze_text``.
+    
+    Con ``locate=True`` el resultado incluye además 'highlights' (ver
+    ``TextAnalyzer.locate_highlights``). Cada párrafo guarda sus posiciones
+    a marcar y los números de sus frases (ver PhraseIndex), así que solo se
+    recorren los párrafos nuevos; las comas, repeticiones y frases que
+    cruzan párrafos y los conteos de frases del documento se combinan en
+    cada análisis.
+    """
+    
+    # Frases numeradas por palabra del texto a partir de las cuales el
+    # índice de frases (que crece con cada edición) se vuelve a armar
+    PHRASE_INDEX_GROWTH = 2 * PHRASE_MAX_WORDS
+    MIN_PHRASE_INDEX = 1 << 16
+    
+    def __init__(self, analyzer: TextAnalyzer = None, max_cached_paragraphs: int = 10000,
+                 locate: bool = False):
+        self.analyzer = analyzer or TextAnalyzer()
+        self.max_cached_paragraphs = max_cached_paragraphs
+        self.locate = locate
+        self._cache: 'OrderedDict[bytes, Dict]' = OrderedDict()
+        self.reset()
+    
+    def reset(self):
+        """Descarta los totales acumulados y la caché de párrafos"""
+        self._cache.clear()
+        self._rules = self.analyzer.rules_version
+        self._paragraphs: Counter = Counter()
+        self._totals = ResultAccumulator(self.analyzer)
+        self._phrases = PhraseIndex(self.analyzer._is_content_word)
+        self._phrase_limit = self.MIN_PHRASE_INDEX
+        self._analyzed = 0
+    
+    @staticmethod
+    def _hash(paragraph: str) -> bytes:
+        return hashlib.blake2b(paragraph.encode('utf-8'), digest_size=16).digest()
+    
+    def _partial(self, key: bytes, paragraph: str) -> Dict:
+        partial = self._cache.get(key)
+        if partial is None:
+            doc = self.analyzer.tokenize(paragraph)
+            partial = self.analyzer.analyze_fragment(doc, self.locate)
+            if self.locate:
+                partial['phrases'] = (self._phrases.encode(doc.tokens), doc.starts, doc._ends)
+            self._cache[key] = partial
+            self._analyzed += 1
+        else:
+            self._cache.move_to_end(key)
+        return partial
+    
+    def analyze_text(self, text: str, instrument: bool = False) -> Dict:
+        """
+        Analiza el texto reutilizando los párrafos que no cambiaron. Con
+        ``instrument=True`` el resultado incluye la clave 'metrics'.
+        """
+        started = time.perf_counter()
+        if self._rules != self.analyzer.rules_version or len(self._phrases) > self._phrase_limit:
+            self.reset()
+        self._analyzed = 0
+        
+        spans = split_paragraphs(text)
+        paragraphs = [text[start:end] for start, end in spans]
+        keys = [self._hash(paragraph) for paragraph in paragraphs]
+        partials = [self._partial(key, paragraph) for key, paragraph in zip(keys, paragraphs)]
+        
+        # Actualizar los totales solo con los párrafos que cambiaron
+        current = Counter(keys)
+        by_key = dict(zip(keys, partials))
+        for key, count in (current - self._paragraphs).items():
+            for _ in range(count):
+                self._totals.apply(by_key[key], 1)
+        for key, count in (self._paragraphs - current).items():
+            for _ in range(count):
+                self._totals.apply(self._cache[key], -1)
+        self._paragraphs = current
+        
+        # Ajustes en las fronteras entre párrafos consecutivos
+        sentence_count = self._totals.sentence_count
+        comma_before_y = []
+        repetitions = RepetitionJoiner(self.analyzer)
+        # Posiciones a marcar, de los párrafos desplazadas al texto completo
+        highlights = {'comma_before_y': [], 'forbidden_expressions': [], 'words': []}
+        previous = None
+        for (start, end), paragraph, partial in zip(spans, paragraphs, partials):
+            if not paragraph.strip():
+                continue
+            continues = False
+            if previous is not None:
+                prev_end, prev_paragraph, prev_partial = previous
+                continues = continues_sentence(prev_partial, partial, paragraph_break=True)
+                if continues:
+                    sentence_count -= 1
+                if prev_paragraph.rstrip().endswith(','):
+                    comma = prev_end - (len(prev_paragraph) - len(prev_paragraph.rstrip())) - 1
+                    match = COMMA_Y_PATTERN.match(text, comma)
+                    if match is not None:
+                        comma_before_y.append(match.group())
+                        if self.locate:
+                            highlights['comma_before_y'].append(match.span())
+            comma_before_y.extend(partial['comma_before_y'])
+            repeated = repetitions.add(partial, continues)
+            if self.locate:
+                self._shift_highlights(highlights, partial, start, repeated)
+            previous = (end, paragraph, partial)
+        
+        self._evict(keys)
+        
+        results = self._totals.results(sentence_count, comma_before_y, repetitions.counts)
+        if self.locate:
+            highlights['repeated_phrases'] = self._phrase_spans(spans, partials)
+            results['highlights'] = highlights
+            self._phrase_limit = max(self.MIN_PHRASE_INDEX, self.PHRASE_INDEX_GROWTH * results['word_count'])
+        if instrument:
+            results['metrics'] = {
+                'input_chars': len(text),
+                'paragraphs': len(paragraphs),
+                'paragraphs_analyzed': self._analyzed,
+                'seconds': time.perf_counter() - started
+            }
+            log_metrics('incremental_analyze_text', results['metrics'])
+        return results
+    
+    @staticmethod
+    def _shift_highlights(highlights: Dict, partial: Dict, offset: int, repeated: List[str]):
+        """
+        Agrega las posiciones a marcar de un párrafo que empieza en
+        ``offset``; ``repeated`` son las palabras de su comienzo que repiten
+        otra de un párrafo anterior
+        """
+        local = partial['highlights']
+        for category in ('comma_before_y', 'forbidden_expressions'):
+            highlights[category].extend(
+                (start + offset, end + offset) for start, end in local[category]
+            )
+        words = local['words']
+        heads = [partial['head_spans'][word] for word in repeated if word in partial['head_spans']]
+        if heads:
+            words = sorted(words + [(start, end, 'close_repetitions') for start, end in heads])
+        highlights['words'].extend((start + offset, end + offset, category) for start, end, category in words)
+    
+    def _phrase_spans(self, spans: List[Tuple[int, int]], partials: List[Dict]) -> List[Tuple[int, int]]:
+        """Frases repetidas del texto completo, con los números de frase guardados por párrafo"""
+        parts = [partial['phrases'] for partial in partials]
+        longest = self._phrases.longest(self._phrases.join([levels for levels, _, _ in parts]))
+        
+        # Las posiciones de las palabras son relativas a su párrafo
+        starts = list(chain.from_iterable(
+            map(offset.__add__, part[1]) for (offset, _), part in zip(spans, parts)
+        ))
+        ends = list(chain.from_iterable(
+            map(offset.__add__, part[2]) for (offset, _), part in zip(spans, parts)
+        ))
+        # Última palabra de cada frase, que puede estar en un párrafo siguiente
+        lasts = map(add, compress(range(len(longest)), longest), map((-1).__add__, filter(None, longest)))
+        return list(zip(compress(starts, longest), map(ends.__getitem__, lasts)))
+    
+    def _evict(self, keys: List[bytes]):
+        """Limita la caché conservando siempre los párrafos del texto actual"""
+        excess = len(self._cache) - max(self.max_cached_paragraphs, len(self._paragraphs))
+        if excess <= 0:
+            return
+        current = set(keys)
+        for key in list(self._cache):
+            if excess <= 0:
+                break
+            if key not in current:
+                del self._cache[key]
+                excess -= 1
+
+
+if __name__ == "__main__":
+    import sys
+    from batch_analyzer import main
+    sys.exit(main())